@@ -1,11 +1,25 @@
 # adapters.py — The Ultimate Multi-Provider Streaming Adapter (2025 Edition)
 import os
 import json
+import time
 import httpx
+import random
+import asyncio
 import traceback
 from abc import ABC, abstractmethod
-from openai import AsyncOpenAI
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from importlib.util import find_spec
+from urllib.parse import parse_qsl
+from openai import AsyncOpenAI, APIConnectionError
 from typing import AsyncGenerator
+from errors import AdapterError, RetryableError, RateLimited
+from framing import Status, Usage
+from metrics import metered
+from streamparse import StreamError, anthropic_text, openai_sse_text, ndjson_text
+from scheduler import SCHEDULER, estimate_tokens
+
+DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
 
 # ---------------------------------------------------------------------
 # UTF-8 Safe Exception Printer (Critical for Ollama/Claude crashes)
@@ -14,26 +28,137 @@ def exception_text(e: Exception) -> str:
     tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
     return tb.encode("utf-8", errors="replace").decode("utf-8")
 
+
+def retry_after_seconds(e: Exception) -> float | None:
+    """Back-off requested by an HTTP 429 (httpx or OpenAI SDK); None for any other error."""
+    resp = getattr(e, "response", None)
+    if getattr(resp, "status_code", None) != 429:
+        return None
+    if ms := resp.headers.get("retry-after-ms"):
+        return float(ms) / 1000
+    value = resp.headers.get("retry-after", "")
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return 5.0
+
+
+# 408/409/425 are transient; 529 is Anthropic's "overloaded"
+RETRYABLE_STATUS = {408, 409, 425, 529}
+# Error types sent inside a 200 stream that are worth retrying
+RETRYABLE_STREAM_ERRORS = {"overloaded_error", "api_error", "timeout_error"}
+
+
+def classify_error(name: str, e: Exception) -> AdapterError:
+    """Map any provider/transport exception onto the typed errors in errors.py."""
+    if isinstance(e, AdapterError):
+        return e
+    if DEBUG_MODE:
+        print(exception_text(e))
+    if (wait := retry_after_seconds(e)) is not None:
+        return RateLimited(name, wait)
+    if isinstance(e, StreamError):
+        if e.kind == "rate_limit_error":
+            return RateLimited(name, 5.0)
+        kind = RetryableError if e.kind in RETRYABLE_STREAM_ERRORS else AdapterError
+        return kind(name, str(e))
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None:
+        kind = RetryableError if status >= 500 or status in RETRYABLE_STATUS else AdapterError
+        return kind(name, f"HTTP {status}: {e}")
+    if isinstance(e, (httpx.TransportError, APIConnectionError)):  # Includes timeouts
+        return RetryableError(name, f"{type(e).__name__}: {e}")
+    return AdapterError(name, f"{type(e).__name__}: {e}")
+
 # ---------------------------------------------------------------------
-# Client Cache — Prevent Connection Leaks
+# HTTP Client Pool — One keep-alive client per base URL, shared process-wide
 # ---------------------------------------------------------------------
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
+
+HTTP_TIMEOUT = httpx.Timeout(
+    connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "10")),
+    read=float(os.getenv("HTTP_READ_TIMEOUT", "300")),  # 30B local models can stall on load
+    write=30.0,
+    pool=float(os.getenv("HTTP_POOL_TIMEOUT", "30")),
+)
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "50")),
+    max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", "20")),
+    keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120")),
+)
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2 = os.getenv("HTTP2", "false").lower() == "true" and find_spec("h2") is not None
+
+_HTTP_POOL: dict[str, httpx.AsyncClient] = {}
 _CLIENT_CACHE: dict[tuple[str | None, str | None], AsyncOpenAI] = {}
 
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    base_url = base_url.rstrip("/")
+    client = _HTTP_POOL.get(base_url)
+    if client is None or client.is_closed:
+        client = _HTTP_POOL[base_url] = httpx.AsyncClient(
+            base_url=base_url, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, http2=HTTP2,
+        )
+    return client
+
 def get_openai_client(base_url: str | None, api_key: str | None) -> AsyncOpenAI:
     key = (base_url or "", api_key or "")
-    if key not in _CLIENT_CACHE:
-        _CLIENT_CACHE[key] = AsyncOpenAI(base_url=base_url, api_key=api_key or "sk-no-key-needed")
-    return _CLIENT_CACHE[key]
+    client = _CLIENT_CACHE.get(key)
+    if client is None or client.is_closed():
+        client = _CLIENT_CACHE[key] = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key or "sk-no-key-needed",
+            timeout=HTTP_TIMEOUT,
+            max_retries=0,  # 429s go back to the scheduler, which honours Retry-After
+            http_client=get_http_client(base_url or "https://api.openai.com/v1"),
+        )
+    return client
+
+async def preconnect(*base_urls: str, timeout: float = 3.0):
+    """Warm a pooled connection per base URL so round one skips the TCP + TLS handshake."""
+    async def touch(url: str):
+        try:
+            await get_http_client(url).head("/", timeout=timeout)
+        except Exception as e:  # Best-effort: a bad PRECONNECT_URLS entry must not stop startup
+            print(f"[preconnect] {url} skipped: {e!r}")
+
+    await asyncio.gather(*(touch(u) for u in base_urls if u))
+
+async def close_http_clients():
+    """Close every pooled client. Called once on app shutdown."""
+    clients = [*_HTTP_POOL.values(), *_CLIENT_CACHE.values()]
+    _HTTP_POOL.clear()
+    _CLIENT_CACHE.clear()
+    await asyncio.gather(
+        *(c.close() if isinstance(c, AsyncOpenAI) else c.aclose() for c in clients),
+        return_exceptions=True,
+    )
 
 # ---------------------------------------------------------------------
 # Base Adapter
 # ---------------------------------------------------------------------
 class BaseAdapter(ABC):
+    provider = "custom"
+    sampling: dict = {}  # Request parameters that shape the output (part of the cache key)
+
     def __init__(self, name: str):
         self.name = name
+        self.model = name
+
+    def _sampling(self, max_tokens: int | None = None) -> dict:
+        """Sampling with a per-request output cap (max_tokens) applied."""
+        return {**self.sampling, "max_tokens": max_tokens} if max_tokens else self.sampling
+
+    def structured(self, schema: dict, name: str = "reply"):
+        """Have the provider constrain replies to JSON matching `schema`. A no-op where it
+        can't (Anthropic, synthetic): the prompt has to ask for the JSON instead."""
 
     @abstractmethod
-    async def stream(self, messages: list[dict]) -> AsyncGenerator[str, None]:
+    async def stream(self, messages: list[dict], max_tokens: int | None = None) -> AsyncGenerator[str, None]:
         pass
 
     async def close(self):
@@ -43,122 +168,520 @@ class BaseAdapter(ABC):
 # ---------------------------------------------------------------------
 # OpenAI-Compatible (OpenAI, Groq, Mistral, Together, Fireworks, LMStudio, etc.)
 # ---------------------------------------------------------------------
+def json_schema_format(schema: dict, name: str = "reply") -> dict:
+    """OpenAI-style response_format for a JSON schema (strict: every reply matches it)."""
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+
 class OpenAICompatibleAdapter(BaseAdapter):
-    def __init__(self, model: str, base_url: str | None = None, api_key: str | None = None):
+    sampling = {"temperature": 0.8, "top_p": 0.9, "max_tokens": 4096}
+
+    def __init__(self, model: str, base_url: str | None = None, api_key: str | None = None,
+                 provider: str = "openai"):
         super().__init__(model.split("/")[-1])  # Clean display name
         self.client = get_openai_client(base_url, api_key)
         self.model = model
+        self.provider = provider
+
+    def structured(self, schema, name="reply"):
+        self.sampling = {**self.sampling, "temperature": 0, "response_format": json_schema_format(schema, name)}
 
-    async def stream(self, messages):
+    async def stream(self, messages, max_tokens=None):
         try:
             stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 stream=True,
-                temperature=0.8,
-                top_p=0.9,
-                max_tokens=4096,
+                **self._sampling(max_tokens),
             )
             async for chunk in stream:
-                if (delta := chunk.choices[0].delta.content):
+                if usage := getattr(chunk, "usage", None):  # Only servers that report it unasked
+                    yield Usage(usage.prompt_tokens, usage.completion_tokens)
+                if chunk.choices and (delta := chunk.choices[0].delta.content):
                     yield delta
         except Exception as e:
-            yield f"\n[{self.name} ERROR]: {exception_text(e)}\n"
+            raise classify_error(self.name, e) from e
 
 
 # ---------------------------------------------------------------------
 # Anthropic (Claude) — Raw Streaming
 # ---------------------------------------------------------------------
+# Prompt caching: breakpoints after the system prompt and after the history, so the
+# next turn re-reads both from cache and only the new messages are prefilled
+CACHE_CONTROL = {"type": "ephemeral"}
+OPENING_TURN = "Begin."  # The Messages API needs a user turn first
+
+
+
+def anthropic_messages(messages: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Chat messages → (system blocks, alternating user/assistant turns) for the
+    Messages API. System messages go to `system`, consecutive same-role messages
+    share a turn, and everything but the final (volatile) message is marked cacheable.
+    """
+    system, turns = [], []
+    for i, m in enumerate(messages):
+        block = {"type": "text", "text": str(m.get("content") or "…")}
+        if m["role"] == "system":
+            system.append(block)
+            continue
+        if i == len(messages) - 2:
+            block["cache_control"] = CACHE_CONTROL
+        if turns and turns[-1]["role"] == m["role"]:
+            turns[-1]["content"].append(block)
+        else:
+            turns.append({"role": m["role"], "content": [block]})
+    if not turns or turns[0]["role"] != "user":
+        turns.insert(0, {"role": "user", "content": [{"type": "text", "text": OPENING_TURN}]})
+    if system:
+        system[-1]["cache_control"] = CACHE_CONTROL
+    return system, turns
+
+
 class AnthropicAdapter(BaseAdapter):
+    provider = "anthropic"
+    sampling = {"max_tokens": 4096, "temperature": 0.8}
+
     def __init__(self, model: str):
         super().__init__(model)
         self.api_key = os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY not set")
 
-    async def stream(self, messages):
+    async def stream(self, messages, max_tokens=None):
         headers = {
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01",
             "content-type": "application/json",
         }
+        system, turns = anthropic_messages(messages)
         payload = {
             "model": self.name,
-            "max_tokens": 4096,
-            "temperature": 0.8,
-            "messages": messages,
+            "messages": turns,
             "stream": True,
+            **self._sampling(max_tokens),
         }
+        if system:
+            payload["system"] = system
         try:
-            async with httpx.AsyncClient(timeout=None) as client:
-                async with client.stream("POST", "https://api.anthropic.com/v1/messages", headers=headers, json=payload) as resp:
-                    resp.raise_for_status()
-                    async for line in resp.aiter_lines():
-                        line = line.strip()
-                        if not line or not line.startswith("data: "):
-                            continue
-                        if line == "data: [DONE]":
-                            break
-                        try:
-                            data = json.loads(line[6:])
-                            if token := data.get("delta", {}).get("text"):
-                                yield token
-                        except json.JSONDecodeError:
-                            continue
+            client = get_http_client(ANTHROPIC_BASE_URL)
+            async with client.stream("POST", "/v1/messages", headers=headers, json=payload) as resp:
+                resp.raise_for_status()
+                usage = {}
+                async for token in anthropic_text(resp.aiter_bytes(), usage):
+                    yield token
+                if usage:
+                    yield Usage(usage.get("input"), usage.get("output"))
         except Exception as e:
-            yield f"\n[Claude ERROR]: {exception_text(e)}\n"
+            raise classify_error(self.name, e) from e
 
 
 # ---------------------------------------------------------------------
 # Ollama — Works with Ollama, OpenWebUI, anything
 # ---------------------------------------------------------------------
+# Endpoint variants in discovery order: (path, wire format).
+# Discovery runs once per OLLAMA_HOST; the winner is cached until it fails.
+OLLAMA_ENDPOINTS = [
+    ("/api/chat", "ndjson"),              # native Ollama
+    ("/chat", "ndjson"),                  # proxies that strip the /api prefix
+    ("/v1/chat/completions", "openai"),   # OpenWebUI compatibility
+]
+_OLLAMA_ENDPOINT: dict[str, tuple[str, str]] = {}
+
+# Per-model load settings, "*" applies to every model:
+#   OLLAMA_MODEL_OPTIONS={"*": {"keep_alive": "30m"}, "qwen3-coder:30b": {"num_ctx": 16384}}
+OLLAMA_MODEL_OPTIONS: dict = json.loads(os.getenv("OLLAMA_MODEL_OPTIONS") or "{}")
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+_WARMING: dict[tuple[str, str], asyncio.Task] = {}
+
+
 class OllamaAdapter(BaseAdapter):
-    def __init__(self, model: str):
+    provider = "ollama"
+    sampling = {"temperature": 0.8, "top_p": 0.9}
+
+    def __init__(self, model: str, endpoints: list[tuple[str, str]] | None = None):
         super().__init__(model)
         self.base_url = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+        self.endpoints = endpoints or OLLAMA_ENDPOINTS  # Pin a subset to probe one variant
 
-    async def stream(self, messages):
+    def structured(self, schema, name="reply"):
+        self.sampling = {**self.sampling, "temperature": 0, "format": schema}
+
+    def _payload(self, messages, wire: str, max_tokens: int | None = None) -> dict:
+        sampling = dict(self.sampling)
+        schema = sampling.pop("format", None)   # a request field, not a model option
+        if wire == "openai":
+            if schema:
+                sampling["response_format"] = json_schema_format(schema)
+            if max_tokens:
+                sampling["max_tokens"] = max_tokens
+            return {"model": self.name, "messages": messages, "stream": True, **sampling}
+        if max_tokens:
+            sampling["num_predict"] = max_tokens
         payload = {
             "model": self.name,
             "messages": messages,
             "stream": True,
-            "options": {"temperature": 0.8, "top_p": 0.9},
+            **ollama_load_settings(self.name, sampling),
         }
-        urls_to_try = [
-            f"{self.base_url}/api/chat",
-            f"{self.base_url}/chat",
-            f"{self.base_url}/v1/chat/completions",  # OpenWebUI compatibility
-        ]
-        last_error = None
-        for url in urls_to_try:
+        if schema:
+            payload["format"] = schema
+        return payload
+
+    async def stream(self, messages, max_tokens=None):
+        c = get_http_client(self.base_url)
+        known = _OLLAMA_ENDPOINT.get(self.base_url)
+        candidates = ([known, *(e for e in self.endpoints if e != known)]
+                      if known in self.endpoints else self.endpoints)
+        tried = []
+        started = False
+        try:
+            for path, wire in candidates:
+                tried.append(path)
+                async with c.stream("POST", path, json=self._payload(messages, wire, max_tokens)) as resp:
+                    if resp.status_code in (404, 405):
+                        _OLLAMA_ENDPOINT.pop(self.base_url, None)
+                        continue
+                    resp.raise_for_status()
+                    if _OLLAMA_ENDPOINT.get(self.base_url) != (path, wire):
+                        print(f"[Ollama] {self.base_url} → using {path}")
+                        _OLLAMA_ENDPOINT[self.base_url] = (path, wire)
+                    parse = openai_sse_text if wire == "openai" else ndjson_text
+                    usage = {}
+                    async for token in parse(resp.aiter_bytes(), usage):
+                        started = True
+                        yield token
+                    if usage:
+                        yield Usage(usage.get("input"), usage.get("output"))
+                    return
+            raise httpx.HTTPError("every endpoint returned 404/405")
+        except Exception as e:
+            if not started:
+                _OLLAMA_ENDPOINT.pop(self.base_url, None)
+            if DEBUG_MODE:
+                print(f"[Ollama] Tried: {', '.join(self.base_url + p for p in tried)}")
+            raise classify_error(self.name, e) from e
+
+def ollama_load_settings(model: str, sampling: dict | None = None) -> dict:
+    """keep_alive and options (num_ctx, …) for `model` from OLLAMA_MODEL_OPTIONS."""
+    settings = {**OLLAMA_MODEL_OPTIONS.get("*", {}), **OLLAMA_MODEL_OPTIONS.get(model, {})}
+    keep_alive = settings.pop("keep_alive", None)
+    payload = {"options": {**(sampling or {}), **settings}}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+
+async def warm_up(provider: str, model: str) -> bool:
+    """
+    Load an Ollama model into memory ahead of its first request (an empty
+    /api/generate call). Uses the same num_ctx as real requests so the model
+    is not reloaded. No-op for hosted providers.
+    """
+    if provider.lower().strip() != "ollama":
+        return False
+    base_url = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+    payload = {"model": model, **ollama_load_settings(model)}
+    started = time.perf_counter()
+    try:
+        r = await get_http_client(base_url).post("/api/generate", json=payload, timeout=OLLAMA_WARMUP_TIMEOUT)
+        r.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"[warm-up] {model} @ {base_url} failed: {e!r}")
+        return False
+    print(f"[warm-up] {model} loaded in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+
+def warm_up_in_background(provider: str, model: str) -> asyncio.Task | None:
+    """Start warm_up() unless the same model is already warming; returns the task."""
+    if provider.lower().strip() != "ollama":
+        return None
+    key = (os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/"), model)
+    task = _WARMING.get(key)
+    if task is None or task.done():
+        task = _WARMING[key] = asyncio.create_task(warm_up(provider, model))
+    return task
+
+
+
+# ---------------------------------------------------------------------
+# Synthetic — Offline stand-in for load and latency testing
+# ---------------------------------------------------------------------
+# model = "<preset>" or "<preset>?key=value&..." (e.g. "fast?tps=200&err=0.1")
+#   ttft     median time to first token, seconds (log-normal, spread ttft_sd)
+#   tps      tokens per second after the first token (0 = no pacing)
+#   jitter   ± fraction applied to every inter-token gap
+#   err      probability a request breaks at a random token (RetryableError)
+#   429      probability a request is rate limited up front (retry_after seconds)
+#   length   mean response length in tokens (± 25%)
+#   code     probability the reply carries a fenced code block (lang=python|java, for the coding arena)
+#   seed     makes output a pure function of the prompt (cache / benchmark runs)
+SYNTHETIC_DEFAULTS = {
+    "ttft": 0.3, "ttft_sd": 0.4, "tps": 50.0, "jitter": 0.3, "err": 0.0, "429": 0.0,
+    "retry_after": 1.0, "length": 250, "code": 0.0, "lang": "python", "seed": None,
+}
+SYNTHETIC_PRESETS = {
+    "instant": {"ttft": 0, "tps": 0, "jitter": 0},
+    "fast":    {"ttft": 0.15, "tps": 120},
+    "cloud":   {"ttft": 0.6, "tps": 70, "length": 400},
+    "local":   {"ttft": 1.5, "tps": 25, "jitter": 0.5},
+    "slow":    {"ttft": 4.0, "tps": 8, "jitter": 0.6},
+    "flaky":   {"ttft": 0.5, "tps": 40, "err": 0.2, "429": 0.1},
+    "coder":   {"ttft": 0.5, "tps": 60, "length": 600, "code": 1.0},
+}
+
+_SYNTH_WORDS = (
+    "the argument rests on evidence that scale changes incentives while cost and risk "
+    "remain unevenly shared so any policy must weigh long term effects against short "
+    "term gains because history shows markets adapt faster than institutions"
+).split()
+_SYNTH_CODE = {
+    "python": ("def step_{i}(state):", "    value = state.get('v{i}', 0) * {i}",
+               "    return {{**state, 'v{i}': value + 1}}", ""),
+    "java":   ("public static int step{i}(int value) {{", "    int next = value * {i};",
+               "    return next + 1;", "}}"),
+}
+
+
+class SyntheticAdapter(BaseAdapter):
+    """Generates text locally with a configurable latency/error profile. No network."""
+    provider = "synthetic"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        preset, _, query = model.partition("?")
+        if preset not in SYNTHETIC_PRESETS:
+            raise ValueError(f"Unknown synthetic preset: {preset} (choose from {', '.join(SYNTHETIC_PRESETS)})")
+        cfg = {**SYNTHETIC_DEFAULTS, **SYNTHETIC_PRESETS[preset]}
+        for key, value in parse_qsl(query):
+            if key not in cfg:
+                raise ValueError(f"Unknown synthetic option: {key}")
+            cfg[key] = value if key == "lang" else float(value)
+        self.cfg = cfg
+
+    def _rng(self, messages) -> random.Random:
+        if self.cfg["seed"] is None:
+            return random.Random()
+        prompt = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+        return random.Random(f"{self.cfg['seed']}:{prompt}")
+
+    def _tokens(self, rng: random.Random) -> list[str]:
+        n = max(1, round(self.cfg["length"] * rng.uniform(0.75, 1.25)))
+        words = [rng.choice(_SYNTH_WORDS) + " " for _ in range(n)]
+        if rng.random() < self.cfg["code"]:
+            lang = self.cfg["lang"] if self.cfg["lang"] in _SYNTH_CODE else "python"
+            lines = [f"\n```{lang}\n"]
+            for i in range(1, max(2, n // 40) + 1):
+                lines += [line.format(i=i) + "\n" for line in _SYNTH_CODE[lang]]
+            lines.append("```\n")
+            cut = len(words) // 3
+            words = words[:cut] + lines + words[cut:]
+        return words
+
+    async def stream(self, messages, max_tokens=None) -> AsyncGenerator[str, None]:
+        cfg, rng = self.cfg, self._rng(messages)
+        if rng.random() < cfg["429"]:
+            raise RateLimited(self.name, cfg["retry_after"])
+        tokens = self._tokens(rng)[:max_tokens or None]
+        fail_at = rng.randrange(len(tokens)) if rng.random() < cfg["err"] else None
+        await asyncio.sleep(cfg["ttft"] * rng.lognormvariate(0, cfg["ttft_sd"]) if cfg["ttft"] else 0)
+        gap = 1 / cfg["tps"] if cfg["tps"] else 0
+        for i, token in enumerate(tokens):
+            if i == fail_at:
+                raise RetryableError(self.name, f"synthetic stream failure at token {i}")
+            if i and gap:
+                await asyncio.sleep(gap * rng.uniform(1 - cfg["jitter"], 1 + cfg["jitter"]))
+            yield token
+
+
+# ---------------------------------------------------------------------
+# Metrics — TTFT, inter-token latency, throughput, errors
+# ---------------------------------------------------------------------
+class MeteredAdapter(BaseAdapter):
+    """Records per-request stream timings under the adapter's provider/model labels."""
+
+    def __init__(self, inner: BaseAdapter):
+        super().__init__(inner.name)
+        self.inner = inner
+        self.provider = inner.provider
+        self.model = inner.model
+        self.sampling = inner.sampling
+
+    async def stream(self, messages, max_tokens=None) -> AsyncGenerator[str, None]:
+        async for token in metered(self.inner.stream(messages, max_tokens), self.provider, self.model):
+            yield token
+
+    async def close(self):
+        await self.inner.close()
+
+
+# ---------------------------------------------------------------------
+# Scheduling — Concurrency, RPM/TPM and fair queueing (see scheduler.py)
+# ---------------------------------------------------------------------
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+
+
+class ScheduledAdapter(BaseAdapter):
+    """Queues every request through SCHEDULER and waits out 429s instead of failing the round."""
+
+    def __init__(self, inner: BaseAdapter):
+        super().__init__(inner.name)
+        self.inner = inner
+        self.provider = inner.provider
+        self.model = inner.model
+        self.sampling = inner.sampling
+
+    async def stream(self, messages, max_tokens=None):
+        cost = estimate_tokens("".join(str(m.get("content", "")) for m in messages))
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            ticket = SCHEDULER.ticket(self.provider, self.model, cost)
+            output, usage = 0, Usage()
+            try:
+                async for key, position in ticket.wait():
+                    yield Status(f"\n[QUEUE] {self.name}: waiting for {key} (position {position})\n")
+                async for token in self.inner.stream(messages, max_tokens):
+                    if isinstance(token, Usage):  # Settles the TPM bucket below; not for the caller
+                        usage = token
+                        continue
+                    if not isinstance(token, Status):
+                        output += estimate_tokens(token) - 1  # The estimate adds one per call
+                    yield token
+                return
+            except RateLimited as e:
+                usage = Usage(0, 0)  # Rejected: nothing was used
+                ticket.pause(e.retry_after)
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                wait = e.retry_after
+            finally:
+                # The provider's counts when it reported them, else the streamed estimate
+                ticket.release(usage.input_tokens,
+                               output if usage.output_tokens is None else usage.output_tokens)
+            yield Status(f"\n[RATE LIMITED] {self.name}: {self.provider} asked for {wait:.1f}s, retrying\n")
+
+    async def close(self):
+        await self.inner.close()
+
+
+# ---------------------------------------------------------------------
+# Retry / Resume — Backoff before the first token, continuation after it
+# ---------------------------------------------------------------------
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+MAX_RESUMES = int(os.getenv("MAX_RESUMES", "2"))
+RESUME_STRATEGY = os.getenv("RESUME_STRATEGY", "same")  # none | same | fallback
+FALLBACK_ADAPTER = os.getenv("FALLBACK_ADAPTER", "")  # provider:model
+
+RESUME_PROMPT = (
+    "Your previous reply was cut off by a connection error. Continue it from exactly "
+    "where it stopped. Do not repeat any earlier text and do not mention the interruption."
+)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+class ResilientAdapter(BaseAdapter):
+    """
+    Retries transient failures that happen before the first token, and resumes
+    streams that break mid-way by asking the same (or the fallback) model to
+    continue the partial output. Only a final failure reaches the caller.
+    """
+
+    def __init__(self, inner: BaseAdapter, resume: str = "same", fallback: BaseAdapter | None = None):
+        super().__init__(inner.name)
+        self.inner = inner
+        self.provider = inner.provider
+        self.model = inner.model
+        self.sampling = inner.sampling
+        self.resume = resume
+        self.fallback = fallback
+
+    async def _with_retries(self, adapter: BaseAdapter, messages, max_tokens=None) -> AsyncGenerator[str, None]:
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            started = False
+            try:
+                async for token in adapter.stream(messages, max_tokens):
+                    started = started or not isinstance(token, Status)
+                    yield token
+                return
+            except RetryableError as e:
+                # RateLimited was already waited out by the scheduler
+                if started or isinstance(e, RateLimited) or attempt == RETRY_ATTEMPTS:
+                    raise
+                reason, delay = str(e), backoff_delay(attempt)
+            yield Status(f"\n[RETRY] {reason} (attempt {attempt + 1}/{RETRY_ATTEMPTS} in {delay:.1f}s)\n")
+            await asyncio.sleep(delay)
+
+    async def stream(self, messages, max_tokens=None) -> AsyncGenerator[str, None]:
+        adapter, request = self.inner, messages
+        partial: list[str] = []
+        resumes = 0
+        budget = max_tokens
+        while True:
             try:
-                async with httpx.AsyncClient(timeout=None) as c:
-                    async with c.stream("POST", url, json=payload) as resp:
-                        if resp.status_code == 404:
-                            continue
-                        resp.raise_for_status()
-                        async for line in resp.aiter_lines():
-                            if not line.strip():
-                                continue
-                            try:
-                                data = json.loads(line)
-                                if token := data.get("message", {}).get("content"):
-                                    yield token
-                                if data.get("done"):
-                                    return
-                            except json.JSONDecodeError:
-                                continue
-                        return
-            except Exception as e:
-                last_error = e
-                continue
-        yield f"\n[Ollama ERROR]: Could not connect. Tried: {', '.join(urls_to_try)}\nLast error: {exception_text(last_error or 'Unknown')}\n"
+                async for token in self._with_retries(adapter, request, budget):
+                    if not isinstance(token, Status):
+                        partial.append(token)
+                    yield token
+                return
+            except AdapterError as e:
+                # A bad request fails the same way on a resume; only a fallback may help
+                if self.resume == "none" or resumes >= MAX_RESUMES or (self.resume == "same" and not e.retryable):
+                    raise
+                if self.resume == "fallback" and self.fallback is not None:
+                    adapter = self.fallback
+                elif not partial:
+                    raise  # Nothing to resume and nowhere else to go
+                resumes += 1
+                reason = str(e)
+            if partial:
+                request = messages + [
+                    {"role": "assistant", "content": "".join(partial)},
+                    {"role": "user", "content": RESUME_PROMPT},
+                ]
+                if max_tokens:  # The continuation only gets what the cut-off reply left over
+                    budget = max(1, max_tokens - estimate_tokens("".join(partial)))
+            yield Status(f"\n[RESUME] {reason} (continuing via {adapter.provider}:{adapter.model})\n")
+
+    async def close(self):
+        await self.inner.close()
+        if self.fallback is not None:
+            await self.fallback.close()
 
 
 # ---------------------------------------------------------------------
 # Factory — Clean, Secure, Extensible
 # ---------------------------------------------------------------------
-def get_adapter(provider: str, model: str) -> BaseAdapter:
+def get_adapter(provider: str, model: str, resume: str | None = None,
+                fallback: tuple[str, str] | None = None, schema: dict | None = None) -> BaseAdapter:
+    """
+    Build a scheduled, retrying adapter.
+
+    resume:   "none" | "same" | "fallback" — what to do when a stream breaks
+              (default RESUME_STRATEGY)
+    fallback: (provider, model) to fail over to (default FALLBACK_ADAPTER)
+    schema:   JSON schema the replies must match, where the provider enforces one
+    """
+    if fallback is None and ":" in FALLBACK_ADAPTER:
+        fallback = tuple(FALLBACK_ADAPTER.split(":", 1))
+    def build(provider: str, model: str) -> BaseAdapter:
+        adapter = _build_adapter(provider, model)
+        if schema:
+            adapter.structured(schema)
+        return ScheduledAdapter(MeteredAdapter(adapter))
+
+    backup = build(*fallback) if fallback else None
+    return ResilientAdapter(build(provider, model), resume=resume or RESUME_STRATEGY, fallback=backup)
+
+
+def _build_adapter(provider: str, model: str) -> BaseAdapter:
     provider = provider.lower().strip()
 
     # OpenAI-compatible endpoints
@@ -176,13 +699,15 @@ def get_adapter(provider: str, model: str) -> BaseAdapter:
         base_url, api_key = compat_map[provider]
         if not api_key and provider != "lmstudio":
             raise ValueError(f"{provider.upper()}_API_KEY not set")
-        return OpenAICompatibleAdapter(model, base_url, api_key)
+        return OpenAICompatibleAdapter(model, base_url, api_key, provider=provider)
 
     elif provider == "anthropic":
         return AnthropicAdapter(model)
 
     elif provider == "ollama":
         return OllamaAdapter(model)
+    elif provider == "synthetic":
+        return SyntheticAdapter(model)
 
     else:
-        raise ValueError(f"Unsupported provider: {provider}\nSupported: {', '.join(compat_map.keys())}, anthropic, ollama")
+        raise ValueError(f"Unsupported provider: {provider}\nSupported: {', '.join(compat_map.keys())}, anthropic, ollama, synthetic")
@@ -0,0 +1,245 @@
+"""
+batch.py
+Headless batch debates: a SQLite job queue plus workers that run
+DebateController without a WebSocket and write results with log_debate.
+
+Any number of worker processes — on one machine (-p) or on several machines
+sharing DEBATE_DB_PATH over a network mount — claim jobs through leases.
+A worker renews its lease with a heartbeat while a debate runs; if it dies,
+the lease expires and another worker re-claims the job and resumes it from
+its last checkpointed round. Keep the hosts' clocks in sync (NTP): leases
+are compared against each worker's wall clock.
+
+Jobs file (JSONL), one debate per line; `a`, `b` and `judge` are provider:model
+shorthands for the provider_x / model_x keys the WebSocket endpoint takes:
+  {"topic": "Should AI be open source?", "a": "ollama:llama3:latest", "b": "groq:llama-3.1-8b-instant",
+   "judge": "ollama:qwen3:30b", "rounds": 4, "format": "simultaneous", "max_tokens": 800}
+`judges` adds an ensemble: ["groq:llama-3.3-70b-versatile", "openai:gpt-4o-mini"] (with "quorum").
+
+Usage:
+  python batch.py enqueue nightly.jsonl --queue nightly --judge ollama:qwen3:30b
+  python batch.py work --queue nightly -p 4 -c 2      # 4 processes × 2 debates each
+  python batch.py status --queue nightly
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from dotenv import load_dotenv
+load_dotenv()
+
+import adapters
+from adapters import get_adapter
+from controller import DebateController
+from schemas import DebateConfig
+from framing import Transcript
+from scheduler import current_session
+from response_cache import with_cache
+from logger import (log_debate, create_checkpoint, load_checkpoint, finish_checkpoint,
+                    enqueue_jobs, claim_job, renew_lease, finish_job, job_counts)
+
+SPEC_DEFAULTS = {
+    "rounds": 6, "cache": "off", "cache_replay": "fast",
+    "resume": None, "fallback": None, "format": "sequential", "judging": "final",
+    "max_tokens": None, "max_seconds": None, "deadline": None,
+    "judges": [], "quorum": None, "aggregate": "median",
+}
+
+
+# ── Specs ───────────────────────────────────────────────────────────────────
+SHORTHANDS = (("a", "provider_a", "model_a"), ("b", "provider_b", "model_b"),
+              ("judge", "judge_provider", "judge_model"))
+
+
+def _expand(fields: dict) -> dict:
+    fields = dict(fields)
+    for short, provider_key, model_key in SHORTHANDS:
+        if short in fields:
+            fields[provider_key], _, fields[model_key] = fields.pop(short).partition(":")
+    return fields
+
+
+def normalize(job: dict, defaults: dict) -> dict:
+    """A jobs-file line → the spec dict main.py stores with each checkpoint."""
+    spec = {**SPEC_DEFAULTS, **_expand(defaults), **_expand(job)}
+    missing = [k for k in ("topic", *(key for _, *keys in SHORTHANDS for key in keys)) if not spec.get(k)]
+    if missing:
+        raise ValueError(f"job is missing {', '.join(missing)}: {job}")
+    return spec
+
+
+def build_config(spec: dict) -> DebateConfig:
+    backup = tuple(spec["fallback"].split(":", 1)) if spec.get("fallback") else None
+
+    def adapter(side: str):
+        inner = get_adapter(spec[f"provider_{side}"], spec[f"model_{side}"], spec.get("resume"), backup)
+        return with_cache(inner, spec.get("cache", "off"), spec.get("cache_replay", "fast"))
+
+    return DebateConfig(
+        topic=spec["topic"],
+        rounds=spec["rounds"],
+        adapter_a=adapter("a"),
+        adapter_b=adapter("b"),
+        judge_provider=spec["judge_provider"],
+        judge_model=spec["judge_model"],
+        cache_policy=spec.get("cache", "off"),
+        cache_replay=spec.get("cache_replay", "fast"),
+        resume_strategy=spec.get("resume"),
+        fallback=backup,
+        format=spec.get("format", "sequential"),
+        judging=spec.get("judging", "final"),
+        judges=[tuple(judge.split(":", 1)) for judge in spec.get("judges") or []],
+        judge_quorum=spec.get("quorum"),
+        judge_aggregate=spec.get("aggregate", "median"),
+        max_tokens=spec.get("max_tokens"),
+        max_seconds=spec.get("max_seconds"),
+        deadline=spec.get("deadline"),
+    )
+
+
+async def run_spec(session: str, spec: dict, checkpoint: dict | None = None) -> DebateController:
+    """
+    Run one debate to its verdict without a client (resuming `checkpoint` if
+    given) and log the transcript. The caller calls finish_checkpoint once it
+    has recorded the result.
+    """
+    config = build_config(spec)
+    if checkpoint is None:
+        create_checkpoint(session, spec["topic"], spec)
+    controller = DebateController(config, session, checkpoint)
+    transcript = Transcript(checkpoint["output"] if checkpoint else "")
+    async for chunk in controller.run():
+        transcript.add(chunk)
+    await asyncio.to_thread(log_debate, session, spec["topic"], transcript.text(), controller.verdict)
+    return controller
+
+
+# ── Worker ──────────────────────────────────────────────────────────────────
+async def run_job(job: dict, worker: str, lease: float, max_attempts: int):
+    checkpoint = await asyncio.to_thread(load_checkpoint, job["session"]) if job["session"] else None
+    if checkpoint and checkpoint["status"] == "done":
+        checkpoint = None   # logged but never marked finished: run it again
+    session = job["session"] if checkpoint else uuid.uuid4().hex[:8]
+    await asyncio.to_thread(renew_lease, job["id"], worker, lease, session)   # a re-claim resumes this session
+    current_session.set(session)   # fair queueing key, inherited by the debate task
+    label = f"job {job['id']} ({session}, attempt {job['attempts']})"
+    print(f"▶️  {label}{' resuming' if checkpoint else ''}: {job['spec']['topic'][:60]}")
+
+    started = time.perf_counter()
+    debate = asyncio.create_task(run_spec(session, job["spec"], checkpoint))
+    try:
+        while not debate.done():
+            await asyncio.wait({debate}, timeout=lease / 3)
+            if not debate.done() and not await asyncio.to_thread(renew_lease, job["id"], worker, lease):
+                print(f"⚠️  {label}: lease lost to another worker, abandoning")
+                debate.cancel()
+                await asyncio.gather(debate, return_exceptions=True)
+                return
+        debate.result()
+    except asyncio.CancelledError:   # shutting down: hand the job back right away
+        debate.cancel()
+        await asyncio.to_thread(finish_job, job["id"], worker, "queued", "worker stopped")
+        raise
+    except Exception as e:
+        retry = job["attempts"] < max_attempts
+        await asyncio.to_thread(finish_job, job["id"], worker, "queued" if retry else "failed",
+                                f"{type(e).__name__}: {e}"[:500])
+        print(f"❌ {label}: {e}{' (will retry)' if retry else ''}")
+        return
+    seconds = round(time.perf_counter() - started, 1)
+    await asyncio.to_thread(finish_job, job["id"], worker, "done", None, seconds)
+    await asyncio.to_thread(finish_checkpoint, session)
+    print(f"✅ {label} done in {seconds}s")
+
+
+async def work(queue: str, concurrency: int, lease: float, max_attempts: int, poll: float, drain: bool):
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"👷 {worker} on queue {queue!r} ({concurrency} at a time)")
+
+    async def slot():
+        while True:
+            job = await asyncio.to_thread(claim_job, queue, worker, lease, max_attempts)
+            if job is None:
+                # --drain: done once nothing is queued or still running (a lease may yet expire)
+                if drain and not (await asyncio.to_thread(job_counts, queue)).get("running"):
+                    return
+                await asyncio.sleep(poll)
+                continue
+            await run_job(job, worker, lease, max_attempts)
+
+    try:
+        await asyncio.gather(*(slot() for _ in range(concurrency)))
+    finally:
+        await adapters.close_http_clients()
+
+
+def _work_process(*args):
+    try:
+        asyncio.run(work(*args))
+    except KeyboardInterrupt:
+        pass
+
+
+# ── CLI ─────────────────────────────────────────────────────────────────────
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Headless batch debates over a SQLite job queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enqueue", help="add the debates in a JSONL file to a queue")
+    p.add_argument("file")
+    p.add_argument("--queue", default="default")
+    p.add_argument("--judge", help="default provider:model judge for lines without one")
+    p.add_argument("--rounds", type=int, help="default rounds for lines without one")
+
+    p = sub.add_parser("work", help="claim and run jobs until stopped")
+    p.add_argument("--queue", default="default")
+    p.add_argument("-p", "--processes", type=int, default=1, help="worker processes on this machine")
+    p.add_argument("-c", "--concurrency", type=int, default=1, help="debates in flight per process")
+    p.add_argument("--lease", type=float, default=60.0, help="seconds a claim lasts without a heartbeat")
+    p.add_argument("--max-attempts", type=int, default=3)
+    p.add_argument("--poll", type=float, default=5.0, help="seconds between polls of an empty queue")
+    p.add_argument("--drain", action="store_true", help="exit once no job is queued or running")
+
+    p = sub.add_parser("status", help="job counts by status")
+    p.add_argument("--queue")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        defaults = {"rounds": args.rounds} if args.rounds else {}
+        if args.judge:
+            defaults["judge"] = args.judge
+        with open(args.file, encoding="utf-8") as f:
+            specs = [normalize(json.loads(line), defaults) for line in f if line.strip()]
+        print(f"Queued {enqueue_jobs(specs, args.queue)} jobs on {args.queue!r}")
+        return 0
+
+    if args.command == "status":
+        counts = job_counts(args.queue)
+        print("  ".join(f"{s}: {counts.get(s, 0)}" for s in ("queued", "running", "done", "failed")))
+        return 0
+
+    work_args = (args.queue, args.concurrency, args.lease, args.max_attempts, args.poll, args.drain)
+    if args.processes == 1:
+        _work_process(*work_args)
+        return 0
+    # One event loop per process, so debates use every core
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_work_process, args=work_args) for _ in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:   # children got the same SIGINT and hand their jobs back
+        for proc in procs:
+            proc.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
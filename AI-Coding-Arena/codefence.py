@@ -0,0 +1,126 @@
+"""
+codefence.py — Incremental markdown code-fence tracking for streamed replies.
+
+FenceTracker is fed the reply chunk by chunk as it streams and keeps track of
+``` / ~~~ fences line by line, so code blocks are known the moment they close
+(no regex passes over the finished reply) and a reply that is still pure prose
+after a few thousand characters can be cut short.
+"""
+import os
+
+# Prose characters before the first fence after which a reply counts as "no code" (0 = never)
+NO_CODE_ABORT_CHARS = int(os.getenv("NO_CODE_ABORT_CHARS", "4000"))
+
+# Unfenced lines that look like code do not count as prose (same cues as extract_code_blocks)
+CODE_PREFIXES = ("public", "class", "def", "import", "from", "const", "function", "#", "package",
+                 "fun ", "val ", "var ", "@")
+
+
+class CodeBlock:
+    """One fenced block; closed=False when the stream ended inside it."""
+    __slots__ = ("index", "lang", "code", "closed")
+
+    def __init__(self, index: int, lang: str, code: str, closed: bool = True):
+        self.index = index
+        self.lang = lang
+        self.code = code
+        self.closed = closed
+
+    @property
+    def lines(self) -> int:
+        return self.code.count("\n") + 1 if self.code else 0
+
+
+class FenceTracker:
+    """Line-based fence state machine over a reply that arrives in arbitrary chunks."""
+
+    def __init__(self):
+        self.parts: list[str] = []       # the whole reply, as streamed
+        self.blocks: list[CodeBlock] = []
+        self._prose_seen = 0             # prose in complete lines before the first fence
+        self._pending = ""               # incomplete last line
+        self._fence = None               # opening fence ("```", "~~~~", ...) while inside a block
+        self._lang = ""
+        self._lines: list[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def code(self) -> str:
+        """All blocks, joined like extract_code_blocks() joins them."""
+        return "\n\n".join(b.code.strip() for b in self.blocks)
+
+    @property
+    def prose_chars(self) -> int:
+        """Prose streamed before the first fence opened, including the unfinished line."""
+        return self._prose_seen + self._prose(self._pending)
+
+    @property
+    def no_code(self) -> bool:
+        """True once the reply has run NO_CODE_ABORT_CHARS of prose without opening a fence."""
+        if NO_CODE_ABORT_CHARS <= 0 or self.blocks or self._fence is not None:
+            return False
+        return self.prose_chars >= NO_CODE_ABORT_CHARS
+
+    def feed(self, chunk: str) -> list[CodeBlock]:
+        """Add streamed text; returns the blocks that closed in it."""
+        self.parts.append(chunk)
+        if "\n" not in chunk:
+            self._pending += chunk
+            return []
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        closed = []
+        for line in lines:
+            block = self._line(line)
+            if block:
+                closed.append(block)
+        return closed
+
+    def finish(self) -> list[CodeBlock]:
+        """End of stream: flush the last line; an unterminated block still counts."""
+        closed = []
+        if self._pending:
+            block = self._line(self._pending)
+            self._pending = ""
+            if block:
+                closed.append(block)
+        if self._fence is not None and self._lines:
+            closed.append(self._close(closed=False))
+        return closed
+
+    def _line(self, line: str) -> CodeBlock | None:
+        stripped = line.strip()
+        if self._fence is None:
+            if stripped.startswith(("```", "~~~")):
+                marker = stripped[0]
+                fence = stripped[:len(stripped) - len(stripped.lstrip(marker))]
+                rest = stripped[len(fence):]
+                if marker in rest:   # ```inline``` on one line
+                    self.blocks.append(CodeBlock(len(self.blocks) + 1, "", rest.split(fence, 1)[0]))
+                    return self.blocks[-1]
+                self._fence, self._lang, self._lines = fence, rest.strip(), []
+            elif not self.blocks:
+                self._prose_seen += self._prose(line)
+            return None
+        if stripped.startswith(self._fence) and not stripped.lstrip(self._fence[0]):
+            return self._close()
+        self._lines.append(line)
+        return None
+
+    @staticmethod
+    def _prose(line: str) -> int:
+        """Characters of prose in an unfenced line (0 for blank, code-like or fence-like lines)."""
+        stripped = line.strip()
+        if (not stripped or line.startswith(("    ", "\t", "  "))
+                or stripped.startswith(CODE_PREFIXES) or stripped.startswith(("`", "~"))):
+            return 0
+        return len(line) + 1
+
+    def _close(self, closed: bool = True) -> CodeBlock:
+        block = CodeBlock(len(self.blocks) + 1, self._lang, "\n".join(self._lines), closed)
+        self.blocks.append(block)
+        self._fence, self._lang, self._lines = None, "", []
+        return block
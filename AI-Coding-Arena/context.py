@@ -0,0 +1,198 @@
+"""
+context.py — Token-budgeted prompt window with a rolling summary.
+
+Each speaker gets a prompt that fits its model's budget: the system prompt,
+a running summary of the rounds that no longer fit, and as many of the most
+recent messages as the budget allows. When history overflows, the oldest
+rounds are folded into the summary by a background task that runs while the
+current speaker streams; until it lands, those rounds are simply left out.
+
+The layout is prefix-stable so provider and Ollama prompt caches can reuse it:
+the system prompt first (never changes), then the summary as its own message
+(changes only when rounds are folded), then history, which is append-only.
+Per-turn instructions belong after all of it, at the caller's end.
+
+Budgets (prompt tokens) come from CONTEXT_BUDGETS (JSON), keyed by
+provider:model, model or provider ("*" = everything else):
+  CONTEXT_BUDGETS='{"ollama": 3000, "anthropic": 12000}'
+Without an entry, Ollama models use their num_ctx from OLLAMA_MODEL_OPTIONS
+(default 4096) minus CONTEXT_REPLY_RESERVE, and hosted models use
+CONTEXT_DEFAULT_BUDGET.
+"""
+
+import os
+import json
+import asyncio
+from adapters import get_adapter, ollama_load_settings
+from framing import Status
+from scheduler import estimate_tokens
+
+CONTEXT_BUDGETS: dict = json.loads(os.getenv("CONTEXT_BUDGETS") or "{}")
+CONTEXT_DEFAULT_BUDGET = int(os.getenv("CONTEXT_DEFAULT_BUDGET", "8000"))
+CONTEXT_REPLY_RESERVE = int(os.getenv("CONTEXT_REPLY_RESERVE", "1024"))
+OLLAMA_DEFAULT_NUM_CTX = 4096
+
+# provider:model that writes summaries; empty = the debate's judge, "none" = extractive only
+SUMMARY_ADAPTER = os.getenv("SUMMARY_ADAPTER", "")
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "400"))
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "120"))
+SUMMARY_INPUT_TOKENS = 1500   # per folded message sent to the summarizer
+MESSAGE_OVERHEAD = 4          # role / separator tokens per chat message
+
+SUMMARY_PROMPT = (
+    "Condense the debate below into a running summary of at most {words} words. "
+    "Keep each side's main claims, the evidence offered and the points still in dispute. "
+    "Write plain prose, no preamble."
+)
+
+
+def context_budget(provider: str, model: str) -> int:
+    """Prompt-token budget for one request to provider:model."""
+    for key in (f"{provider}:{model}", model, provider, "*"):
+        if key in CONTEXT_BUDGETS:
+            return int(CONTEXT_BUDGETS[key])
+    if provider == "ollama":
+        num_ctx = ollama_load_settings(model)["options"].get("num_ctx", OLLAMA_DEFAULT_NUM_CTX)
+        return max(512, int(num_ctx) - CONTEXT_REPLY_RESERVE)
+    return CONTEXT_DEFAULT_BUDGET
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(str(message.get("content", ""))) + MESSAGE_OVERHEAD
+
+
+def clip(text: str, tokens: int, marker: str = "\n[… truncated]") -> str:
+    """Cut text to roughly `tokens` estimated tokens, keeping the start."""
+    total = estimate_tokens(text)
+    if total <= tokens:
+        return text
+    return text[:max(0, len(text) * tokens // total)] + marker
+
+
+def merge_roles(messages: list[dict]) -> list[dict]:
+    """Join adjacent messages from the same role; chat APIs expect user and assistant turns to alternate."""
+    merged: list[dict] = []
+    for message in messages:
+        prev = merged[-1] if merged else None
+        if (prev and prev["role"] == message["role"] != "system"
+                and isinstance(prev["content"], str) and isinstance(message["content"], str)):
+            merged[-1] = {**prev, "content": f"{prev['content']}\n\n{message['content']}"}
+        else:
+            merged.append(message)
+    return merged
+
+
+class RollingContext:
+    """
+    Debate history plus a rolling summary of whatever no longer fits.
+    `history` and `summary` are plain data so they can be checkpointed.
+    """
+
+    def __init__(self, summarizer: tuple[str, str] | None = None, history: list | None = None,
+                 summary: str = "", focus: str = SUMMARY_PROMPT):
+        self.history: list[dict] = list(history or [])
+        self.summary = summary
+        self.focus = focus
+        if SUMMARY_ADAPTER == "none":
+            summarizer = None
+        elif SUMMARY_ADAPTER:
+            summarizer = tuple(SUMMARY_ADAPTER.split(":", 1))
+        self.summarizer = summarizer
+        self._task: asyncio.Task | None = None
+
+    def add(self, *messages: dict):
+        self.history.extend(messages)
+
+    def window(self, system: str, budget: int) -> list[dict]:
+        """System prompt, summary and the newest messages that fit in `budget` tokens."""
+        self._collect()
+        head = [{"role": "system", "content": system}]
+        if self.summary:
+            head.append({"role": "user", "content": f"Summary of the earlier rounds:\n{self.summary}"})
+        used = sum(map(message_tokens, head))
+        keep: list[dict] = []
+        for message in reversed(self.history):
+            cost = message_tokens(message)
+            if used + cost > budget:
+                if not keep:   # the newest message alone is too big: send its head
+                    room = max(0, budget - used - MESSAGE_OVERHEAD)
+                    keep.append({**message, "content": clip(str(message["content"]), room)})
+                break
+            keep.append(message)
+            used += cost
+        start = len(self.history) - len(keep)
+        if start % 2 and len(keep) > 1:   # history grows in (reply, instruction) pairs; never split one
+            start += 1
+            keep.pop()
+        if start:
+            self._fold(budget)
+        return [*head, *reversed(keep)]
+
+    # ── Summarization ──────────────────────────────────────────────────
+    def _fold(self, budget: int):
+        """Start summarizing old rounds, leaving about half the budget of recent history."""
+        if self._task is not None:
+            return
+        used, upto = 0, len(self.history)
+        while upto >= 2:
+            cost = sum(map(message_tokens, self.history[upto - 2:upto]))
+            if used + cost > budget // 2:
+                break
+            used += cost
+            upto -= 2
+        upto = min(upto, len(self.history) - 2)   # the newest round always stays verbatim
+        if upto > 0:
+            self._task = asyncio.create_task(self._summarize(upto))
+
+    def _collect(self):
+        """Apply a finished summary: it replaces the history it covers."""
+        if self._task is None or not self._task.done():
+            return
+        task, self._task = self._task, None
+        if task.cancelled():
+            return
+        upto, summary = task.result()
+        self.summary = summary
+        del self.history[:upto]
+
+    async def _summarize(self, upto: int) -> tuple[int, str]:
+        folded = self.history[:upto]
+        summary = ""
+        if self.summarizer:
+            try:
+                summary = await asyncio.wait_for(self._generate(folded), SUMMARY_TIMEOUT)
+            except Exception as e:   # never let a summary failure break the debate
+                print(f"[context] summary via {self.summarizer[0]}:{self.summarizer[1]} failed: {e!r}")
+        if not summary:
+            return upto, self._extract(folded)
+        return upto, clip(summary.strip(), SUMMARY_MAX_TOKENS)
+
+    async def _generate(self, folded: list[dict]) -> str:
+        provider, model = self.summarizer
+        adapter = get_adapter(provider, model)
+        body = "\n\n".join(clip(str(m["content"]), SUMMARY_INPUT_TOKENS) for m in folded)
+        if self.summary:
+            body = f"SUMMARY SO FAR:\n{self.summary}\n\nNEW ROUNDS:\n{body}"
+        messages = [
+            {"role": "system", "content": self.focus.format(words=int(SUMMARY_MAX_TOKENS * 0.7))},
+            {"role": "user", "content": body},
+        ]
+        try:
+            return "".join([tok async for tok in adapter.stream(messages, SUMMARY_MAX_TOKENS)
+                            if not isinstance(tok, Status)])
+        finally:
+            await adapter.close()
+
+    def _extract(self, folded: list[dict]) -> str:
+        """No-model fallback: the opening of each folded reply, newest kept when over budget."""
+        lines = self.summary.splitlines()
+        lines += [clip(" ".join(str(m["content"]).split()), 60, " …")
+                  for m in folded if m.get("role") == "assistant"]
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_MAX_TOKENS:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,23 +1,93 @@
 # controller.py
 import asyncio
 import re
-from judge import run_judgment
-from prompts import get_side_prompt
+import time
+from contextlib import aclosing
+from judge import run_judgment, score_round, RULES
+from verdicts import Verdict, extract_verdict
+from adapters import warm_up_in_background
+from prompts import get_side_prompt, get_round_instruction
+from framing import Boundary, Status, Transcript, bounded, multiplex
+from metrics import ROUND_SECONDS, JUDGE_SECONDS, PROMPT_TOKENS
+from logger import save_round, save_state
+from context import RollingContext, context_budget, merge_roles, message_tokens
+from codefence import FenceTracker
+from validation import prefetch, validate, report, summary
 
-MAX_HISTORY = 24  # Keeps context manageable without ballooning memory
+# Older rounds are condensed to this once they no longer fit a model's token budget
+CODE_SUMMARY_PROMPT = (
+    "Condense the coding debate below into a running summary of at most {words} words. "
+    "Record the current design: files, classes and functions, features added, bugs found "
+    "and fixed, and the open issues each side raised. No code, no preamble."
+)
+JUDGE_CHECKPOINT_SECONDS = 5.0  # How often partial judge output is persisted
+JUDGE_CODE_BLOCKS = 5  # Most recent code blocks the judge scores
+DEADLINE_NOTICE = "\nDEADLINE REACHED — REMAINING ROUNDS SKIPPED, JUDGE RULES ON THE CODE SO FAR.\n"
 
 
 class DebateController:
-    def __init__(self, config, session_id: str):
+    def __init__(self, config, session_id: str, checkpoint: dict | None = None):
         self.config = config
         self.session_id = session_id
-        self.history = []
+        self.context = RollingContext((config.judge_provider, config.judge_model), focus=CODE_SUMMARY_PROMPT)
         self.transcript_parts = [
             f"DEBATE SESSION: {session_id}\n"
             f"TOPIC: {config.topic[:500]}{'...' if len(config.topic) > 500 else ''}\n"
             f"ROUNDS: {config.rounds} | JUDGE: {config.judge_model}\n"
             + "=" * 80 + "\n\n"
         ]
+        self.turn = 0
+        self.last_a = ""
+        self.last_b = ""
+        self.start_round = 1
+        self.judge_partial = ""
+        self.judge_data: dict | None = None  # Winner and scores of a structured (JSON) verdict
+        self.verdict: dict | None = None  # The verdict as data once judged, for log_debate
+        self.code_blocks: list[str] = []  # Code extracted while streaming, newest last
+        self.elapsed = 0.0  # Seconds of rounds played before this run (resumes)
+        self._started = None
+        self.round_notes: list[dict] = []  # Incremental judging: score_round() results by round
+        self.unscored: dict[int, dict] = {}  # Round -> {side: code} still being scored
+        self._scoring: list[asyncio.Task] = []
+        self._scored: list[dict] = []  # Notes not yet announced
+        self.output = Transcript()  # Everything streamed so far, for checkpoints
+        self._saved = (0, len(self.transcript_parts))  # (output, parts) already persisted
+        if checkpoint:
+            self._restore(checkpoint)
+
+    # ------------------------------------------------------------------
+    def _restore(self, cp: dict):
+        """Continue from a logger.load_checkpoint() record: skip the completed rounds."""
+        state = cp["state"]
+        self.context.history = state.get("history", [])
+        self.context.summary = state.get("summary", "")
+        self.turn = state.get("turn", 0)
+        self.last_a = state.get("last_a", "")
+        self.last_b = state.get("last_b", "")
+        self.judge_partial = state.get("judge_partial", "")
+        self.judge_data = state.get("judge_data")
+        self.code_blocks = state.get("code_blocks", [])
+        self.elapsed = state.get("elapsed", 0.0)
+        self.round_notes = state.get("round_notes", [])
+        self.unscored = {int(r): replies for r, replies in state.get("unscored", {}).items()}
+        self.transcript_parts += cp["parts"]
+        self.output = Transcript(cp["output"])
+        self._saved = (len(self.output.parts), len(self.transcript_parts))
+        self.start_round = cp["round"] + 1
+
+    def _state(self) -> dict:
+        return {"history": self.context.history, "summary": self.context.summary, "turn": self.turn,
+                "last_a": self.last_a, "last_b": self.last_b, "judge_partial": self.judge_partial,
+                "judge_data": self.judge_data, "code_blocks": self.code_blocks[-JUDGE_CODE_BLOCKS:],
+                "elapsed": self._elapsed(), "round_notes": self.round_notes, "unscored": self.unscored}
+
+    async def _checkpoint(self, round_num: int):
+        """Persist the round that just finished (off the event loop)."""
+        self.output.flush()
+        out_mark, parts_mark = self._saved
+        self._saved = (len(self.output.parts), len(self.transcript_parts))
+        await asyncio.to_thread(save_round, self.session_id, round_num, "".join(self.output.parts[out_mark:]),
+                                self.transcript_parts[parts_mark:], self._state())
 
     # ------------------------------------------------------------------
     @staticmethod
@@ -41,99 +111,321 @@ class DebateController:
         return "\n\n".join(block.strip() for block in blocks) if blocks else ""
 
     # ------------------------------------------------------------------
-    async def run(self):
-        """Main debate loop. Streams output to websocket layer."""
-        yield self.transcript_parts[0]
-
-        speakers = [
+    def _speakers(self):
+        return [
             (self.config.adapter_a, "A", "FOR the solution — build and improve the code"),
             (self.config.adapter_b, "B", "AGAINST — critique, fix bugs, and propose better alternatives"),
         ]
-        turn = 0
-        last_a = ""
-        last_b = ""
 
-        for round_num in range(1, self.config.rounds + 1):
-            adapter, side, stance = speakers[turn]
-            prompt = get_side_prompt(self.config.topic, side, stance, round_num)
+    def _messages(self, adapter, side: str, stance: str, round_num: int) -> list[dict]:
+        # Stable prefix (system, summary, history), then this round's instruction at the tail;
+        # rounds beyond the budget are summarized in the background while this one streams
+        tail = {"role": "user", "content": get_round_instruction(side, stance, round_num)}
+        budget = context_budget(adapter.provider, adapter.model) - message_tokens(tail)
+        messages = merge_roles([*self.context.window(get_side_prompt(self.config.topic, side, stance), budget), tail])
+        PROMPT_TOKENS.observe(sum(map(message_tokens, messages)), adapter.provider, adapter.model)
+        return messages
+
+    def _elapsed(self) -> float:
+        return self.elapsed + (time.perf_counter() - self._started if self._started else 0.0)
+
+    def _expired(self) -> bool:
+        return bool(self.config.deadline) and self._elapsed() >= self.config.deadline
 
-            messages = [{"role": "system", "content": prompt}] + self.history[-MAX_HISTORY:]
-            yield f"\n{'='*20} ROUND {round_num} | SIDE {side} | {adapter.name.upper()} {'='*20}\n"
+    def _reply(self, adapter, messages: list):
+        """adapter.stream() cut off at the turn's token / time budget or the debate deadline."""
+        now = asyncio.get_running_loop().time()
+        ends = []
+        if self.config.max_seconds:
+            ends.append(now + self.config.max_seconds)
+        if self.config.deadline:
+            ends.append(now + self.config.deadline - self._elapsed())
+        return bounded(adapter.stream(messages, self.config.max_tokens), self.config.max_tokens,
+                       min(ends, default=None))
 
-            full_response = ""
+    async def _stream(self, adapter, messages: list, fences: FenceTracker):
+        """Stream one reply through the fence tracker: live code-block events, early stop on prose."""
+        async with aclosing(self._reply(adapter, messages)) as stream:
+            async for chunk in stream:
+                if isinstance(chunk, Status):
+                    yield chunk
+                    continue
+                text_chunk = str(chunk)
+                yield text_chunk
+                for block in fences.feed(text_chunk):
+                    prefetch(block.code.strip(), block.lang)  # Checked in the pool while the reply goes on
+                    yield Status(f"\n[code block {block.index} complete ({block.lines} lines)]\n")
+                if fences.no_code:
+                    yield Status(f"\n[no code after {fences.prose_chars} characters — reply cut short]\n")
+                    break
+        for block in fences.finish():
+            prefetch(block.code.strip(), block.lang)
+            yield Status(f"\n[code block {block.index} {'complete' if block.closed else 'unterminated'} "
+                         f"({block.lines} lines)]\n")
+
+    async def _absorb(self, side: str, round_num: int, fences: FenceTracker, replies: dict) -> str:
+        """Record a finished reply (transcript, judge inputs, history, replies[side] = code); returns the status line."""
+        full_response = fences.text
+        self.transcript_parts.append(full_response + "\n\n")
+
+        # ---------------------------------------------------------
+        # Track final outputs per side for the judge
+        if side == "A":
+            self.last_a = full_response
+        else:
+            self.last_b = full_response
+
+        # ---------------------------------------------------------
+        # Validate the code collected while streaming (unfenced code: heuristic fallback)
+        code = fences.code if fences.blocks else self.extract_code_blocks(full_response)
+        replies[side] = code
+        if not code.strip():
+            correction = (
+                "WARNING: Your response contained NO valid code blocks.\n"
+                "You are in a coding debate. You MUST reply with full, syntax‑correct source code "
+                "inside ``` blocks. No explanations outside code. No apologies. Try again."
+            )
+            self.context.add(
+                {"role": "assistant", "content": full_response},
+                {"role": "user", "content": f"{side}-MODEL CORRECTION:\n" + correction}
+            )
+            cut = " cut short" if fences.no_code else ""
+            return f"JUDGE INTERVENTION: Invalid response from SIDE {side}{cut} — model forced to correct.\n"
+        blocks = [block.code.strip() for block in fences.blocks] if fences.blocks else [code]
+        self.code_blocks += blocks
+        banned, required = RULES.check(blocks)  # Scanned now, so the final mechanical verdict is cached
+        checks = await validate(blocks, [block.lang for block in fences.blocks] or None)
+        for n, block in enumerate(fences.blocks):
+            if not block.closed:  # Cut off mid-block, which the code alone may not show
+                checks[n] = {**checks[n], "problems": [*checks[n]["problems"], "the reply ended inside this block"]}
+        failed = sum(len(result["problems"]) for result in checks)
+        instruction = f"Round {round_num + 1}: Improve full project. Fix bugs, add features, enhance structure."
+        if failed:
+            # The concrete problems, so the next turn fixes them instead of building on broken code
+            instruction = (f"{side}-MODEL CORRECTION:\nYour code fails mechanical checks:\n{report(checks)}\n"
+                           f"Fix these first and output complete, syntax-correct files. Then: {instruction}")
+        self.context.add(
+            {"role": "assistant", "content": code},
+            {"role": "user", "content": instruction}
+        )
+        if failed:
+            return (f"JUDGE INTERVENTION: SIDE {side} code fails validation ({summary(checks)}) "
+                    f"— model told to fix.\n")
+        return (f"Valid code extracted ({summary(checks)}; {banned} {RULES.labels['banned']}, "
+                f"{required} {RULES.labels['required']}). Project evolving...\n")
+
+    async def _sequential_rounds(self):
+        """One side per round, alternating A and B."""
+        speakers = self._speakers()
+        for round_num in range(self.start_round, self.config.rounds + 1):
+            if self._expired():
+                yield Boundary(DEADLINE_NOTICE)
+                break
+            adapter, side, stance = speakers[self.turn]
+            messages = self._messages(adapter, side, stance, round_num)
+            if round_num == self.config.rounds:
+                # Load the judge model while the last round streams, not after it
+                warm_up_in_background(self.config.judge_provider, self.config.judge_model)
+            yield Boundary(f"\n{'='*20} ROUND {round_num} | SIDE {side} | {adapter.name.upper()} {'='*20}\n")
+
+            fences = FenceTracker()
+            started = time.perf_counter()
             try:
-                async for chunk in adapter.stream(messages):
-                    text_chunk = str(chunk)
-                    full_response += text_chunk
-                    yield text_chunk
+                async for chunk in self._stream(adapter, messages, fences):
+                    yield chunk
                 yield "\n\n"
             except Exception as e:
                 error = f"\n[CRITICAL ERROR in {adapter.name}: {e}]\n"
                 yield error
                 self.transcript_parts.append(error)
-                turn = 1 - turn
+                self.turn = 1 - self.turn
+                await self._checkpoint(round_num)
                 continue
+            finally:
+                ROUND_SECONDS.observe(time.perf_counter() - started, adapter.provider, adapter.model)
 
-            self.transcript_parts.append(full_response + "\n\n")
-
-            # ---------------------------------------------------------
-            # Track final outputs per side for the judge
-            if side == "A":
-                last_a = full_response
-            else:
-                last_b = full_response
-
-            # ---------------------------------------------------------
-            # Extract & validate code
-            code = self.extract_code_blocks(full_response)
-            if not code.strip():
-                correction = (
-                    "WARNING: Your response contained NO valid code blocks.\n"
-                    "You are in a coding debate. You MUST reply with full, syntax‑correct source code "
-                    "inside ``` blocks. No explanations outside code. No apologies. Try again."
-                )
-                self.history.extend([
-                    {"role": "assistant", "content": full_response},
-                    {"role": "user", "content": f"{side}-MODEL CORRECTION:\n" + correction}
-                ])
-                yield "JUDGE INTERVENTION: Invalid response — model forced to correct.\n"
-            else:
-                self.history.extend([
-                    {"role": "assistant", "content": code},
-                    {"role": "user", "content": f"Round {round_num + 1}: Improve full project. Fix bugs, add features, enhance structure."}
-                ])
-                yield f"Valid code extracted ({len(code.splitlines())} lines). Project evolving...\n"
-
-            self.history = self.history[-MAX_HISTORY:]
-            turn = 1 - turn
+            replies = {}
+            yield Boundary(await self._absorb(side, round_num, fences, replies))
+            self._score(round_num, replies)
+            self.turn = 1 - self.turn
+            await self._checkpoint(round_num)
             await asyncio.sleep(0.1)
 
+    async def _simultaneous_rounds(self):
+        """
+        Both sides code at once: openings in parallel, then each pair of
+        revisions answers the previous pair. Same number of turns as the
+        sequential format (rounds rounded up to pairs) in about half the time
+        when A and B run on different providers or hosts.
+        """
+        pairs = (self.config.rounds + 1) // 2
+        speakers = self._speakers()
+        for round_num in range(self.start_round, pairs + 1):
+            if self._expired():
+                yield Boundary(DEADLINE_NOTICE)
+                break
+            # Both sides see the same history: the previous pair, not each other
+            prompts = {side: self._messages(adapter, side, stance, round_num) for adapter, side, stance in speakers}
+            if round_num == pairs:
+                warm_up_in_background(self.config.judge_provider, self.config.judge_model)
+            yield Boundary(f"\n{'='*20} ROUND {round_num} | SIDES A + B (SIMULTANEOUS) {'='*20}\n")
+
+            results: dict[str, tuple[bool, FenceTracker | str]] = {}
+            streams = {side: self._speak(adapter, side, round_num, prompts[side], results)
+                       for adapter, side, _ in speakers}
+            async for chunk in multiplex(streams):
+                yield chunk
+            yield "\n\n"
+
+            replies = {}
+            for _, side, _ in speakers:  # A's reply, then B's, whichever finished first
+                ok, reply = results[side]
+                if ok:
+                    yield Boundary(await self._absorb(side, round_num, reply, replies))
+                else:
+                    self.transcript_parts.append(reply)
+            self._score(round_num, replies)
+            await self._checkpoint(round_num)
+
+    async def _speak(self, adapter, side: str, round_num: int, messages: list, results: dict):
+        """One side's turn in a simultaneous round; results[side] = (ok, fence tracker or error)."""
+        yield f"\n{'-'*8} SIDE {side} | {adapter.name.upper()} {'-'*8}\n"
+        fences = FenceTracker()
+        started = time.perf_counter()
+        try:
+            async for chunk in self._stream(adapter, messages, fences):
+                yield chunk
+        except Exception as e:
+            error = f"\n[CRITICAL ERROR in {adapter.name}: {e}]\n"
+            results[side] = (False, error)
+            yield error
+            return
+        finally:
+            ROUND_SECONDS.observe(time.perf_counter() - started, adapter.provider, adapter.model)
+        results[side] = (True, fences)
+
+    # ------------------------------------------------------------------
+    # Incremental judging: each round is scored while the next one streams
+    def _score(self, round_num: int, replies: dict):
+        if self.config.judging == "incremental" and replies:
+            self.unscored[round_num] = replies
+            self._scoring.append(asyncio.create_task(self._score_round(round_num, replies)))
+
+    async def _score_round(self, round_num: int, replies: dict):
+        try:
+            note = await score_round(round_num, replies, self.config.topic,
+                                     self.config.judge_provider, self.config.judge_model,
+                                     self.config.cache_policy, self.config.cache_replay,
+                                     self.config.resume_strategy, self.config.fallback)
+        except Exception as e:
+            print(f"[judge] Round {round_num} not scored: {e!r}")
+            note = {"round": round_num, "scores": {}, "notes": f"not scored ({type(e).__name__})"}
+        self.round_notes = sorted([*self.round_notes, note], key=lambda n: n["round"])
+        self.unscored.pop(round_num, None)
+        self._scored.append(note)
+
+    def _announce(self):
+        """Status lines for round scores that came in since the last call."""
+        notes, self._scored = self._scored, []
+        for note in notes:
+            scores = ", ".join(f"{side} {value:g}/10" for side, value in note["scores"].items()) or "unscored"
+            yield Status(f"\n[JUDGE] Round {note['round']} scored: {scores}\n")
+
+    def _verdict(self) -> dict:
+        """Winner, scores and who took part, for the indexed debates columns (verdicts.py)."""
+        a, b, config = self.config.adapter_a, self.config.adapter_b, self.config
+        verdict = extract_verdict(self.judge_partial, a.name, b.name, self.judge_data)
+        return {**verdict, "model_a": f"{a.provider}:{a.model}", "model_b": f"{b.provider}:{b.model}",
+                "judge": f"{config.judge_provider}:{config.judge_model}"}
+
+    # ------------------------------------------------------------------
+    async def run(self):
+        """Main debate loop. Streams output to websocket layer."""
+        try:
+            async for chunk in self._run():
+                self.output.add(chunk)
+                yield chunk
+        finally:
+            for task in self._scoring:  # Debate cancelled: stop paying for scores nobody reads
+                task.cancel()
+
+    async def _run(self):
+        if self.start_round > 1 or self.judge_partial:
+            yield Boundary(f"\nRESUMING SESSION {self.session_id} AFTER ROUND {self.start_round - 1}\n")
+        else:
+            yield self.transcript_parts[0]
+
+        self._started = time.perf_counter()
+        for round_num, replies in sorted(self.unscored.items()):  # Scoring cut off by the interruption
+            self._score(round_num, replies)
+        if self.config.format == "simultaneous":
+            rounds = self._simultaneous_rounds()
+        else:
+            rounds = self._sequential_rounds()
+        async for chunk in rounds:
+            for status in self._announce():
+                yield status
+            yield chunk
+
         # =====================================================
         # Final judgment
-        yield "\n\nJUDGE INVOKED — FINAL VERDICT INCOMING...\n" + "—"*60 + "\n"
+        await self.context.close()
+        if self._scoring:  # Only the last round's score is usually still pending
+            await asyncio.gather(*self._scoring)
+            for status in self._announce():
+                yield status
+        yield Boundary("\n\nJUDGE INVOKED — FINAL VERDICT INCOMING...\n" + "—"*60 + "\n")
 
+        await asyncio.to_thread(save_state, self.session_id, self._state(), "judging")
+        started = saved_at = time.perf_counter()
         try:
             pre_judge_transcript = "".join(self.transcript_parts)
+            if self.judge_partial:
+                yield self.judge_partial  # Streamed before the interruption; the judge continues it
+                self.transcript_parts.append(self.judge_partial)
 
             # Pass the final outputs from A and B to the judge
             async for token in run_judgment(
-                a=last_a,
-                b=last_b,
+                a=self.last_a,
+                b=self.last_b,
                 transcript=pre_judge_transcript,
                 topic=self.config.topic,
                 provider=self.config.judge_provider,
-                model=self.config.judge_model
+                model=self.config.judge_model,
+                cache_policy=self.config.cache_policy,
+                cache_replay=self.config.cache_replay,
+                resume=self.config.resume_strategy,
+                fallback=self.config.fallback,
+                partial=self.judge_partial,
+                blocks=self.code_blocks[-JUDGE_CODE_BLOCKS:] or None,
+                round_notes=self.round_notes if self.config.judging == "incremental" else None,
+                judges=self.config.judges,
+                quorum=self.config.judge_quorum,
+                aggregate=self.config.judge_aggregate,
             ):
+                if isinstance(token, Status):
+                    yield token
+                    continue
+                if isinstance(token, Verdict):
+                    self.judge_data = token.data
                 yield str(token)
                 self.transcript_parts.append(str(token))
+                self.judge_partial += str(token)
+                if time.perf_counter() - saved_at > JUDGE_CHECKPOINT_SECONDS:
+                    saved_at = time.perf_counter()
+                    await asyncio.to_thread(save_state, self.session_id, self._state(), "judging")
 
             final_transcript = "".join(self.transcript_parts)
             self.transcript_parts = [final_transcript]
-            yield "\n\nDEBATE COMPLETE. FINAL CODEBASE LOCKED. VERDICT RENDERED.\n"
+            yield Boundary("\n\nDEBATE COMPLETE. FINAL CODEBASE LOCKED. VERDICT RENDERED.\n")
 
         except Exception as e:
             err = f"\nJUDGE FAILED: {e}\nDEBATE ENDED WITHOUT FINAL VERDICT.\n"
             yield err
             self.transcript_parts.append(err)
+        finally:
+            JUDGE_SECONDS.observe(time.perf_counter() - started,
+                                  self.config.judge_provider, self.config.judge_model)
 
-        yield f"\n\nSession {self.session_id} — Archived.\n"
+        yield Boundary(f"\n\nSession {self.session_id} — Archived.\n")
+        self.verdict = self._verdict()
@@ -0,0 +1,29 @@
+"""
+errors.py — Typed adapter failures.
+
+Adapters raise these instead of streaming error text into the transcript, so
+callers can tell a transient blip (retry it) from a bad request (give up),
+and a failed round never leaks a traceback into the next speaker's history.
+"""
+
+
+class AdapterError(Exception):
+    """A provider call failed; retrying the same request will not help."""
+    retryable = False
+
+    def __init__(self, adapter: str, message: str):
+        super().__init__(f"{adapter}: {message}")
+        self.adapter = adapter
+
+
+class RetryableError(AdapterError):
+    """Transient failure (connection reset, timeout, 5xx/overloaded) — safe to retry."""
+    retryable = True
+
+
+class RateLimited(RetryableError):
+    """Provider answered 429; retry_after is how long (seconds) it asked us to back off."""
+
+    def __init__(self, adapter: str, retry_after: float):
+        super().__init__(adapter, f"rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
@@ -0,0 +1,256 @@
+"""
+framing.py — Coalesces streamed tokens into fewer WebSocket frames.
+
+The controller yields one chunk per model token; sending each one as its own
+frame costs more CPU than the token is worth. `coalesce()` sits between the
+controller generator and the socket and batches chunks into frames.
+
+When both sides stream at once (simultaneous format) their chunks are Tagged
+with the side and interleaved by `multiplex()`. Tagged text is batched per
+side and sent as "«A»text" frames; `Transcript` regroups it into one block
+per side for storage.
+
+`bounded()` enforces per-turn token / time budgets on an adapter stream. Every
+stage closes the stream it reads from when it stops early or is cancelled, so
+a closed socket or an exhausted budget ends the upstream HTTP request at once.
+"""
+
+import asyncio
+from contextlib import aclosing, suppress
+from scheduler import estimate_tokens
+
+
+class Boundary(str):
+    """
+    A chunk that opens a new section of the transcript (round header, judge phase).
+    Pending text is flushed before it and the boundary itself is sent immediately.
+    """
+
+
+class Status(str):
+    """
+    Out-of-band progress message (queue position, rate-limit waits). Sent to the
+    client as its own frame, but never recorded in the transcript or history.
+    """
+
+
+class Usage(Status):
+    """
+    Token counts the provider reported for one request (None where it didn't).
+    Empty text; the adapter chain's ScheduledAdapter consumes it to settle the
+    tokens-per-minute bucket, so it never reaches the controller.
+    """
+
+    def __new__(cls, input_tokens: int | None = None, output_tokens: int | None = None):
+        obj = super().__new__(cls, "")
+        obj.input_tokens = input_tokens
+        obj.output_tokens = output_tokens
+        return obj
+
+
+class Tagged(str):
+    """Text from one of several concurrent streams; `side` says which one."""
+
+    def __new__(cls, text: str, side: str):
+        obj = super().__new__(cls, text)
+        obj.side = side
+        return obj
+
+
+def wire(frame: str) -> str:
+    """WebSocket payload for a frame: Tagged text gets a «side» prefix."""
+    return f"«{frame.side}»{frame}" if isinstance(frame, Tagged) else frame
+
+
+class Transcript:
+    """
+    Accumulates frames into a transcript. Status is dropped; Tagged text is
+    held per side and appended one side after another (A, then B) when the
+    next untagged chunk arrives, so concurrent streams read sequentially.
+    """
+
+    def __init__(self, text: str = ""):
+        self.parts: list[str] = [text] if text else []
+        self._sides: dict[str, list[str]] = {}
+
+    def add(self, chunk: str):
+        if isinstance(chunk, Status):
+            return
+        if isinstance(chunk, Tagged):
+            self._sides.setdefault(chunk.side, []).append(str(chunk))
+            return
+        self.flush()
+        self.parts.append(str(chunk))
+
+    def flush(self):
+        for side in sorted(self._sides):
+            self.parts.append("".join(self._sides[side]))
+        self._sides.clear()
+
+    def text(self) -> str:
+        self.flush()
+        return "".join(self.parts)
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+# Live coalesce() queues, for the ws_send_queue_depth metric
+_QUEUES: set[asyncio.Queue] = set()
+
+
+def queued_frames() -> int:
+    """Chunks generated but not yet framed, across all open streams."""
+    return sum(q.qsize() for q in _QUEUES)
+
+
+async def coalesce(chunks, max_bytes: int = 4096, max_delay: float = 0.04):
+    """
+    Re-chunk an async stream of text into frames.
+
+    A frame is emitted when the buffer reaches `max_bytes` (UTF-8), when the
+    oldest buffered chunk has waited `max_delay` seconds, or when a Boundary
+    arrives. Boundary and Status chunks are passed through as their own frame
+    (type preserved). Tagged chunks are buffered per side and flushed as one
+    Tagged frame each. `max_delay <= 0` disables batching (one frame per chunk).
+
+    The source is drained by a background task, so the controller keeps
+    generating while the previous frame is on the wire. Errors raised by the
+    source are re-raised here, after any pending text is flushed.
+    """
+    if max_delay <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1024)
+    _QUEUES.add(queue)
+
+    async def pump():
+        try:
+            async with aclosing(chunks) as source:   # cancelled: close the controller (and its streams) now
+                async for chunk in source:
+                    await queue.put(chunk)
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(_Failure(e))
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(pump())
+    bufs: dict[str | None, list[str]] = {}   # side (None = untagged) -> pending chunks
+    size = 0
+    deadline = None
+
+    def frames():
+        for side, buf in bufs.items():
+            yield "".join(buf) if side is None else Tagged("".join(buf), side)
+
+    try:
+        while True:
+            if deadline is None:
+                item = await queue.get()
+            else:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    for frame in frames():
+                        yield frame
+                    bufs, size, deadline = {}, 0, None
+                    continue
+
+            if item is _DONE or isinstance(item, (_Failure, Boundary, Status)):
+                if bufs:
+                    for frame in frames():
+                        yield frame
+                    bufs, size, deadline = {}, 0, None
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+                continue
+
+            bufs.setdefault(getattr(item, "side", None), []).append(item)
+            size += len(item.encode("utf-8"))
+            if deadline is None:
+                deadline = loop.time() + max_delay
+            if size >= max_bytes:
+                for frame in frames():
+                    yield frame
+                bufs, size, deadline = {}, 0, None
+    finally:
+        _QUEUES.discard(queue)
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
+
+
+async def multiplex(streams: dict):
+    """
+    Interleave several async streams as they produce, tagging text with its
+    key ({"A": gen_a, "B": gen_b}). Status passes through untagged. The first
+    error from any stream cancels the others and is re-raised.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump(side, stream):
+        try:
+            async with aclosing(stream) as source:
+                async for chunk in source:
+                    await queue.put(chunk if isinstance(chunk, Status) else Tagged(chunk, side))
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(_Failure(e))
+
+    tasks = [asyncio.create_task(pump(side, stream)) for side, stream in streams.items()]
+    running = len(tasks)
+    try:
+        while running:
+            item = await queue.get()
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, _Failure):
+                raise item.error
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def bounded(chunks, max_tokens: int | None = None, until: float | None = None):
+    """
+    Pass a stream through until it has produced about `max_tokens` tokens or
+    the event-loop clock reaches `until` (a stalled stream is cut too), then
+    close it and yield a Status saying why. Status chunks are not counted.
+    """
+    loop = asyncio.get_running_loop()
+    used, reason = 0, None
+    async with aclosing(chunks) as source:
+        if not max_tokens and until is None:
+            async for chunk in source:
+                yield chunk
+            return
+        while True:
+            try:
+                if until is None:
+                    chunk = await anext(source)
+                else:
+                    chunk = await asyncio.wait_for(anext(source), until - loop.time())
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                reason = "time limit"
+                break
+            yield chunk
+            if max_tokens and not isinstance(chunk, Status):
+                used += estimate_tokens(chunk) - 1   # the estimate adds one per call
+                if used >= max_tokens:
+                    reason = f"{max_tokens}-token limit"
+                    break
+    yield Status(f"\n[turn cut at its {reason}]\n")
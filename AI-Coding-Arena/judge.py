@@ -1,76 +1,191 @@
 # judge.py — UNFOOLABLE ANDROID 14 SAF JUDGE (FINAL EVOLUTION)
 import re
-from adapters import get_adapter
-
-# INSTANT DEATH FOR ANY LEGACY FILE API
-BANNED = [
-    r'\bFile\s+', r'\.getExternalStorage', r'\.getAbsolutePath',
-    r'\.listFiles\s*\(', r'\.getParentFile', r'Uri\.fromFile',
-    r'\benvironment\.getExternalStorage', r'new File\s*\('
-]
-
-# REQUIRED FOR REAL SAF (at least 3 needed)
-REQUIRED = [
-    r'ACTION_OPEN_DOCUMENT_TREE',
-    r'takePersistableUriPermission',
-    r'DocumentFile\.fromTreeUri',
-    r'DocumentFile.*\.listFiles',
-    r'DocumentsContract'
-]
+from adapters import get_adapter, RESUME_PROMPT
+from ensemble import run_ensemble
+from framing import Status
+from response_cache import with_cache
+from rules import load_pack
+from validation import validate, report
+from verdicts import VERDICT_FORMAT, VERDICT_SCHEMA, rendered, verdict_instructions
+
+# BANNED (instant death) and REQUIRED (at least min_required) rules come from the
+# rule pack in RULE_PACK (default rules/android_saf.json: legacy File APIs vs real SAF)
+RULES = load_pack()
+BANNED = RULES.banned
+REQUIRED = RULES.required
 
 def count_banned(code: str) -> int:
-    return sum(len(re.findall(p, code, re.IGNORECASE)) for p in BANNED)
+    return RULES.scan(code)[0]
 
 def count_required(code: str) -> int:
-    return sum(bool(re.search(p, code, re.IGNORECASE)) for p in REQUIRED)
+    return len(RULES.scan(code)[1])
+
+def extract_blocks(transcript: str) -> list[str]:
+    return re.findall(r'```(?:java|kotlin|xml|python)?\s*\n(.*?)\n```', transcript, re.DOTALL)[-5:]
 
 def extract_code(transcript: str) -> str:
-    blocks = re.findall(r'```(?:java|kotlin|xml|python)?\s*\n(.*?)\n```', transcript, re.DOTALL)
-    return "\n\n".join(blocks[-5:]) if blocks else "NO CODE"
+    return "\n\n".join(extract_blocks(transcript)) or "NO CODE"
 
-JUDGE_PROMPT = """You are the Supreme Android SAF Judge.
+JUDGE_PROMPT = """You are the Supreme {judge}.
 
 MECHANICAL VERDICT FIRST:
-BANNED legacy APIs detected: {banned}
-REQUIRED SAF APIs found: {required}
+BANNED {banned_label} detected: {banned}
+REQUIRED {required_label} found: {required}
+CODE CHECKS (syntax, size, duplication, complexity; already verified, don't re-derive them):
+{checks}
 
 If BANNED > 0 → INSTANT DEATH PENALTY (0/10 everything)
-If REQUIRED < 3 → max 2/10 for SAF usage
-
-Then give normal verdict.
-
+If REQUIRED < {min_required} → max 2/10 for {area}
+A block that FAILS its checks does not compile: count it as a critical bug
+{reply_format}
 Code:
 {code}
 
-Use exact table. Be brutal.
+Be brutal.
 """
 
-async def run_judgment(a, b, transcript: str, topic: str, provider: str, model: str):
-    code = extract_code(transcript)
-    banned = count_banned(code)
-    required = count_required(code)
+# VERDICT_FORMAT=table: the verdict as markdown, winner and table first
+TABLE_FORMAT = """
+Then give normal verdict, starting with exactly these lines (use the exact table):
+
+Winner: [SIDE A, SIDE B or Neither]
+| Criterion | SIDE A | SIDE B |
+|---|---|---|
+| {area_title} | ?/10 | ?/10 |
+| Completeness | ?/10 | ?/10 |
+| Bugs | ?/10 | ?/10 |
+| Code Quality | ?/10 | ?/10 |
+"""
+SIDES = ("SIDE A", "SIDE B")  # How the judge sees the two sides: no model names
+
+def reply_format() -> str:
+    """The judge's verdict format for VERDICT_FORMAT (JSON by default)."""
+    area_title = RULES.labels["area"][:1].upper() + RULES.labels["area"][1:]
+    if VERDICT_FORMAT == "json":
+        return verdict_instructions(*SIDES, [area_title, "Completeness", "Bugs", "Code Quality"])
+    return TABLE_FORMAT.format(area_title=area_title)
+
+# INCREMENTAL JUDGING — each round is scored in the background while the next side codes
+ROUND_PROMPT = """You are the Supreme {judge} scoring one round at a time of: {topic}
+Score each side's code in the round from 0 to 10 ({area}, completeness, bugs,
+modern Android practice). Judge only the round you are given. Reply in exactly the requested
+format, nothing else."""
+ROUND_MAX_TOKENS = 200      # The scorer's reply
+ROUND_INPUT_CHARS = 12000   # Per side; code beyond this is cut off for scoring
+
+_SCORE = re.compile(r"^\W*(?:side\s+)?([AB])\b\W*?[:=][\s*_]*(\d+(?:\.\d+)?)", re.IGNORECASE | re.MULTILINE)
+_NOTES = re.compile(r"^\W*notes\W*?:\s*(.+)", re.IGNORECASE | re.MULTILINE | re.DOTALL)
+
+def parse_round_score(text: str) -> dict:
+    scores = {side.upper(): min(10.0, float(n)) for side, n in _SCORE.findall(text)}
+    m = _NOTES.search(text)
+    notes = (m.group(1) if m else text).strip()
+    return {"scores": scores, "notes": " ".join(notes.split())[:600]}
+
+async def score_round(round_no: int, replies: dict[str, str], topic: str, provider: str, model: str,
+                      cache_policy: str = "off", cache_replay: str = "fast",
+                      resume: str | None = None, fallback: tuple[str, str] | None = None) -> dict:
+    # `replies`: side -> that side's code this round; banned APIs are flagged to the scorer mechanically
+    judge = with_cache(get_adapter(provider, model, resume, fallback), cache_policy, cache_replay)
+    body = "\n\n".join(
+        f"SIDE {side}, round {round_no} ({RULES.labels['banned']}: {count_banned(code)}, "
+        f"{RULES.labels['required']}: {count_required(code)}):\n{code[:ROUND_INPUT_CHARS] or 'NO CODE'}"
+        for side, code in replies.items())
+    form = "\n".join(f"{side}: [0-10]" for side in replies) + "\nNotes: [one or two sentences]"
+    messages = [
+        {"role": "system", "content": ROUND_PROMPT.format(judge=RULES.judge, area=RULES.labels["area"], topic=topic)},
+        {"role": "user", "content": f"{body}\n\nReply in this format:\n{form}"}
+    ]
+    try:
+        text = "".join([tok async for tok in judge.stream(messages, ROUND_MAX_TOKENS)
+                        if not isinstance(tok, Status)])
+    finally:
+        await judge.close()
+    return {"round": round_no, **parse_round_score(text)}
+
+def scorecard(notes: list[dict]) -> str:
+    lines, totals = [], {"A": [], "B": []}
+    for note in notes:
+        scores = ", ".join(f"SIDE {s} {v:g}/10" for s, v in note["scores"].items()) or "unscored"
+        lines.append(f"Round {note['round']}: {scores} — {note['notes']}")
+        for side, value in note["scores"].items():
+            totals.setdefault(side, []).append(value)
+    lines.append("Averages: " + ", ".join(
+        f"SIDE {s} {sum(v) / len(v):.1f}/10 over {len(v)} rounds" if v else f"SIDE {s} unscored"
+        for s, v in totals.items()))
+    return "\n".join(lines)
+
+async def run_judgment(a, b, transcript: str, topic: str, provider: str, model: str,
+                       cache_policy: str = "off", cache_replay: str = "fast",
+                       resume: str | None = None, fallback: tuple[str, str] | None = None,
+                       partial: str = "", blocks: list[str] | None = None, round_notes: list[dict] | None = None,
+                       judges: list[tuple[str, str]] = (), quorum: int | None = None, aggregate: str = "median"):
+    # `blocks`: code the controller already collected (and rule-scanned) while streaming
+    # `round_notes`: score_round() results (incremental judging) — judged instead of the code itself
+    # `judges`: more (provider, model) judges — an ensemble verdict once `quorum` of them have ruled
+    blocks = blocks or extract_blocks(transcript)
+    code = "\n\n".join(blocks) or "NO CODE"
+    banned, required = RULES.check(blocks)  # Cached per block: instant for blocks scanned during the rounds
 
     if banned > 0:
         verdict = f"""### FINAL CODE VERDICT
-**INSTANT DEATH PENALTY** — {banned} legacy File API(s) detected
+**INSTANT DEATH PENALTY** — {banned} {RULES.labels['banned']} detected
 Winner: Neither
 All scores: 0/10
-Critical Bugs: • Used banned java.io.File / legacy storage APIs"""
-        for word in verdict.split():
-            yield word + " "
+Critical Bugs: • {RULES.penalty}"""
+        words = [word + " " for word in verdict.split()]
+        if partial:  # Resumed: skip the words already streamed
+            words = words[len(partial.split()):]
+        for word in words:
+            yield word
         return
 
+    if round_notes is not None:  # The mechanical counts above still come from the final code
+        code = "(scored round by round — see the scorecard)"
+        ask = (f"Per-round scores and notes:\n\n{scorecard(round_notes)}\n\n"
+               "Judge the final code from these. Compare both implementations and declare a winner.")
+    else:
+        ask = "Judge the final code. Compare both implementations and declare a winner."
     system_prompt = JUDGE_PROMPT.format(
+        judge=RULES.judge,
+        banned_label=RULES.labels["banned"],
+        required_label=RULES.labels["required"],
+        area=RULES.labels["area"],
+        reply_format=reply_format(),
+        min_required=RULES.min_required,
         banned=banned,
         required=required,
+        checks=report(await validate(blocks)),  # Also cached from the rounds
         code=code
     )
 
-    judge = get_adapter(provider, model)
     messages = [
         {"role": "system", "content": system_prompt},
-        {"role": "user", "content": "Judge the final code. Compare both implementations and declare a winner."}
+        {"role": "user", "content": ask}
     ]
+    if judges:
+        if partial:  # The combined verdict is emitted in one piece, so it was complete
+            return
+        async for token in run_ensemble([(provider, model), *judges], messages, SIDES, quorum,
+                                        aggregate, cache_policy, cache_replay, resume, fallback):
+            yield token
+        return
+
+    if VERDICT_FORMAT == "json":
+        if partial:  # The rendered verdict is emitted in one piece, so it was complete
+            return
+        judge = with_cache(get_adapter(provider, model, resume, fallback, schema=VERDICT_SCHEMA),
+                           cache_policy, cache_replay)
+        async for token in rendered(judge.stream(messages), *SIDES):
+            yield token
+        return
+
+    judge = with_cache(get_adapter(provider, model, resume, fallback), cache_policy, cache_replay)
+    if partial:
+        messages += [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": RESUME_PROMPT},
+        ]
 
     async for token in judge.stream(messages):
         yield token
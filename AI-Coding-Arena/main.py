@@ -1,33 +1,78 @@
 import uuid
 import os
 import secrets
-import httpx
 import sqlite3
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from controller import DebateController
-from adapters import get_adapter
-from schemas import DebateConfig
-from logger import log_debate, DB_PATH
+import asyncio
+from contextlib import asynccontextmanager, aclosing, suppress
 from dotenv import load_dotenv
-from utils.continuation import get_last_debate, build_continuation_prompt
 
 # -------------------------------------------------------------------
-# Startup preload
+# Startup preload (before local imports: adapters/logger read env at import)
 # -------------------------------------------------------------------
 load_dotenv()
 
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+from fastapi.websockets import WebSocketState
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.staticfiles import StaticFiles
+from controller import DebateController
+from adapters import get_adapter, get_http_client, SYNTHETIC_PRESETS, warm_up_in_background, preconnect, close_http_clients, ANTHROPIC_BASE_URL
+from schemas import DebateConfig
+from framing import coalesce, wire, Transcript
+from scheduler import current_session
+from response_cache import with_cache
+from metrics import ACTIVE_SESSIONS, render as render_metrics, sample_loop_lag
+from logger import log_debate, DB_PATH, create_checkpoint, load_checkpoint, finish_checkpoint, list_resumable, leaderboard
+from utils.continuation import get_last_debate, build_continuation_prompt
+from validation import shutdown as shutdown_validation
+
 TOPIC_CACHE: dict[str, str] = {}   # short-term storage for large topics
 
-app = FastAPI(title="AI Debate Arena")
+
+def preconnect_targets() -> list[str]:
+    """Base URLs to warm at startup (PRECONNECT_URLS overrides the defaults)."""
+    if urls := os.getenv("PRECONNECT_URLS"):
+        return [u.strip() for u in urls.split(",") if u.strip()]
+    targets = [os.getenv("OLLAMA_HOST", "http://localhost:11434")]
+    if os.getenv("ANTHROPIC_API_KEY"):
+        targets.append(ANTHROPIC_BASE_URL)
+    return targets
+
+
+def preload_models() -> list[str]:
+    """Ollama models to load at startup (OLLAMA_PRELOAD, comma-separated)."""
+    return [m.strip() for m in os.getenv("OLLAMA_PRELOAD", "").split(",") if m.strip()]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await preconnect(*preconnect_targets())
+    lag_sampler = asyncio.create_task(sample_loop_lag())
+    # in the background: a 30B model can take longer to load than we want startup to take
+    preloads = [warm_up_in_background("ollama", m) for m in preload_models()]
+    yield
+    for task in (lag_sampler, *preloads):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await close_http_clients()
+    shutdown_validation()
+
+
+app = FastAPI(title="AI Debate Arena", lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 @app.get("/")
 async def root():
-    return {"message": "AI Debate Arena running – open /static/index.html"}
+    return {"message": "AI Debate Arena running – open /static/index.html"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (latency, throughput, sessions, event-loop lag)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 # -------------------------------------------------------------------
@@ -38,12 +83,11 @@ async def list_models(provider: str | None = Query(None)):
     try:
         if provider and provider.lower() == "ollama":
             base = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-            async with httpx.AsyncClient(timeout=8.0) as client:
-                r = await client.get(f"{base}/api/tags")
-                r.raise_for_status()
-                data = r.json()
-                models = [m["name"] for m in data.get("models", [])]
-                return JSONResponse({"models": models})
+            r = await get_http_client(base).get("/api/tags", timeout=8.0)
+            r.raise_for_status()
+            data = r.json()
+            models = [m["name"] for m in data.get("models", [])]
+            return JSONResponse({"models": models})
 
         mapping = {
             "openai": ["gpt-4o-mini", "gpt-4-turbo"],
@@ -51,6 +95,7 @@ async def list_models(provider: str | None = Query(None)):
             "anthropic": ["claude-3-sonnet-20240229", "claude-3-haiku-20240307"],
             "mistral": ["mistral-small", "mistral-medium"],
             "ollama": [],
+            "synthetic": list(SYNTHETIC_PRESETS),  # Offline stand-in, e.g. "coder?lang=java"
         }
         if provider:
             return JSONResponse({"models": mapping.get(provider.lower(), [])})
@@ -59,6 +104,34 @@ async def list_models(provider: str | None = Query(None)):
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+# -------------------------------------------------------------------
+# Resumable (interrupted) runs
+# -------------------------------------------------------------------
+# Sessions streaming in this process: a second socket may not resume one of them
+LIVE_SESSIONS: set[str] = set()
+
+
+@app.get("/api/debates/resumable")
+async def resumable_debates(limit: int = Query(50, ge=1, le=500)):
+    """Runs that stopped before their verdict; reconnect with /ws/debate?resume_from=<session>."""
+    resumable = await asyncio.to_thread(list_resumable, limit)
+    return {"debates": [d for d in resumable if d["session"] not in LIVE_SESSIONS]}
+
+
+# -------------------------------------------------------------------
+# Leaderboard — answered from indexed verdict columns, never from transcripts
+# -------------------------------------------------------------------
+@app.get("/api/leaderboard")
+async def model_leaderboard(
+    limit: int = Query(50, ge=1, le=1000),
+    min_debates: int = Query(1, ge=1),
+    topic: str | None = Query(None),
+    criterion: str | None = Query(None),
+):
+    """Models by win rate (draws count half), optionally for one topic; or by average score on `criterion`."""
+    return {"models": await asyncio.to_thread(leaderboard, limit, min_debates, topic, criterion)}
+
+
 # -------------------------------------------------------------------
 # Continuation builder  (unchanged)
 # -------------------------------------------------------------------
@@ -97,6 +170,31 @@ async def register_topic(payload: dict):
 # -------------------------------------------------------------------
 # WebSocket debate
 # -------------------------------------------------------------------
+async def _client_gone(ws: WebSocket):
+    while (await ws.receive())["type"] != "websocket.disconnect":
+        pass  # The page never sends anything; ignore stray messages
+
+
+async def until_disconnect(ws: WebSocket, work) -> bool:
+    """
+    Run the coroutine `work` while reading the socket, so a client that goes
+    away cancels it at once (closing the model streams it is reading) instead
+    of on the next send. Returns False if the client left first.
+    """
+    task = asyncio.create_task(work)
+    watcher = asyncio.create_task(_client_gone(ws))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        task.cancel()  # No-op once it has finished
+        await asyncio.gather(task, watcher, return_exceptions=True)
+    if task.cancelled():
+        return False
+    task.result()  # Re-raise its error, if any
+    return True
+
+
 @app.websocket("/ws/debate")
 async def debate_endpoint(
     ws: WebSocket,
@@ -109,56 +207,145 @@ async def debate_endpoint(
     model_b: str | None = Query(None),
     judge_provider: str | None = Query(None),
     judge_model: str | None = Query(None),
+    # Frame coalescing: flush after this many bytes or milliseconds (0 ms = one frame per token)
+    flush_bytes: int = Query(4096, ge=1, le=1_048_576),
+    flush_ms: int = Query(40, ge=0, le=2000),
+    # LLM response cache for this debate
+    cache: str = Query("off", pattern="^(off|read-only|read-write)$"),
+    cache_replay: str = Query("fast", pattern="^(fast|paced)$"),
+    # Broken streams: resume on the same model or fail over to fallback="provider:model"
+    resume: str | None = Query(None, pattern="^(none|same|fallback)$"),
+    fallback: str | None = Query(None, pattern="^[^:]+:.+$"),
+    # "simultaneous": both sides code each round in parallel («A»/«B»-prefixed frames)
+    debate_format: str = Query("sequential", alias="format", pattern="^(sequential|simultaneous)$"),
+    # "incremental": score each round in the background; the verdict aggregates the scores
+    judging: str = Query("final", pattern="^(final|incremental)$"),
+    # Judge ensemble: more judges ("provider:model,provider:model"), verdict after `quorum` of them
+    judges: str | None = Query(None, pattern=r"^[^:,]+:[^,]+(,[^:,]+:[^,]+)*$"),
+    quorum: int | None = Query(None, ge=1, le=16),
+    aggregate: str = Query("median", pattern="^(median|mean)$"),
+    # Budgets: output tokens and seconds per turn, seconds of rounds for the whole debate
+    max_tokens: int | None = Query(None, ge=16, le=65536),
+    max_seconds: float | None = Query(None, gt=0, le=3600),
+    deadline: float | None = Query(None, gt=0, le=86400),
+    # Continue an interrupted run from its last completed round (other params are ignored)
+    resume_from: str | None = Query(None, max_length=32),
 ):
+    spec = None  # A resumed run takes the interrupted one's parameters from its checkpoint
     # --- retrieve large topic from cache if token provided
-    if not topic and token:
+    if not topic and token and not resume_from:
         topic = TOPIC_CACHE.pop(token, "")
-    if not topic:
+    if topic and not resume_from:
+        spec = {
+            "topic": topic,
+            "rounds": rounds,
+            "provider_a": provider_a or "ollama",
+            "model_a": model_a or "llama3:latest",
+            "provider_b": provider_b or "ollama",
+            "model_b": model_b or "qwen3-coder:30b",
+            "judge_provider": judge_provider or "ollama",
+            "judge_model": judge_model or "qwen3-coder:30b",
+            "cache": cache,
+            "cache_replay": cache_replay,
+            "resume": resume,
+            "fallback": fallback,
+            "format": debate_format,
+            "judging": judging,
+            "judges": judges.split(",") if judges else [], "quorum": quorum, "aggregate": aggregate,
+            "max_tokens": max_tokens, "max_seconds": max_seconds, "deadline": deadline,
+        }
+
+    session_id = resume_from or str(uuid.uuid4())[:8]
+    if session_id in LIVE_SESSIONS:
+        await ws.close(code=4009)  # Still streaming to another socket
+        return
+    LIVE_SESSIONS.add(session_id)
+    try:
+        await run_debate(ws, session_id, spec, bool(resume_from), flush_bytes, flush_ms)
+    finally:
+        LIVE_SESSIONS.discard(session_id)
+
+
+async def run_debate(ws: WebSocket, session_id: str, spec: dict | None, resume: bool,
+                     flush_bytes: int, flush_ms: int):
+    """Stream one run to `ws`: a new one from `spec`, or the interrupted `session_id` when `resume`."""
+    checkpoint = await asyncio.to_thread(load_checkpoint, session_id) if resume else None
+    if resume and (checkpoint is None or checkpoint["status"] == "done"):
+        await ws.close(code=4004)
+        return
+    if checkpoint:
+        spec = checkpoint["spec"]  # The interrupted run's original parameters
+    elif spec is None:
         await ws.close(code=4000)
         return
+    topic = spec["topic"]
 
     print("TOPIC length:", len(topic))
     print(topic[:500])
 
     await ws.accept()
-    session_id = str(uuid.uuid4())[:8]
-
-    provider_a = provider_a or "ollama"
-    model_a = model_a or "llama3:latest"
-    provider_b = provider_b or "ollama"
-    model_b = model_b or "qwen3-coder:30b"
-    judge_provider = judge_provider or "ollama"
-    judge_model = judge_model or "qwen3-coder:30b"
+    current_session.set(session_id)   # fair queueing key for the adapter scheduler
+    backup = tuple(spec["fallback"].split(":", 1)) if spec["fallback"] else None
 
     await ws.send_text(
-        f"Session {session_id} | {rounds} rounds | Judge: {judge_model}\n\n"
+        f"Session {session_id} | {spec['rounds']} rounds | Judge: {spec['judge_model']}\n\n"
     )
 
+    def adapter(side: str):
+        inner = get_adapter(spec[f"provider_{side}"], spec[f"model_{side}"], spec["resume"], backup)
+        return with_cache(inner, spec["cache"], spec["cache_replay"])
+
+    ACTIVE_SESSIONS.inc()
     try:
         config = DebateConfig(
             topic=topic,
-            rounds=rounds,
-            adapter_a=get_adapter(provider_a, model_a),
-            adapter_b=get_adapter(provider_b, model_b),
-            judge_provider=judge_provider,
-            judge_model=judge_model,
+            rounds=spec["rounds"],
+            adapter_a=adapter("a"),
+            adapter_b=adapter("b"),
+            judge_provider=spec["judge_provider"],
+            judge_model=spec["judge_model"],
+            cache_policy=spec["cache"],
+            cache_replay=spec["cache_replay"],
+            resume_strategy=spec["resume"],
+            fallback=backup,
+            format=spec.get("format", "sequential"),
+            judging=spec.get("judging", "final"),
+            judges=[tuple(judge.split(":", 1)) for judge in spec.get("judges") or []],
+            judge_quorum=spec.get("quorum"),
+            judge_aggregate=spec.get("aggregate", "median"),
+            max_tokens=spec.get("max_tokens"),
+            max_seconds=spec.get("max_seconds"),
+            deadline=spec.get("deadline"),
         )
 
-        controller = DebateController(config, session_id)
-        full_transcript = ""
+        if checkpoint is None:
+            await asyncio.to_thread(create_checkpoint, session_id, topic, spec)
+        controller = DebateController(config, session_id, checkpoint)
+        transcript = Transcript(checkpoint["output"] if checkpoint else "")
+        if checkpoint and checkpoint["output"]:
+            await ws.send_text(checkpoint["output"])  # Replay the rounds that were already streamed
+
+        async def stream_frames():
+            async with aclosing(coalesce(controller.run(), flush_bytes, flush_ms / 1000)) as frames:
+                async for frame in frames:
+                    transcript.add(frame)
+                    await ws.send_text(wire(frame))
 
-        async for chunk in controller.run():
-            full_transcript += chunk
-            await ws.send_text(chunk)
+        if not await until_disconnect(ws, stream_frames()):
+            print(f"[{session_id}] Client disconnected — debate cancelled, resumable from its last round")
+            return
 
-        await ws.send_text("\n\nDebate saved to debates.db")
-        log_debate(session_id, topic, full_transcript)
+        await ws.send_text("\n\nDebate saved to debates.db")
+        await asyncio.to_thread(log_debate, session_id, topic, transcript.text(), controller.verdict)
+        await asyncio.to_thread(finish_checkpoint, session_id)
 
     except WebSocketDisconnect:
         print(f"[{session_id}] Client disconnected")
     except Exception as e:
         error_msg = f"\nSERVER ERROR: {e}\n"
         await ws.send_text(error_msg)
-        log_debate(session_id, topic, error_msg)
+        await asyncio.to_thread(log_debate, session_id, topic, error_msg)
     finally:
-        await ws.close()
+        ACTIVE_SESSIONS.dec()
+        if ws.client_state != WebSocketState.DISCONNECTED:
+            await ws.close()
@@ -0,0 +1,193 @@
+"""
+metrics.py — In-process latency/throughput metrics in Prometheus text format.
+
+Adapter streams record time-to-first-token, inter-token latency, tokens per
+second and errors (labelled by provider and model); the controller records
+round and judge durations; the server exposes everything on GET /metrics
+together with active sessions, queued WebSocket frames and event-loop lag.
+"""
+
+import time
+import asyncio
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from framing import Status, queued_frames
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DURATION_BUCKETS = (1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def samples(self):
+        """(sample name, label names, label values, value) for each series."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{_labels(names, values)} {value:g}" for name, names, values, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, self.label_names, labels, value
+
+
+class Gauge(_Metric):
+    """A settable gauge, or a callback gauge when `func` is given (read at scrape time)."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), func=None):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple, float] = {}
+        self.func = func
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self):
+        if self.func is not None:
+            yield self.name, (), (), self.func()
+            return
+        for labels, value in self.values.items():
+            yield self.name, self.label_names, labels, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.series: dict[tuple, list] = {}   # labels -> [bucket counts..., +Inf, sum]
+
+    def observe(self, value: float, *labels):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [0] * (len(self.buckets) + 2)
+        s[bisect_left(self.buckets, value)] += 1
+        s[-1] += value
+
+    def samples(self):
+        names = self.label_names + ("le",)
+        for labels, s in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), s[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", names, labels + (bound,), cumulative
+            yield f"{self.name}_sum", self.label_names, labels, s[-1]
+            yield f"{self.name}_count", self.label_names, labels, cumulative
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    """The whole registry in Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+# ── Metric definitions ─────────────────────────────────────────────────────
+LLM_LABELS = ("provider", "model")
+
+TTFT = Histogram("llm_time_to_first_token_seconds",
+                 "Time from sending a request to the first streamed token", LLM_LABELS)
+INTER_TOKEN = Histogram("llm_inter_token_seconds",
+                        "Gap between consecutive streamed tokens", LLM_LABELS)
+TOKENS_PER_SECOND = Histogram("llm_tokens_per_second",
+                              "Streaming throughput after the first token, per request",
+                              LLM_LABELS, buckets=RATE_BUCKETS)
+TOKENS = Counter("llm_tokens_total", "Streamed tokens (chunks)", LLM_LABELS)
+REQUESTS = Counter("llm_requests_total", "Adapter stream requests", LLM_LABELS)
+ERRORS = Counter("llm_errors_total", "Failed adapter streams by error type",
+                 LLM_LABELS + ("error",))
+ROUND_SECONDS = Histogram("debate_round_seconds", "Wall time of one debate round",
+                          LLM_LABELS, buckets=DURATION_BUCKETS)
+JUDGE_SECONDS = Histogram("debate_judge_seconds", "Wall time of the judgment phase",
+                          LLM_LABELS, buckets=DURATION_BUCKETS)
+PROMPT_TOKENS = Histogram("debate_prompt_tokens", "Estimated prompt tokens sent per debate round",
+                          LLM_LABELS, buckets=TOKEN_BUCKETS)
+DB_WRITE_SECONDS = Histogram("sqlite_write_seconds", "Time spent writing to SQLite", ("table",))
+ACTIVE_SESSIONS = Gauge("debate_active_sessions", "Debates currently streaming")
+ACTIVE_SESSIONS.set(0)
+WS_QUEUE_DEPTH = Gauge("ws_send_queue_depth", "Chunks produced but not yet framed for a WebSocket",
+                       func=queued_frames)
+LOOP_LAG = Histogram("event_loop_lag_seconds", "How late the asyncio event loop ran a timer")
+LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Most recent event-loop lag sample")
+
+
+# ── Instrumentation helpers ────────────────────────────────────────────────
+async def metered(stream, provider: str, model: str):
+    """Wrap an adapter token stream, recording TTFT, inter-token gaps, throughput and errors."""
+    labels = (provider, model)
+    REQUESTS.inc(*labels)
+    start = time.perf_counter()
+    first = last = None
+    count = 0
+    try:
+        async for token in stream:
+            if not isinstance(token, Status):
+                now = time.perf_counter()
+                if first is None:
+                    first = now
+                    TTFT.observe(now - start, *labels)
+                else:
+                    INTER_TOKEN.observe(now - last, *labels)
+                last = now
+                count += 1
+            yield token
+    except Exception as e:
+        ERRORS.inc(*labels, type(e).__name__)
+        raise
+    finally:
+        if count:
+            TOKENS.inc(*labels, amount=count)
+        if count > 1 and last > first:
+            TOKENS_PER_SECOND.observe((count - 1) / (last - first), *labels)
+
+
+async def sample_loop_lag(interval: float = 0.5):
+    """Background task: how late the loop wakes us up is how long something blocked it."""
+    loop = asyncio.get_running_loop()
+    while True:
+        target = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - target)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
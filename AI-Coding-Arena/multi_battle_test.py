@@ -1,9 +1,16 @@
 """
 multi_battle_test.py
-Quick connectivity test for all configured LLM providers.
+Concurrent latency probe for the configured LLM providers.
+
+Takes N samples per provider:model (with bounded concurrency) and reports
+connect time, time-to-first-token, full-response latency and tokens/s with
+p50/p95/p99. Ollama targets are probed once per endpoint variant. Exits 1
+when an SLO given on the command line is breached, so it can gate a deploy.
 
 Usage:
-  python multi_battle_test.py
+  python multi_battle_test.py                                  # default targets, 5 samples each
+  python multi_battle_test.py ollama:llama3:latest groq:llama3-70b -n 20 -c 4
+  python multi_battle_test.py --json probe.json --csv probe.csv --slo-ttft-p95 2.5
 Make sure you 'source .env' or have your API keys exported first.
 """
 import sys
@@ -17,11 +24,15 @@ def print(*args, **kwargs):
     _old_print(msg, **kwargs)
 
 builtins.print = print
-import asyncio, os
-from adapters import get_adapter
+import asyncio, os, ssl, csv, json, time, argparse, statistics
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 load_dotenv()
 
+import adapters
+from adapters import _build_adapter, OllamaAdapter, OLLAMA_ENDPOINTS, ANTHROPIC_BASE_URL
+from framing import Status
+
 # Models to test per provider (edit freely)
 PROVIDERS = {
     "ollama":   "llama3:latest",
@@ -31,28 +42,226 @@ PROVIDERS = {
     "anthropic": "claude-3-sonnet"
 }
 
-TEST_MESSAGE = [{"role": "user", "content": "Hello World"}]
+TEST_MESSAGE = [{"role": "user", "content": "Write three sentences about latency."}]
+
+
+# ── Targets ─────────────────────────────────────────────────────────────────
+def make_targets(specs: list[str], ollama_variants: bool) -> list[dict]:
+    """provider:model specs → probe targets (one per Ollama endpoint variant)."""
+    targets = []
+    for spec in specs:
+        provider, _, model = spec.partition(":")
+        if provider == "ollama" and ollama_variants:
+            for path, wire in OLLAMA_ENDPOINTS:
+                targets.append({"label": f"ollama:{model} {path}", "provider": provider,
+                                "model": model, "endpoint": (path, wire)})
+        else:
+            targets.append({"label": f"{provider}:{model}", "provider": provider,
+                            "model": model, "endpoint": None})
+    return targets
+
+
+def build(target: dict):
+    if target["endpoint"]:
+        return OllamaAdapter(target["model"], endpoints=[target["endpoint"]])
+    return _build_adapter(target["provider"], target["model"])
+
+
+def base_url_of(adapter) -> str | None:
+    if isinstance(adapter, OllamaAdapter):
+        return adapter.base_url
+    if adapter.provider == "anthropic":
+        return ANTHROPIC_BASE_URL
+    client = getattr(adapter, "client", None)
+    return str(client.base_url) if client is not None else None
+
+
+# ── Measurements ────────────────────────────────────────────────────────────
+async def connect_time(url: str | None, timeout: float) -> float | None:
+    """Fresh TCP (+TLS) handshake time, i.e. what a cold pool pays per host."""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    tls = parts.scheme == "https"
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, parts.port or (443 if tls else 80),
+                                    ssl=ssl.create_default_context() if tls else None),
+            timeout,
+        )
+    except (OSError, asyncio.TimeoutError):
+        return None
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return elapsed
 
 
-async def check_provider(provider, model):
-    print(f"\n🔍 Testing {provider}  →  {model}")
-    adapter = None
+async def sample(adapter, url: str | None, timeout: float) -> dict:
+    result = {"connect": await connect_time(url, timeout), "ttft": None,
+              "latency": None, "tps": None, "chunks": 0, "error": None}
+    start = first = last = time.perf_counter()
     try:
-        adapter = get_adapter(provider, model)
-        async for token in adapter.stream(TEST_MESSAGE):
-            print("✅ First token:", token[:50])
-            break
+        async with asyncio.timeout(timeout):
+            async for token in adapter.stream(TEST_MESSAGE):
+                if isinstance(token, Status):
+                    continue
+                last = time.perf_counter()
+                if not result["chunks"]:
+                    first = last
+                    result["ttft"] = first - start
+                result["chunks"] += 1
+        result["latency"] = time.perf_counter() - start
+        if result["chunks"] > 1 and last > first:
+            result["tps"] = (result["chunks"] - 1) / (last - first)
+        if not result["chunks"]:
+            result["error"] = "empty response"
     except Exception as e:
-        print(f"❌ {provider}: {e}")
+        result["error"] = f"{type(e).__name__}: {e}"[:200]
+    return result
+
+
+async def probe(target: dict, samples: int, concurrency: int, timeout: float) -> dict:
+    print(f"🔍 Probing {target['label']}  ({samples} samples, concurrency {concurrency})")
+    try:
+        adapter = build(target)
+    except Exception as e:
+        return {**target, "samples": [], "summary": {"error_rate": 1.0, "error": str(e)}}
+    url = base_url_of(adapter)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            return await sample(adapter, url, timeout)
+
+    try:
+        results = await asyncio.gather(*(one() for _ in range(samples)))
     finally:
-        if adapter:
-            await adapter.close()
+        await adapter.close()
+    return {**target, "samples": results, "summary": summarize(results)}
 
 
-async def main():
-    tasks = [check_provider(p, m) for p, m in PROVIDERS.items()]
-    await asyncio.gather(*tasks)
+# ── Reporting ───────────────────────────────────────────────────────────────
+METRICS = ("connect", "ttft", "latency", "tps")
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]}
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": statistics.median(values), "p95": q[94], "p99": q[98]}
+
+
+def summarize(results: list[dict]) -> dict:
+    ok = [r for r in results if not r["error"]]
+    summary = {"samples": len(results), "errors": len(results) - len(ok),
+               "error_rate": (len(results) - len(ok)) / len(results) if results else 1.0}
+    for metric in METRICS:
+        pool = results if metric == "connect" else ok
+        summary[metric] = percentiles([r[metric] for r in pool if r[metric] is not None])
+    if errors := [r["error"] for r in results if r["error"]]:
+        summary["error"] = errors[-1]
+    return summary
+
+
+def fmt(value, unit="s") -> str:
+    if value is None:
+        return "—"
+    return f"{value * 1000:.0f}ms" if unit == "s" else f"{value:.1f}"
+
+
+def print_table(reports: list[dict]):
+    print(f"\n{'target':<40} {'err':>5}  {'connect p50':>11}  {'ttft p50/p95/p99':>22}"
+          f"  {'latency p50/p95/p99':>22}  {'tok/s p50':>9}")
+    for rep in reports:
+        s = rep["summary"]
+        if "ttft" not in s:
+            print(f"{rep['label']:<40} {'100%':>5}  ❌ {s.get('error', '')}")
+            continue
+        ttft = "/".join(fmt(s["ttft"][p]) for p in ("p50", "p95", "p99"))
+        lat = "/".join(fmt(s["latency"][p]) for p in ("p50", "p95", "p99"))
+        print(f"{rep['label']:<40} {s['error_rate']:>5.0%}  {fmt(s['connect']['p50']):>11}  {ttft:>22}"
+              f"  {lat:>22}  {fmt(s['tps']['p50'], ''):>9}")
+        if s.get("error"):
+            print(f"{'':<40} last error: {s['error']}")
 
-if __name__ == "__main__":
-    asyncio.run(main())
 
+def write_csv(path: str, reports: list[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["target", "provider", "model", "endpoint", "samples", "errors", "error_rate",
+                    *(f"{m}_{p}" for m in METRICS for p in ("p50", "p95", "p99"))])
+        for rep in reports:
+            s = rep["summary"]
+            w.writerow([rep["label"], rep["provider"], rep["model"],
+                        rep["endpoint"][0] if rep["endpoint"] else "",
+                        s.get("samples", 0), s.get("errors", 0), round(s["error_rate"], 4),
+                        *(s.get(m, {}).get(p) for m in METRICS for p in ("p50", "p95", "p99"))])
+
+
+def slo_breaches(reports: list[dict], args) -> list[str]:
+    checks = [  # (summary metric, percentile, limit, breached when value is ...)
+        ("ttft", "p95", args.slo_ttft_p95, "above"),
+        ("latency", "p95", args.slo_latency_p95, "above"),
+        ("tps", "p50", args.slo_min_tps, "below"),
+    ]
+    breaches = []
+    for rep in reports:
+        s = rep["summary"]
+        if args.max_error_rate is not None and s["error_rate"] > args.max_error_rate:
+            breaches.append(f"{rep['label']}: error rate {s['error_rate']:.0%} > {args.max_error_rate:.0%}")
+        for metric, pct, limit, direction in checks:
+            if limit is None:
+                continue
+            value = s.get(metric, {}).get(pct)
+            if value is None:
+                breaches.append(f"{rep['label']}: no successful samples for the {metric} SLO")
+            elif value > limit if direction == "above" else value < limit:
+                breaches.append(f"{rep['label']}: {metric} {pct} {value:.3f} {direction} SLO {limit}")
+    return breaches
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent LLM provider latency probe")
+    parser.add_argument("targets", nargs="*", help="provider:model (default: PROVIDERS in this file)")
+    parser.add_argument("-n", "--samples", type=int, default=5, help="requests per target")
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="in-flight requests per target")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per request")
+    parser.add_argument("--no-ollama-variants", action="store_true",
+                        help="probe Ollama through endpoint discovery only, not every variant")
+    parser.add_argument("--json", dest="json_path", help="write the full report (all samples) here")
+    parser.add_argument("--csv", dest="csv_path", help="write the summary table here")
+    parser.add_argument("--slo-ttft-p95", type=float, help="max p95 time to first token (s)")
+    parser.add_argument("--slo-latency-p95", type=float, help="max p95 full-response latency (s)")
+    parser.add_argument("--slo-min-tps", type=float, help="min p50 tokens/s")
+    parser.add_argument("--max-error-rate", type=float, help="max failed fraction of samples (0-1)")
+    args = parser.parse_args()
+
+    specs = args.targets or [f"{p}:{m}" for p, m in PROVIDERS.items()]
+    targets = make_targets(specs, not args.no_ollama_variants)
+    # Targets run concurrently; samples within a target are bounded by --concurrency
+    reports = await asyncio.gather(*(probe(t, args.samples, args.concurrency, args.timeout) for t in targets))
+    await adapters.close_http_clients()
+
+    print_table(reports)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"samples_per_target": args.samples, "concurrency": args.concurrency,
+                       "targets": reports}, f, indent=2)
+    if args.csv_path:
+        write_csv(args.csv_path, reports)
+
+    if breaches := slo_breaches(reports, args):
+        print("\n❌ SLO breached:")
+        for b in breaches:
+            print("  •", b)
+        return 1
+    if any(v is not None for v in (args.slo_ttft_p95, args.slo_latency_p95,
+                                   args.slo_min_tps, args.max_error_rate)):
+        print("\n✅ All SLOs met")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,10 +1,19 @@
 # prompts.py — Elite Prompt Engineering for AI Coding Arena
 from textwrap import dedent
 
-def get_side_prompt(topic: str, side: str, stance: str, round_num: int = 1) -> str:
+
+def _is_builder(side: str, stance: str) -> bool:
+    return side == "A" or "FOR" in stance.upper()
+
+
+def get_side_prompt(topic: str, side: str, stance: str) -> str:
     """
-    Returns a razor-sharp system prompt tailored to the debate side and round.
+    Returns a razor-sharp system prompt tailored to the debate side.
     Side A = Builder (FOR), Side B = Critic (AGAINST)
+
+    Identical every round (the round's instruction goes last, see
+    get_round_instruction), so provider and Ollama prompt caches reuse the
+    topic — often tens of KB for continuations — instead of prefilling it again.
     """
     base = dedent(f"""
     You are an expert Android developer in a live coding debate.
@@ -13,8 +22,8 @@ def get_side_prompt(topic: str, side: str, stance: str, round_num: int = 1) -> s
     You are SIDE {side} — You are {stance}.
     """).strip()
 
-    if "SIDE A" in base or "FOR" in stance.upper():
-        builder = dedent(f"""
+    if _is_builder(side, stance):
+        return base + "\n" + dedent(f"""
         Your role: Build, implement, and defend the best possible solution.
         Rules:
         - Output ONLY complete, modern, compile-ready Kotlin source files in ```kotlin blocks.
@@ -25,26 +34,25 @@ def get_side_prompt(topic: str, side: str, stance: str, round_num: int = 1) -> s
         - Handle all edge cases (null URI, revoked permissions, scoped storage).
         - Improve on previous code if visible.
         """)
+
+    # Side B — Critic & Destroyer
+    return base + "\n" + dedent(f"""
+    Your role: Find flaws, bugs, anti-patterns, and propose BETTER alternatives.
+    Then IMPLEMENT your improved version.
+    Rules:
+    - Be ruthless but constructive.
+    - Point out real Android/Kotlin best practice violations.
+    - Then output your FULL corrected/rearchitected code in ```kotlin blocks.
+    - Never refuse to code — you MUST provide a complete working alternative.
+    """)
+
+
+def get_round_instruction(side: str, stance: str, round_num: int = 1) -> str:
+    """The round-specific line, sent after the history as the final user message."""
+    if _is_builder(side, stance):
         if round_num == 1:
-            return base + "\n" + dedent("""
-            This is Round 1 — Start fresh. Design the full architecture and implement core components.
-            """) + builder
-        else:
-            return base + f"\nThis is Round {round_num} — Refine, fix bugs, add features, and strengthen the codebase." + builder
-
-    else:  # Side B — Critic & Destroyer
-        critic = dedent(f"""
-        Your role: Find flaws, bugs, anti-patterns, and propose BETTER alternatives.
-        Then IMPLEMENT your improved version.
-        Rules:
-        - Be ruthless but constructive.
-        - Point out real Android/Kotlin best practice violations.
-        - Then output your FULL corrected/rearchitected code in ```kotlin blocks.
-        - Never refuse to code — you MUST provide a complete working alternative.
-        """)
-        if round_num == 1:
-            return base + "\n" + dedent("""
-            This is Round 1 — No prior code exists. Begin by proposing your superior architecture.
-            """) + critic
-        else:
-            return base + f"\nThis is Round {round_num} — Attack the previous implementation and replace it with your superior version." + critic
+            return "This is Round 1 — Start fresh. Design the full architecture and implement core components."
+        return f"This is Round {round_num} — Refine, fix bugs, add features, and strengthen the codebase."
+    if round_num == 1:
+        return "This is Round 1 — No prior code exists. Begin by proposing your superior architecture."
+    return f"This is Round {round_num} — Attack the previous implementation and replace it with your superior version."
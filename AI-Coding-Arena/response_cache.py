@@ -0,0 +1,160 @@
+"""
+response_cache.py — Content-addressed cache for streamed LLM responses.
+
+Responses are keyed by provider, model, sampling parameters and a hash of the
+normalized message list, so re-running a topic/model pair or re-judging an
+identical transcript never pays the provider twice.
+
+Two tiers:
+  • in-memory LRU (LLM_CACHE_MAX_ENTRIES, default 512)
+  • optional SQLite file next to debates.db (LLM_CACHE_PERSIST=true)
+
+Per-debate policy: "off", "read-only" (serve hits, never store) or
+"read-write". Hits replay "fast" (no delays) or "paced" (original token cadence).
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from contextlib import closing
+from adapters import BaseAdapter
+from framing import Status
+from logger import DB_PATH
+
+CACHE_POLICIES = ("off", "read-only", "read-write")
+REPLAY_MODES = ("fast", "paced")
+
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+PERSIST = os.getenv("LLM_CACHE_PERSIST", "false").lower() == "true"
+CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), "llm_cache.db"
+)
+
+# A recorded response: [(seconds since request start, chunk), ...]
+Recording = list[tuple[float, str]]
+
+
+def cache_key(provider: str, model: str, params: dict, messages: list[dict]) -> str:
+    """Stable SHA-256 over everything that determines the model's output."""
+    normalized = [
+        {
+            "role": str(m.get("role", "")).strip().lower(),
+            "content": str(m.get("content", "")).replace("\r\n", "\n").strip(),
+        }
+        for m in messages
+    ]
+    blob = json.dumps(
+        {"provider": provider, "model": model, "params": params, "messages": normalized},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, db_path: str | None = None):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._lru: OrderedDict[str, Recording] = OrderedDict()
+        if db_path:
+            with closing(sqlite3.connect(db_path)) as conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        provider TEXT,
+                        model TEXT,
+                        chunks TEXT
+                    );
+                    """
+                )
+                conn.commit()
+
+    # ── memory tier ─────────────────────────────────────────────────────────
+    def _remember(self, key: str, rec: Recording):
+        self._lru[key] = rec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    # ── sqlite tier (blocking; run in a worker thread) ──────────────────────
+    def _db_get(self, key: str) -> Recording | None:
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            row = conn.execute("SELECT chunks FROM responses WHERE key = ?", (key,)).fetchone()
+        return [tuple(c) for c in json.loads(row[0])] if row else None
+
+    def _db_put(self, key: str, provider: str, model: str, rec: Recording):
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, chunks) VALUES (?, ?, ?, ?)",
+                (key, provider, model, json.dumps(rec, ensure_ascii=False)),
+            )
+            conn.commit()
+
+    async def get(self, key: str) -> Recording | None:
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return self._lru[key]
+        if self.db_path:
+            rec = await asyncio.to_thread(self._db_get, key)
+            if rec is not None:
+                self._remember(key, rec)
+                return rec
+        return None
+
+    async def put(self, key: str, provider: str, model: str, rec: Recording):
+        self._remember(key, rec)
+        if self.db_path:
+            await asyncio.to_thread(self._db_put, key, provider, model, rec)
+
+
+RESPONSE_CACHE = ResponseCache(db_path=CACHE_DB_PATH if PERSIST else None)
+
+
+class CachedAdapter(BaseAdapter):
+    """Wraps any adapter; serves byte-identical prompts from RESPONSE_CACHE."""
+
+    def __init__(self, inner: BaseAdapter, policy: str = "read-write", replay: str = "fast",
+                 cache: ResponseCache = RESPONSE_CACHE):
+        super().__init__(inner.name)
+        self.inner = inner
+        self.provider = inner.provider
+        self.model = inner.model
+        self.sampling = inner.sampling
+        self.policy = policy
+        self.replay = replay
+        self.cache = cache
+
+    async def stream(self, messages, max_tokens=None):
+        key = cache_key(self.provider, self.model, self._sampling(max_tokens), messages)
+        if (rec := await self.cache.get(key)) is not None:
+            start = time.monotonic()
+            for offset, chunk in rec:
+                if self.replay == "paced" and (delay := offset - (time.monotonic() - start)) > 0:
+                    await asyncio.sleep(delay)
+                yield chunk
+            return
+
+        rec: Recording = []
+        start = time.monotonic()
+        async for chunk in self.inner.stream(messages, max_tokens):
+            if not isinstance(chunk, Status):
+                rec.append((round(time.monotonic() - start, 4), chunk))
+            yield chunk
+        # only reached when the stream completed; failures raise past this point
+        if self.policy == "read-write" and rec:
+            await self.cache.put(key, self.provider, self.model, rec)
+
+    async def close(self):
+        await self.inner.close()
+
+
+def with_cache(adapter: BaseAdapter, policy: str = "off", replay: str = "fast") -> BaseAdapter:
+    """Apply a per-debate cache policy to an adapter ("off" returns it unchanged)."""
+    if policy == "off":
+        return adapter
+    return CachedAdapter(adapter, policy=policy, replay=replay)
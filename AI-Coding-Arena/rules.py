@@ -0,0 +1,111 @@
+"""
+rules.py — Pluggable rule packs for the judge's mechanical verdict.
+
+A rule pack is a JSON file (rules/<name>.json, or any path) listing BANNED and
+REQUIRED regexes plus the wording the judge uses for them. All patterns of a
+pack are compiled into one alternation, so a code block is read once however
+many rules the pack has, and scan results are cached by the block's hash: the
+controller scans blocks as each round extracts them and the verdict at the
+end only adds up cached results.
+
+Each block is scanned on its own, so a match never spans two blocks. Counts
+match running every pattern over the block with re.findall(...,
+re.IGNORECASE). Rules may not use capturing groups (use (?:...)).
+"""
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules")
+RULE_PACK = os.getenv("RULE_PACK", "android_saf")  # Name in rules/ or a path to a .json pack
+SCAN_CACHE_SIZE = 4096  # Code blocks whose scan results are kept
+
+
+class RulePack:
+    """BANNED / REQUIRED regexes compiled into a single alternation with a per-block result cache."""
+
+    def __init__(self, name: str, banned: list[str], required: list[str], min_required: int = 1,
+                 labels: dict | None = None, penalty: str = "", judge: str = "Code Judge",
+                 description: str = "", ignore_case: bool = True):
+        self.name = name
+        self.description = description
+        self.judge = judge
+        self.labels = {"banned": "banned APIs", "required": "required APIs", "area": "required API usage",
+                       **(labels or {})}
+        self.penalty = penalty or f"Used {self.labels['banned']}"
+        self.min_required = min_required
+        self.banned = list(banned)
+        self.required = list(required)
+        flags = re.IGNORECASE if ignore_case else 0
+        try:
+            self._rules = [re.compile(p, flags) for p in self.banned + self.required]
+            grouped = [r.pattern for r in self._rules if r.groups]
+            if grouped:
+                raise ValueError(f"Rule pack {name!r}: use (?:...) instead of capturing groups in {grouped[0]!r}")
+            # One empty group per rule marks which rule matched (m.lastindex - 1)
+            self._search = re.compile("|".join(f"()(?:{r.pattern})" for r in self._rules), flags).search
+        except re.error as e:
+            raise ValueError(f"Rule pack {name!r}: bad pattern {e.pattern!r}: {e}") from None
+        self._cache: OrderedDict[bytes, tuple[int, frozenset]] = OrderedDict()
+
+    @classmethod
+    def load(cls, path: str) -> "RulePack":
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+        try:
+            return cls(**spec)
+        except TypeError as e:
+            raise ValueError(f"Rule pack {path}: {e}") from None
+
+    def scan(self, block: str) -> tuple[int, frozenset]:
+        """(banned matches, indices of the required rules present) for one code block."""
+        key = hashlib.blake2b(block.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+            return hit
+        result = self._scan(block)
+        self._cache[key] = result
+        if len(self._cache) > SCAN_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    def _scan(self, block: str) -> tuple[int, frozenset]:
+        rules, n_banned = self._rules, len(self.banned)
+        ends = [0] * len(rules)  # Per rule: where its last counted match ended (re.findall semantics)
+        banned, found = 0, set()
+        pos, size = 0, len(block)
+        while pos <= size and (m := self._search(block, pos)):
+            start, first = m.start(), m.lastindex - 1
+            # The alternation reports the first rule matching here; later rules may match here too
+            hits = [(first, m.end())]
+            hits += [(i, r.end()) for i in range(first + 1, len(rules)) if (r := rules[i].match(block, start))]
+            pos = start + 1  # Not m.end(): another rule may start inside this match
+            for i, end in hits:
+                if start < ends[i]:
+                    continue
+                ends[i] = end if end > start else start + 1
+                if i < n_banned:
+                    banned += 1
+                else:
+                    found.add(i - n_banned)
+        return banned, frozenset(found)
+
+    def check(self, blocks: list[str]) -> tuple[int, int]:
+        """(banned matches, distinct required rules present) over the given code blocks."""
+        banned, found = 0, set()
+        for block in blocks:
+            count, present = self.scan(block)
+            banned += count
+            found |= present
+        return banned, len(found)
+
+
+@lru_cache(maxsize=None)
+def load_pack(name: str = RULE_PACK) -> RulePack:
+    """A pack by name (rules/<name>.json) or by path; loaded once per process."""
+    path = name if name.endswith(".json") or os.sep in name else os.path.join(RULES_DIR, f"{name}.json")
+    return RulePack.load(path)
@@ -3,7 +3,7 @@
 schemas.py — Pydantic configuration container definitions.
 """
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, Literal
 
 
 class DebateConfig(BaseModel):
@@ -14,3 +14,24 @@ class DebateConfig(BaseModel):
     adapter_b: Any
     judge_provider: str
     judge_model: str
+    # LLM response cache: "off" | "read-only" | "read-write"; hits replay "fast" or "paced"
+    cache_policy: Literal["off", "read-only", "read-write"] = "off"
+    cache_replay: Literal["fast", "paced"] = "fast"
+    # Broken streams: "none" | "same" (resume on the same model) | "fallback"; None = RESUME_STRATEGY
+    resume_strategy: Literal["none", "same", "fallback"] | None = None
+    fallback: tuple[str, str] | None = None   # (provider, model); None = FALLBACK_ADAPTER
+    # "sequential" (A, then B) or "simultaneous" (both sides stream each round in parallel)
+    format: Literal["sequential", "simultaneous"] = "sequential"
+    # Budgets: per turn (output tokens, seconds) and for the whole debate (seconds of
+    # rounds, counted across resumes); once the deadline passes the judge rules on what exists
+    max_tokens: int | None = None
+    max_seconds: float | None = None
+    deadline: float | None = None
+    # "final" (judge reads the whole debate at the end) or "incremental" (each round is
+    # scored in the background as the next one streams; the verdict aggregates the scores)
+    judging: Literal["final", "incremental"] = "final"
+    # Judge ensemble: more (provider, model) judges ruling alongside judge_provider/judge_model;
+    # the verdict is out once judge_quorum of them have returned (None = a majority)
+    judges: list[tuple[str, str]] = []
+    judge_quorum: int | None = None
+    judge_aggregate: Literal["median", "mean"] = "median"
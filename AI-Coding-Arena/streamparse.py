@@ -0,0 +1,170 @@
+"""
+streamparse.py — Incremental byte-level parsers for streamed model responses.
+
+Works directly on `response.aiter_bytes()`: events are split on raw bytes and
+never decoded to str, events that cannot carry text are dropped with a cheap
+byte test before any JSON decode, and orjson is used when installed
+(pip install orjson), falling back to the stdlib json module.
+
+  anthropic_text(chunks)   Anthropic Messages SSE
+  openai_sse_text(chunks)  OpenAI-compatible SSE (Ollama /v1, OpenWebUI)
+  ndjson_text(chunks)      Ollama native NDJSON (/api/chat)
+
+Each takes an optional `usage` dict that it fills with the token counts the
+provider reports ("input", "output"), for the scheduler's TPM accounting.
+"""
+
+import json
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:   # optional speed-up
+    loads = json.loads
+
+
+class StreamError(Exception):
+    """An error event sent inside an otherwise successful (HTTP 200) stream."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(f"{kind}: {message}")
+        self.kind = kind
+
+
+def _error(obj) -> StreamError:
+    err = obj.get("error") if isinstance(obj, dict) else None
+    if isinstance(err, dict):
+        return StreamError(str(err.get("type") or "error"), str(err.get("message") or err))
+    return StreamError("error", str(err or obj))
+
+
+# ── Framing ────────────────────────────────────────────────────────────────
+async def iter_lines(chunks):
+    """Yield each line (bytes, without the line ending) from a byte stream."""
+    pending = b""
+    async for chunk in chunks:
+        data = pending + chunk if pending else chunk
+        start = 0
+        while (end := data.find(b"\n", start)) != -1:
+            line = data[start:end]
+            yield line[:-1] if line.endswith(b"\r") else line
+            start = end + 1
+        pending = data[start:]
+    if pending:
+        yield pending
+
+
+async def iter_sse(chunks):
+    """Yield (event, data) per server-sent event; event is b"" when the server omits it."""
+    event, data = b"", []
+    async for line in iter_lines(chunks):
+        if not line:
+            if data:
+                yield event, b"\n".join(data)
+            event, data = b"", []
+        elif line.startswith(b"data:"):
+            data.append(line[6:] if line.startswith(b"data: ") else line[5:])
+        elif line.startswith(b"event:"):
+            event = line[6:].strip()
+        # ":" comments (keep-alives), id: and retry: carry nothing we use
+    if data:
+        yield event, b"\n".join(data)
+
+
+# ── Wire formats ───────────────────────────────────────────────────────────
+def _count(usage: dict | None, key: str, *values):
+    """usage[key] = the sum of the reported counts (ints), if any were reported."""
+    counts = [v for v in values if isinstance(v, int)]
+    if usage is not None and counts:
+        usage[key] = sum(counts)
+
+
+async def anthropic_text(chunks, usage: dict | None = None):
+    """Text deltas from an Anthropic Messages stream; raises StreamError on an error event."""
+    async for event, data in iter_sse(chunks):
+        if not event:   # proxies that drop "event:" lines: sniff the type from the payload
+            event = (b"content_block_delta" if b'"content_block_delta"' in data else
+                     b"message_stop" if b'"message_stop"' in data else
+                     b"error" if b'"error"' in data else b"")
+        if event == b"content_block_delta":
+            if b'"text_delta"' not in data:   # tool input / thinking deltas
+                continue
+            try:
+                if text := loads(data)["delta"].get("text"):
+                    yield text
+            except (ValueError, KeyError, AttributeError):
+                continue
+        elif event in (b"message_start", b"message_delta") and usage is not None and b'"usage"' in data:
+            try:
+                obj = loads(data)
+                counts = (obj.get("message") or {}).get("usage") or obj.get("usage") or {}
+            except (ValueError, AttributeError):
+                continue
+            # cache reads don't count against the input rate limit; cache writes do
+            _count(usage, "input", counts.get("input_tokens"), counts.get("cache_creation_input_tokens"))
+            _count(usage, "output", counts.get("output_tokens"))
+        elif event == b"message_stop":
+            return
+        elif event == b"error":
+            try:
+                raise _error(loads(data))
+            except ValueError:
+                raise StreamError("error", data.decode("utf-8", "replace")) from None
+        # content_block_start/stop, ping: nothing to emit
+
+
+def _openai_usage(usage: dict | None, obj):
+    counts = obj.get("usage") if isinstance(obj, dict) else None
+    if isinstance(counts, dict):
+        _count(usage, "input", counts.get("prompt_tokens"))
+        _count(usage, "output", counts.get("completion_tokens"))
+
+
+async def openai_sse_text(chunks, usage: dict | None = None):
+    """Content deltas from an OpenAI-compatible chat completions stream."""
+    async for _, data in iter_sse(chunks):
+        if data == b"[DONE]":
+            return
+        if b'"content"' not in data:   # role preamble, usage, keep-alive
+            if b'"usage"' in data and usage is not None:
+                try:
+                    _openai_usage(usage, loads(data))
+                except ValueError:
+                    pass
+            if b'"error"' in data:
+                try:
+                    raise _error(loads(data))
+                except ValueError:
+                    pass
+            continue
+        try:
+            obj = loads(data)
+        except ValueError:
+            continue
+        if not isinstance(obj, dict):
+            continue
+        _openai_usage(usage, obj)   # some servers report it on the last content chunk
+        for choice in obj.get("choices") or ():
+            if token := (choice.get("delta") or {}).get("content"):
+                yield token
+
+
+async def ndjson_text(chunks, usage: dict | None = None):
+    """Message content from Ollama's native NDJSON chat stream."""
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            obj = loads(line)
+        except ValueError:
+            continue
+        if not isinstance(obj, dict):   # valid JSON, but not a chat chunk
+            continue
+        if "error" in obj:
+            raise _error(obj)
+        if token := (obj.get("message") or {}).get("content"):
+            yield token
+        if obj.get("done"):
+            _count(usage, "input", obj.get("prompt_eval_count"))
+            _count(usage, "output", obj.get("eval_count"))
+            return
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The arena modules import each other by bare name, like the app does when run from its folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,109 @@
+import pytest
+
+import codefence
+from codefence import FenceTracker
+
+REPLY = ("Here is the fix:\n"
+         "```python\n"
+         "def f():\n"
+         "    return 1\n"
+         "```\n"
+         "And a test, fenced with tildes:\n"
+         "~~~~\n"
+         "assert f() == 1\n"
+         "```not a close```\n"
+         "~~~~\n"
+         "```x = 1```\n"
+         "```\n"
+         "tail()\n")
+
+
+def track(chunks) -> tuple[FenceTracker, list]:
+    fences = FenceTracker()
+    closed = []
+    for chunk in chunks:
+        closed += fences.feed(chunk)
+    closed += fences.finish()
+    return fences, closed
+
+
+def summary(blocks) -> list[tuple]:
+    return [(b.index, b.lang, b.code, b.closed) for b in blocks]
+
+
+def test_blocks():
+    fences, closed = track([REPLY])
+    assert summary(closed) == [
+        (1, "python", "def f():\n    return 1", True),
+        (2, "", "assert f() == 1\n```not a close```", True),
+        (3, "", "x = 1", True),
+        (4, "", "tail()", False),   # the stream ended inside it
+    ]
+    assert summary(fences.blocks) == summary(closed)
+    assert fences.text == REPLY
+    assert fences.code == "def f():\n    return 1\n\nassert f() == 1\n```not a close```\n\nx = 1\n\ntail()"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, 13])
+def test_same_blocks_whatever_the_chunk_size(size):
+    _, whole = track([REPLY])
+    _, chunked = track(REPLY[i:i + size] for i in range(0, len(REPLY), size))
+    assert summary(chunked) == summary(whole)
+
+
+def test_same_blocks_at_every_split_point():
+    _, whole = track([REPLY])
+    for i in range(len(REPLY) + 1):
+        _, split = track([REPLY[:i], REPLY[i:]])
+        assert summary(split) == summary(whole), i
+
+
+def test_block_is_reported_when_its_closing_fence_line_ends():
+    fences = FenceTracker()
+    assert fences.feed("```js\nlet a") == []
+    assert fences.feed(" = 1;\n``") == []
+    assert fences.feed("`") == []              # the fence line is not complete yet
+    assert summary(fences.feed("\nafter")) == [(1, "js", "let a = 1;", True)]
+    assert fences.finish() == []
+
+
+def test_empty_unterminated_block_is_dropped():
+    _, closed = track(["text\n```python\n"])
+    assert closed == []
+
+
+def test_lines():
+    _, closed = track(["```\na\nb\n```\n```\n```\n"])
+    assert [b.lines for b in closed] == [2, 0]
+
+
+def test_no_code_after_enough_prose(monkeypatch):
+    monkeypatch.setattr(codefence, "NO_CODE_ABORT_CHARS", 50)
+    fences = FenceTracker()
+    fences.feed("A long explanation without any code at all")
+    assert not fences.no_code
+    fences.feed(", still going and going")   # counts the unfinished line too
+    assert fences.no_code
+
+
+def test_code_like_lines_are_not_prose(monkeypatch):
+    monkeypatch.setattr(codefence, "NO_CODE_ABORT_CHARS", 10)
+    fences = FenceTracker()
+    fences.feed("def f():\n    return 1\nimport os\n\n# comment\n")
+    assert fences.prose_chars == 0 and not fences.no_code
+
+
+def test_no_code_is_off_once_a_fence_opens(monkeypatch):
+    monkeypatch.setattr(codefence, "NO_CODE_ABORT_CHARS", 10)
+    fences = FenceTracker()
+    fences.feed("Short intro.\n```\n" + "x" * 100)
+    assert not fences.no_code
+    fences.feed("\n```\n" + "prose " * 20)
+    assert not fences.no_code
+
+
+def test_no_code_disabled(monkeypatch):
+    monkeypatch.setattr(codefence, "NO_CODE_ABORT_CHARS", 0)
+    fences = FenceTracker()
+    fences.feed("words " * 1000)
+    assert not fences.no_code
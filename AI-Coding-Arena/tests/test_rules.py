@@ -0,0 +1,76 @@
+import random
+import re
+
+import pytest
+
+import rules
+from rules import RulePack, load_pack
+
+BANNED = [r"\bFile\s+", r"\.getExternalStorage", r"new File\s*\(", r"file", r"fi", r"[A-z]ile", r"\x46ile",
+          r"\bs\w+", r"Ki", "é+", r"(?:a|b)c", r"\.\w+\(", r"x*"]
+REQUIRED = ["DocumentFile.*\\.listFiles", "ſt", r"\bKELVIN", "[^a-z]ile", "İ", r"Doc(?:uments)?"]
+ALPHABET = ["File ", "file", "FILE(", "new ", ".getExternalStorage", ".listFiles(", "Document", "ſt", "st",
+            "K", "K", "İ", "i", "é", "É", "ac", "BC", "x", "_", " ", "\n", "(", "."]
+
+
+def expected(pack: RulePack, block: str) -> tuple[int, frozenset]:
+    """What running every rule on its own with re.findall(..., re.IGNORECASE) gives."""
+    banned = sum(len(re.findall(p, block, re.IGNORECASE)) for p in pack.banned)
+    found = frozenset(i for i, p in enumerate(pack.required) if re.findall(p, block, re.IGNORECASE))
+    return banned, found
+
+
+@pytest.mark.parametrize("banned, required", [
+    (BANNED, REQUIRED),
+    ([p for p in BANNED if p.isascii() and p not in (r"[A-z]ile", r"\x46ile")], ["DocumentFile.*\\.listFiles"]),
+])
+def test_scan_matches_findall_on_random_blocks(banned, required):
+    pack = RulePack("fuzz", banned, required)
+    rng = random.Random(7)
+    for _ in range(2000):
+        block = "".join(rng.choices(ALPHABET, k=rng.randint(0, 12)))
+        assert pack._scan(block) == expected(pack, block), block
+
+
+def test_bundled_packs_match_findall():
+    pack = load_pack("android_saf")
+    rng = random.Random(11)
+    for _ in range(1000):
+        block = "".join(rng.choices(ALPHABET + ["Uri.fromFile", "DocumentsContract", "Environment"], k=10))
+        assert pack._scan(block) == expected(pack, block), block
+
+
+def test_dotted_capital_i_is_not_lowercased_into_a_match():
+    pack = RulePack("saf", [r"\bFile\s+"], ["DocumentFile"])
+    assert pack.check(["İFile "]) == (0, 0)
+    assert pack.check(["İ File "]) == (1, 0)
+
+
+def test_case_sensitive_packs():
+    pack = RulePack("exact", ["File"], ["Uri"], ignore_case=False)
+    assert pack.check(["File file FILE", "uri"]) == (1, 0)
+
+
+def test_capturing_groups_are_rejected():
+    with pytest.raises(ValueError, match=r"\(\?:\.\.\.\)"):
+        RulePack("bad", [r"(File)\s"], [])
+
+
+def test_bad_pattern():
+    with pytest.raises(ValueError, match="bad pattern"):
+        RulePack("bad", ["[unclosed"], [])
+
+
+def test_scan_results_are_cached(monkeypatch):
+    monkeypatch.setattr(rules, "SCAN_CACHE_SIZE", 2)
+    pack = RulePack("cache", ["a"], ["b"])
+    calls = []
+    scan = pack._scan
+    monkeypatch.setattr(pack, "_scan", lambda block: calls.append(block) or scan(block))
+    assert pack.scan("aab") == (2, frozenset({0}))
+    assert pack.scan("aab") == (2, frozenset({0}))
+    assert calls == ["aab"]
+    pack.scan("x")
+    pack.scan("y")   # evicts "aab", the least recently used
+    pack.scan("aab")
+    assert calls == ["aab", "x", "y", "aab"]
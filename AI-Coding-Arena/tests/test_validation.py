@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+import validation
+from validation import check, report, summary, validate
+
+KOTLIN = "fun f(x: Int): Int {\n    if (x > 1) { return x }\n    return 0\n}\n"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A fresh one-worker pool, shut down after the test."""
+    monkeypatch.setattr(validation, "VALIDATION_WORKERS", 1)
+    monkeypatch.setattr(validation, "_cache", validation.OrderedDict())
+    validation.shutdown()
+    yield
+    validation.shutdown()
+
+
+def hang(code, lang, timeout):
+    """A worker stuck where its own timer can't reach it."""
+    time.sleep(60)
+
+
+def hang_on_stuck(code, lang, timeout):
+    """Only the block marked stuck hangs; the others take a while, then get the real check."""
+    time.sleep(60 if "stuck" in code else 0.8)
+    return validation.check(code, lang)
+
+
+def test_summary_says_skipped_blocks_were_not_checked():
+    ok = {"lang": "kotlin", "loc": 3, "problems": []}
+    skipped = {"lang": "kotlin", "loc": 5, "problems": [], "skipped": "timed out"}
+    bad = {"lang": "python", "loc": 2, "problems": ["line 1: invalid syntax"]}
+    assert summary([ok]) == "3 LOC, syntax OK"
+    assert summary([ok, skipped]) == "8 LOC, 1 of 2 block(s) not checked"
+    assert summary([bad, skipped]) == "7 LOC, 1 syntax problem(s), 1 of 2 block(s) not checked"
+    assert "not checked (timed out)" in report([skipped])
+
+
+def test_check():
+    result = check(KOTLIN, "kotlin")
+    assert result["problems"] == [] and result["functions"] == 1 and result["loc"] == 4
+    assert check("fun f() {", "kotlin")["problems"][0].startswith("end of code: 1 bracket(s) still open")
+
+
+def test_queueing_and_worker_startup_do_not_count_against_the_timeout(pool, monkeypatch):
+    blocks = [KOTLIN * 3000 + f"// {i}\n" for i in range(4)]
+    started = time.perf_counter()
+    check(blocks[0], "kotlin")
+    each = time.perf_counter() - started
+    # Long enough for one check, shorter than starting the worker plus the checks queued ahead
+    monkeypatch.setattr(validation, "VALIDATION_TIMEOUT", max(each * 3, 0.3))
+    results = asyncio.run(validate(blocks))
+    assert [r.get("skipped") for r in results] == [None] * 4
+
+
+def test_worker_times_out_its_own_check(pool, monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_TIMEOUT", 0.001)
+    results = asyncio.run(validate([KOTLIN * 20000]))
+    assert results[0]["skipped"] == "timed out"
+    assert validation._pool is not None   # the worker recovered on its own: the pool is kept
+
+
+def test_stuck_worker_is_killed_and_the_pool_replaced(pool, monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_TIMEOUT", 0.2)
+    monkeypatch.setattr(validation, "STUCK_GRACE", 0.2)
+    monkeypatch.setattr(validation, "_timed_check", hang)
+
+    async def run():
+        stuck = validation._executor()
+        checking = asyncio.ensure_future(validate(["fun stuck() {}"]))
+        await asyncio.sleep(0.1)
+        processes = list(stuck._processes.values())
+        return stuck, processes, await checking
+
+    stuck, processes, results = asyncio.run(run())
+    assert results[0]["skipped"] == "timed out"
+    assert validation._pool is not stuck and processes
+    for process in processes:
+        process.join(5)
+        assert not process.is_alive()
+
+    monkeypatch.undo()   # the real check, on a new pool
+    monkeypatch.setattr(validation, "VALIDATION_WORKERS", 1)
+    assert asyncio.run(validate([KOTLIN]))[0]["problems"] == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_other_checks_survive_a_stuck_worker(pool, monkeypatch, workers):
+    monkeypatch.setattr(validation, "VALIDATION_WORKERS", workers)
+    monkeypatch.setattr(validation, "VALIDATION_TIMEOUT", 0.5)
+    monkeypatch.setattr(validation, "STUCK_GRACE", 1.0)
+    monkeypatch.setattr(validation, "_timed_check", hang_on_stuck)
+    # Checked again on a worker, not in the server's own thread
+    monkeypatch.setattr(validation, "check", lambda code, lang: {"lang": lang, "loc": 0, "problems": ["in a thread"]})
+    blocks = [KOTLIN + f"// {i}\n" for i in range(5)]
+
+    async def run():
+        stuck = asyncio.ensure_future(validate(["fun stuck() {}"]))
+        await asyncio.sleep(0.1)
+        # Waiting for a busy worker, or running on the other one when the stuck one is killed
+        results = await validate(blocks)
+        return (await stuck)[0], results
+
+    stuck, results = asyncio.run(run())
+    assert stuck["skipped"] == "timed out"
+    assert [r.get("skipped") for r in results] == [None] * 5
+    assert all(r["problems"] == [] for r in results)
@@ -0,0 +1,409 @@
+"""
+validation.py — Mechanical checks on extracted code, off the event loop.
+
+Each code block gets a language (from its fence, else guessed from the code), a
+syntax check (Python: ast; Kotlin/Java/Gradle: bracket balance that skips
+strings, templates and comments; XML: ElementTree; JSON: json) and size metrics:
+lines of code, the share of lines in repeated 4-line runs, and branches per
+function. Checks run in a process pool (VALIDATION_WORKERS, 0 = a thread), start
+as soon as a block's fence closes (prefetch) and are cached by the block's hash,
+so the controller's end-of-round validate() and the judge's are usually free.
+VALIDATION_TIMEOUT is timed in the worker, around the check alone; a worker that
+still doesn't answer is killed and the pool replaced. No more checks are handed
+to the pool than it has workers, so none waits behind a stuck one, and the
+checks that were running on the other workers are resubmitted to the new pool.
+
+The metrics are heuristics for the judge's prompt, not a compiler: a block can
+pass and still not build. A failed check is reported, not fatal.
+"""
+import ast
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import signal
+import weakref
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "2"))  # Checker processes; 0 checks in a thread
+VALIDATION_TIMEOUT = float(os.getenv("VALIDATION_TIMEOUT", "10"))  # Seconds per block before giving up on it
+STUCK_GRACE = 5.0  # Seconds past VALIDATION_TIMEOUT before a worker counts as stuck (covers a worker's startup)
+CHECK_CACHE_SIZE = 4096  # Code blocks whose results are kept
+MAX_PROBLEMS = 5  # Per block: the first few are what the model needs to fix
+DUP_WINDOW = 4  # Lines in a run that counts as duplicated
+
+_ALIASES = {
+    "kotlin": "kotlin", "kt": "kotlin", "kts": "kotlin", "java": "java",
+    "python": "python", "py": "python", "python3": "python",
+    "groovy": "groovy", "gradle": "groovy", "xml": "xml", "json": "json",
+}
+_KOTLIN = re.compile(r"^\s*(?:(?:private|internal|override|suspend|data|sealed)\s+)*(?:fun|val|var|object)\s+\w", re.M)
+_PYTHON = re.compile(r"^\s*(?:async\s+)?def\s+\w+\s*\(.*\)\s*(?:->.*)?:\s*$|^(?:from\s+[\w.]+\s+)?import\s+[\w., ]+$", re.M)
+_JAVA = re.compile(r";\s*$|^\s*(?:public|private|protected)\s[^=;]*[({]\s*$", re.M)  # Statements or declarations
+
+
+def language(code: str, hint: str = "") -> str:
+    """The block's language: its fence's tag if known, else a guess from the first lines."""
+    words = hint.split()
+    lang = _ALIASES.get(words[0].lower()) if words else None
+    if lang:
+        return lang
+    head = code[:4000].lstrip()
+    if head.startswith("<"):
+        return "xml"
+    if head[:1] in ("{", "["):
+        return "json"
+    if _KOTLIN.search(head):
+        return "kotlin"
+    if _PYTHON.search(head) and "{" not in head:
+        return "python"
+    if _JAVA.search(head):
+        return "java"
+    return "text"
+
+
+# -------------------------------------------------------------------
+# Syntax checks (run in the worker)
+_CLOSERS = {")": "(", "]": "[", "}": "{"}
+
+
+def _string_end(code: str, i: int, quote: str) -> int:
+    """Index just past the literal whose body starts at i; -1 if it is never closed."""
+    raw, n = len(quote) == 3, len(code)
+    while i < n:
+        if code.startswith(quote, i):
+            return i + len(quote)
+        c = code[i]
+        if c == "\\" and not raw:
+            i += 2
+            continue
+        if c == "\n" and not raw:
+            return -1
+        if c == "$" and code.startswith("${", i):
+            depth, i = 1, i + 2  # Kotlin template: its braces (and quotes) are code, skip to the closing one
+            while i < n and depth:
+                depth += {"{": 1, "}": -1}.get(code[i], 0)
+                i += 1
+            continue
+        i += 1
+    return -1
+
+
+_TOKENS = {quotes: re.compile(r"[()\[\]{}]|//|/\*|[" + quotes + "]") for quotes in ("\"'", '"')}
+
+
+def _brackets(code: str, quotes: str = "\"'") -> list[str]:
+    """Unbalanced () [] {} outside strings and comments: what a truncated or mangled C-like file shows first."""
+    problems, stack = [], []  # Stack of (bracket, offset) still open
+
+    def line(pos: int) -> int:  # Counted only for what gets reported
+        return code.count("\n", 0, pos) + 1
+
+    find, i, n = _TOKENS[quotes].search, 0, len(code)
+    while len(problems) < MAX_PROBLEMS and (m := find(code, i)):
+        token, i = m.group(), m.end()
+        if token in "([{":
+            stack.append((token, m.start()))
+        elif token in ")]}":
+            opener = _CLOSERS[token]
+            if not stack:
+                problems.append(f"line {line(i)}: unmatched '{token}'")
+            elif stack[-1][0] == opener:
+                stack.pop()
+            else:
+                problems.append(f"line {line(i)}: '{token}' closes '{stack[-1][0]}' from line {line(stack[-1][1])}")
+                # Resynchronise on the nearest matching opener, if any
+                for depth in range(len(stack) - 1, -1, -1):
+                    if stack[depth][0] == opener:
+                        del stack[depth:]
+                        break
+        elif token == "//":
+            end = code.find("\n", i)
+            i = n if end < 0 else end
+        elif token == "/*":
+            end = code.find("*/", i)
+            if end < 0:
+                problems.append(f"line {line(i)}: comment never closed")
+                return problems
+            i = end + 2
+        else:
+            quote = token * 3 if code.startswith(token * 3, m.start()) else token
+            end = _string_end(code, m.start() + len(quote), quote)
+            if end < 0:
+                problems.append(f"line {line(i)}: string never closed")
+                end = -1 if len(quote) == 3 else code.find("\n", i)
+                if end < 0:
+                    return problems
+            i = end
+    if stack and len(problems) < MAX_PROBLEMS:
+        opener, at = stack[-1]
+        problems.append(f"end of code: {len(stack)} bracket(s) still open, last '{opener}' from line {line(at)} — truncated?")
+    return problems
+
+
+def _python(code: str) -> list[str]:
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        return [f"line {e.lineno}: {e.msg}"]
+    except (ValueError, RecursionError) as e:
+        return [f"not parseable: {e}"]
+    return []
+
+
+_XML_DECL = re.compile(r"^\s*<\?xml[^>]*\?>")
+# Snippets often hold several elements and leave the usual Android prefixes undeclared
+_XML_WRAP = ('<_ xmlns:android="http://schemas.android.com/apk/res/android" '
+             'xmlns:app="http://schemas.android.com/apk/res-auto" xmlns:tools="http://schemas.android.com/tools">')
+
+
+def _xml(code: str) -> list[str]:
+    body = _XML_DECL.sub(lambda m: " " * len(m.group()), code)  # Same line numbers without the declaration
+    try:
+        ET.fromstring(f"{_XML_WRAP}{body}</_>")
+    except ET.ParseError as e:
+        msg = str(e).split(":", 1)[0]
+        return [f"line {e.position[0]}: {msg}"]
+    return []
+
+
+def _json(code: str) -> list[str]:
+    try:
+        json.loads(code)
+    except ValueError as e:
+        return [f"line {getattr(e, 'lineno', '?')}: {getattr(e, 'msg', e)}"]
+    return []
+
+
+_SYNTAX = {
+    "python": _python, "xml": _xml, "json": _json,
+    "text": lambda code: _brackets(code, quotes='"'),  # Untagged: an apostrophe is more likely prose than a char
+}  # Kotlin, Java, Groovy: _brackets
+
+# -------------------------------------------------------------------
+# Metrics (run in the worker)
+_COMMENT = {"python": ("#",), "xml": ("<!--",), "json": ()}
+_BRANCHES = {
+    "python": re.compile(r"\b(?:if|elif|for|while|except|and|or|case)\b"),
+    "default": re.compile(r"\b(?:if|for|while|case|catch|when)\b|&&|\|\|"),
+}
+_FUNCTIONS = {
+    "python": re.compile(r"^\s*(?:async\s+)?def\s", re.M),
+    "kotlin": re.compile(r"\bfun\b"),
+    # Java: "type name(" at the start of a line that doesn't end a statement; constructors are missed
+    "default": re.compile(r"^\s*(?:@\w+\s+)*(?:(?:public|protected|private|static|final|abstract|synchronized|"
+                          r"override|suspend|def)\s+)*(?:<[^>]*>\s+)?([\w.$<>\[\],?]+)\s+(\w+)\s*\([^;\n]*$"
+                          r"|\bfun\b", re.M),
+}
+_NOT_TYPES = {"new", "return", "else", "throw", "await", "if", "for", "while", "switch", "catch", "case"}
+
+
+def _duplication(lines: list[str]) -> float:
+    """Share of lines inside a run of DUP_WINDOW lines that also appears earlier."""
+    lines = [" ".join(line.split()) for line in lines]
+    lines = [line for line in lines if len(line) > 3]  # }, });, ) {: repeated everywhere, not duplication
+    seen, duplicated = set(), set()
+    for i in range(len(lines) - DUP_WINDOW + 1):
+        run = "\n".join(lines[i:i + DUP_WINDOW])
+        if run in seen:
+            duplicated.update(range(i, i + DUP_WINDOW))
+        seen.add(run)
+    return len(duplicated) / len(lines) if lines else 0.0
+
+
+def check(code: str, lang: str) -> dict:
+    """Syntax problems and metrics for one block (`lang` from language())."""
+    markers = _COMMENT.get(lang, ("//", "/*", "*", "#"))
+    lines = [line for line in code.splitlines() if line.strip() and not line.strip().startswith(markers)]
+    problems = _SYNTAX.get(lang, _brackets)(code)[:MAX_PROBLEMS]
+    result = {"lang": lang, "loc": len(lines), "problems": problems}
+    if lang in ("xml", "json"):
+        return result
+    body = "\n".join(lines)
+    if lang == "kotlin":
+        functions = len(_FUNCTIONS["kotlin"].findall(body))
+    elif lang == "python":
+        functions = len(_FUNCTIONS["python"].findall(body))
+    else:
+        functions = sum(1 for m in _FUNCTIONS["default"].finditer(body)
+                        if m.group(1) is None or m.group(1) not in _NOT_TYPES and m.group(2) not in _NOT_TYPES)
+    branches = len(_BRANCHES.get(lang, _BRANCHES["default"]).findall(body))
+    result.update(duplication=round(_duplication(lines), 3), functions=functions,
+                  complexity=round(1 + branches / max(functions, 1), 1))
+    return result
+
+
+def _timeout(signum, frame):
+    raise TimeoutError
+
+
+def _timed_check(code: str, lang: str, timeout: float) -> dict:
+    """check() in a worker process, interrupted after `timeout` seconds of its own run time."""
+    if timeout <= 0 or not hasattr(signal, "setitimer"):  # No interval timer on Windows: the parent's backstop
+        return check(code, lang)
+    signal.signal(signal.SIGALRM, _timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return check(code, lang)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# -------------------------------------------------------------------
+# Pool, cache, prefetch
+_pool: ProcessPoolExecutor | None = None
+_killed: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()  # Pools taken down by a stuck worker
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_cache: OrderedDict[bytes, dict] = OrderedDict()
+_pending: dict[bytes, asyncio.Task] = {}
+
+
+def _executor() -> ProcessPoolExecutor | None:
+    global _pool
+    if _pool is None and VALIDATION_WORKERS > 0:
+        # spawn, like batch.py: forking a process that runs an event loop and HTTP clients is unsafe
+        _pool = ProcessPoolExecutor(VALIDATION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _discard(pool: ProcessPoolExecutor, kill: bool = False):
+    """Drop `pool` so the next check starts a new one; `kill` also ends a worker stuck mid-check."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    if kill:
+        _killed.add(pool)
+        for process in list((pool._processes or {}).values()):  # No public way to stop a busy worker
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    """Stop the checker processes (app shutdown); the next check starts new ones."""
+    if _pool is not None:
+        _discard(_pool)
+
+
+def _key(code: str, lang: str) -> bytes:
+    return hashlib.blake2b(f"{lang}\0{code}".encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def _slot() -> asyncio.Semaphore:
+    """One slot per worker: a check is only submitted when a worker is free to run it."""
+    loop = asyncio.get_running_loop()
+    slot = _slots.get(loop)
+    if slot is None:
+        slot = _slots[loop] = asyncio.Semaphore(VALIDATION_WORKERS)
+    return slot
+
+
+async def _in_pool(code: str, lang: str) -> dict:
+    """check() on a worker; time spent waiting for a slot or starting the worker doesn't count against the timeout."""
+    async with _slot():
+        while True:
+            pool = _executor()
+            future = pool.submit(_timed_check, code, lang, VALIDATION_TIMEOUT)
+            waiting = asyncio.wrap_future(future)
+            while not waiting.done():
+                started = future.running()  # Handed to a worker (or to one that is starting)
+                done, _ = await asyncio.wait({waiting}, timeout=VALIDATION_TIMEOUT + STUCK_GRACE)
+                if not done and started:  # Past its own timeout and still busy: stuck in C code (huge regex, parser)
+                    _discard(pool, kill=True)
+                    raise TimeoutError
+            broken = waiting.cancelled() or isinstance(waiting.exception(), BrokenProcessPool)
+            if broken and pool in _killed:
+                continue  # Another check's stuck worker took the pool down: run this one on the new pool
+            if broken:  # A worker died (OOM on a huge block?): start a new pool next time
+                _discard(pool)
+                raise BrokenProcessPool("worker died")
+            return waiting.result()
+
+
+async def _run(key: bytes, code: str, lang: str) -> dict:
+    try:
+        try:
+            if VALIDATION_WORKERS <= 0:
+                result = await asyncio.wait_for(asyncio.to_thread(check, code, lang), VALIDATION_TIMEOUT)
+            else:
+                result = await _in_pool(code, lang)
+        except BrokenProcessPool:  # Check it here instead
+            result = await asyncio.wait_for(asyncio.to_thread(check, code, lang), VALIDATION_TIMEOUT)
+    except Exception as e:  # Never fatal: the round goes on unchecked
+        reason = "timed out" if isinstance(e, TimeoutError) else f"check failed: {e!r}"
+        return {"lang": lang, "loc": len(code.splitlines()), "problems": [], "skipped": reason}
+    finally:
+        _pending.pop(key, None)
+    _cache[key] = result
+    if len(_cache) > CHECK_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+
+def _task(code: str, lang: str):
+    """The cached result, or the task computing it (started now if need be)."""
+    key = _key(code, lang)
+    hit = _cache.get(key)
+    if hit is not None:
+        _cache.move_to_end(key)
+        return hit
+    task = _pending.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = _pending[key] = asyncio.create_task(_run(key, code, lang))
+    return task
+
+
+def prefetch(code: str, hint: str = ""):
+    """Start checking a block in the background (e.g. as soon as its fence closes)."""
+    if code.strip():
+        _task(code, language(code, hint))
+
+
+async def validate(blocks: list[str], hints: list[str] | None = None) -> list[dict]:
+    """check() results for each block, from the cache, a prefetch in flight or the pool."""
+    hints = hints or [""] * len(blocks)
+    results = [_task(code, language(code, hint)) for code, hint in zip(blocks, hints)]
+    return [r if isinstance(r, dict) else await r for r in results]
+
+
+# -------------------------------------------------------------------
+# Reports
+def _metrics(r: dict) -> str:
+    parts = [r["lang"], f"{r['loc']} LOC"]
+    if "complexity" in r:
+        parts += [f"{r['duplication']:.0%} duplicated", f"{r['functions']} function(s)",
+                  f"{r['complexity']} branches/function"]
+    return ", ".join(parts)
+
+
+def report(results: list[dict]) -> str:
+    """One line per block for the judge's prompt and the correction message."""
+    lines = []
+    for n, r in enumerate(results, 1):
+        status = ("FAILS — " + "; ".join(r["problems"]) if r["problems"]
+                  else f"not checked ({r['skipped']})" if r.get("skipped") else "syntax OK")
+        lines.append(f"Block {n} ({_metrics(r)}): {status}")
+    return "\n".join(lines) or "No code."
+
+
+def summary(results: list[dict]) -> str:
+    """Totals for a round's status line."""
+    loc = sum(r["loc"] for r in results)
+    problems = sum(len(r["problems"]) for r in results)
+    skipped = sum(1 for r in results if r.get("skipped"))
+    parts = [f"{loc} LOC"]
+    if problems:
+        parts.append(f"{problems} syntax problem(s)")
+    if skipped:
+        parts.append(f"{skipped} of {len(results)} block(s) not checked")
+    elif not problems:
+        parts.append("syntax OK")
+    code = [r for r in results if "complexity" in r]
+    if code:
+        dup = sum(r["duplication"] * r["loc"] for r in code) / max(sum(r["loc"] for r in code), 1)
+        parts += [f"{dup:.0%} duplicated", f"max {max(r['complexity'] for r in code)} branches/function"]
+    return ", ".join(parts)
@@ -0,0 +1,173 @@
+"""
+verdicts.py — The judge's verdict as data.
+
+With VERDICT_FORMAT=json (the default) the judge call itself asks for the
+verdict as JSON matching VERDICT_SCHEMA, enforced by the provider where it can
+be (OpenAI-compatible response_format, Ollama `format`) and requested in the
+prompt everywhere else. `render_verdict()` turns the reply into markdown for
+the reader; the winner and scores come from the JSON. A reply that isn't valid
+JSON for the schema is shown as it is and read with `parse_verdict()`.
+
+VERDICT_FORMAT=table has the judge stream its markdown verdict as it writes
+it, "Winner:" line and "| Criterion | x/10 | y/10 |" table first, and parses
+them with `parse_verdict()`.
+
+The result is stored in indexed columns next to the transcript
+(logger.log_debate), so /api/leaderboard never re-reads transcripts.
+"""
+
+import os
+import re
+import json
+from framing import Status
+
+VERDICT_FORMAT = os.getenv("VERDICT_FORMAT", "json")   # "json": structured judge replies; "table": markdown
+
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "winner": {"type": "string", "enum": ["A", "B", "draw"]},
+        "scores": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "criterion": {"type": "string"},
+                    "a": {"type": "number"},
+                    "b": {"type": "number"},
+                    "note": {"type": "string"},
+                },
+                "required": ["criterion", "a", "b", "note"],
+                "additionalProperties": False,
+            },
+        },
+        "summary": {"type": "string"},
+    },
+    "required": ["winner", "scores", "summary"],
+    "additionalProperties": False,
+}
+
+VERDICT_INSTRUCTIONS = """
+Reply with only a JSON object matching this schema, no other text:
+{schema}
+"winner" is "A" ({a_name}), "B" ({b_name}) or "draw". "scores" has one entry per
+criterion ({criteria}) with each side's score out of 10 as "a" and "b" and a
+one-line "note". "summary" is your reasoning, in markdown.
+"""
+
+
+def verdict_instructions(a_name: str, b_name: str, criteria: list[str]) -> str:
+    """The judge prompt's reply format when VERDICT_FORMAT=json."""
+    return VERDICT_INSTRUCTIONS.format(schema=json.dumps(VERDICT_SCHEMA), a_name=a_name, b_name=b_name,
+                                       criteria=", ".join(criteria))
+
+
+class Verdict(str):
+    """A whole verdict as markdown; `data` holds the winner and scores when it came as valid JSON."""
+
+    def __new__(cls, text: str, data: dict | None = None):
+        obj = super().__new__(cls, text)
+        obj.data = data
+        return obj
+
+
+# ── Parsing the markdown ────────────────────────────────────────────────────
+_WINNER = re.compile(r"winner\W*?:\s*(.+)", re.IGNORECASE)
+_CELL_SCORE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:/\s*(\d+))?")
+
+
+def parse_winner(verdict: str, a_name: str, b_name: str) -> str | None:
+    """'A', 'B' or 'draw' from the judge's "Winner: ..." line; None if it cannot tell."""
+    m = _WINNER.search(verdict)
+    if not m:
+        return None
+    said = m.group(1).strip(" *[]_`.").lower()
+    if re.search(r"\b(neither|tie|draw|none)\b", said):
+        return "draw"
+    named = {side for side, name in (("A", a_name), ("B", b_name)) if name.lower() in said}
+    if len(named) == 1:
+        return named.pop()
+    sides = set(re.findall(r"\bside\s+([ab])\b", said))
+    if len(sides) == 1:
+        return sides.pop().upper()
+    return None
+
+
+def _cell_score(cell: str) -> float | None:
+    """8/10, **7.5**, 8.0/10 (4–9), 80/100 → a 0–10 score; None for ?/10, names, notes."""
+    m = _CELL_SCORE.match(cell.strip(" *_`"))
+    if not m:
+        return None
+    value, scale = float(m.group(1)), float(m.group(2) or 10)
+    return min(value * 10 / scale, 10.0) if scale else None
+
+
+def parse_scores(verdict: str) -> dict[str, tuple[float, float]]:
+    """{criterion: (A's score, B's score)} from the verdict's score table (the first one, if several)."""
+    scores = {}
+    for line in verdict.splitlines():
+        cells = line.strip().strip("|").split("|")
+        if len(cells) < 3:
+            continue
+        criterion = " ".join(cells[0].strip(" *_`").split())
+        a, b = _cell_score(cells[1]), _cell_score(cells[2])
+        if criterion and a is not None and b is not None and criterion.lower() not in ("criterion", "total"):
+            scores.setdefault(criterion, (a, b))
+    return scores
+
+
+def parse_verdict(verdict: str, a_name: str, b_name: str) -> dict:
+    return {"winner": parse_winner(verdict, a_name, b_name), "scores": parse_scores(verdict)}
+
+
+# ── Structured replies ──────────────────────────────────────────────────────
+def parse_json(text: str) -> dict | None:
+    """The verdict from the model's JSON reply, or None if it doesn't match VERDICT_SCHEMA."""
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1])
+        winner = {"a": "A", "b": "B", "draw": "draw"}[str(data["winner"]).strip().lower()]
+        rows = [(" ".join(str(row["criterion"]).split()), min(float(row["a"]), 10.0), min(float(row["b"]), 10.0),
+                 " ".join(str(row.get("note") or "").split())) for row in data["scores"]]
+        summary = str(data.get("summary") or "").strip()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    rows = [row for row in rows if row[0] and min(row[1:3]) >= 0]
+    return {"winner": winner, "scores": {c: (a, b) for c, a, b, _ in rows},
+            "notes": {c: note for c, _, _, note in rows if note}, "summary": summary}
+
+
+def render_verdict(reply: str, a_name: str, b_name: str) -> Verdict:
+    """A judge's JSON reply as a markdown Verdict; a reply that isn't valid JSON is kept as it is."""
+    data = parse_json(reply)
+    if data is None:
+        return Verdict(reply)
+    winner = {"A": a_name, "B": b_name, "draw": "Draw"}[data["winner"]]
+    lines = ["### FINAL VERDICT", "", f"**Winner:** {winner}"]
+    if data["scores"]:
+        lines += ["", f"| Criterion | {a_name} | {b_name} | Notes |", "|---|---|---|---|"]
+        lines += [f"| {c} | {a:g}/10 | {b:g}/10 | {data['notes'].get(c, '')} |" for c, (a, b) in data["scores"].items()]
+    if data["summary"]:
+        lines += ["", data["summary"]]
+    return Verdict("\n".join(lines) + "\n", {"winner": data["winner"], "scores": data["scores"]})
+
+
+async def rendered(tokens, a_name: str, b_name: str):
+    """Collect a judge's JSON reply stream and yield it as one rendered Verdict. Status passes through."""
+    reply = []
+    async for tok in tokens:
+        if isinstance(tok, Status):
+            yield tok
+        else:
+            reply.append(tok)
+    yield render_verdict("".join(reply), a_name, b_name)
+
+
+def extract_verdict(verdict: str, a_name: str, b_name: str, data: dict | None = None) -> dict:
+    """
+    {"winner": "A" | "B" | "draw" | None, "scores": {criterion: (a, b)}, "source": "json" | "table"}.
+    `data` is the structured verdict (Verdict.data); without it the markdown is parsed.
+    """
+    if data is not None:
+        return {"winner": data["winner"], "scores": data["scores"], "source": "json"}
+    return {**parse_verdict(verdict, a_name, b_name), "source": "table"}
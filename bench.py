@@ -0,0 +1,306 @@
+"""
+bench.py
+Microbenchmarks for the code that runs once per token or once per round.
+
+Inputs are generated from a fixed seed and provider streams are replayed from
+recorded bytes through httpx.MockTransport, so runs need no network and are
+comparable across commits.
+
+Usage:
+  python bench.py                          # run everything, print a table
+  python bench.py -k parse                 # only benchmarks whose name contains "parse"
+  python bench.py --json bench.json        # also save results
+  python bench.py --compare bench.json     # diff against a saved run (exit 1 on regression)
+"""
+import os
+import sys
+import tempfile
+
+# Keep the benchmark database out of the working tree (logger reads this at import)
+os.environ.setdefault("DEBATE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-"), "debates.db"))
+
+import gc
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import sqlite3
+import subprocess
+from contextlib import closing
+from datetime import datetime, timezone
+
+import httpx
+import adapters
+from adapters import AnthropicAdapter, OllamaAdapter, ANTHROPIC_BASE_URL
+from logger import log_debate, leaderboard, topic_hash, DB_PATH
+
+SEED = 1234
+BENCHMARKS: dict = {}
+
+
+def bench(name: str, repeat: int = 7):
+    """Register fn(loop) -> callable; the returned callable is what gets timed."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, repeat)
+        return setup
+    return register
+
+
+def words(rng: random.Random, n: int) -> list[str]:
+    vocab = "the model argues that evidence matters more than rhetoric because outcomes compound".split()
+    return [rng.choice(vocab) for _ in range(n)]
+
+
+# ── Recorded provider streams ──────────────────────────────────────────────
+def anthropic_sse(tokens: list[str]) -> bytes:
+    events = [b'event: message_start\ndata: {"type":"message_start","message":{}}\n\n']
+    for t in tokens:
+        delta = json.dumps({"type": "content_block_delta", "index": 0,
+                            "delta": {"type": "text_delta", "text": t + " "}})
+        events.append(f"event: content_block_delta\ndata: {delta}\n\n".encode())
+    events.append(b'event: message_stop\ndata: {"type":"message_stop"}\n\n')
+    return b"".join(events)
+
+
+def ollama_ndjson(tokens: list[str]) -> bytes:
+    lines = [json.dumps({"message": {"role": "assistant", "content": t + " "}, "done": False}) for t in tokens]
+    lines.append(json.dumps({"message": {"content": ""}, "done": True}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def openai_sse(tokens: list[str]) -> bytes:
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': t + ' '}}]})}\n\n" for t in tokens]
+    return ("".join(lines) + "data: [DONE]\n\n").encode()
+
+
+def replay(base_url: str, body: bytes):
+    """Serve `body` for every request to base_url from the shared client pool."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+    adapters._HTTP_POOL[base_url.rstrip("/")] = httpx.AsyncClient(base_url=base_url, transport=transport)
+
+
+def drain(loop, adapter):
+    messages = [{"role": "user", "content": "bench"}]
+
+    async def consume():
+        n = 0
+        async for _ in adapter.stream(messages):
+            n += 1
+        return n
+
+    return lambda: loop.run_until_complete(consume())
+
+
+# ── Benchmarks ─────────────────────────────────────────────────────────────
+STREAM_TOKENS = 20_000
+
+
+@bench("parse_anthropic_sse")
+def _(loop):
+    replay(ANTHROPIC_BASE_URL, anthropic_sse(words(random.Random(SEED), STREAM_TOKENS)))
+    return drain(loop, AnthropicAdapter("bench", api_key="bench"))
+
+
+@bench("parse_ollama_ndjson")
+def _(loop):
+    host = "http://bench-ndjson"
+    replay(host, ollama_ndjson(words(random.Random(SEED), STREAM_TOKENS)))
+    adapters._OLLAMA_ENDPOINT[host] = ("/api/chat", "ndjson")
+    adapter = OllamaAdapter("bench")
+    adapter.base_url = host
+    return drain(loop, adapter)
+
+
+@bench("parse_ollama_openai_sse")
+def _(loop):
+    host = "http://bench-openai"
+    replay(host, openai_sse(words(random.Random(SEED), STREAM_TOKENS)))
+    adapters._OLLAMA_ENDPOINT[host] = ("/v1/chat/completions", "openai")
+    adapter = OllamaAdapter("bench")
+    adapter.base_url = host
+    return drain(loop, adapter)
+
+
+@bench("transcript_concat")
+def _(loop):
+    # main.py: full_transcript += frame, one frame per token when flush_ms=0
+    chunks = [w + " " for w in words(random.Random(SEED), 100_000)]
+
+    def run():
+        full_transcript = ""
+        for chunk in chunks:
+            full_transcript += chunk
+        return full_transcript
+    return run
+
+
+@bench("log_debate_insert", repeat=20)
+def _(loop):
+    transcript = " ".join(words(random.Random(SEED), 40_000))   # ~250 KB
+    return lambda: log_debate("bench", "benchmark topic", transcript)
+
+
+LEADERBOARD_DEBATES = 100_000
+CRITERIA = ("Logic & Reasoning", "Clarity & Structure", "Persuasiveness", "Use of Evidence")
+
+
+def seed_verdicts(n: int = LEADERBOARD_DEBATES):
+    """n judged debates between 40 models on 500 topics, written straight into the verdict tables."""
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        if conn.execute("SELECT COUNT(*) FROM model_stats").fetchone()[0]:
+            return
+        rng = random.Random(SEED)
+        models = [f"bench:model-{i}" for i in range(40)]
+        topics = [topic_hash(f"topic {i}") for i in range(500)]
+        debates, scores = [], []
+        for debate in range(1, n + 1):
+            a, b = rng.sample(models, 2)
+            pairs = [(rng.randint(3, 10), rng.randint(3, 10)) for _ in CRITERIA]
+            means = [sum(p[side] for p in pairs) / len(pairs) for side in (0, 1)]
+            winner = "A" if means[0] > means[1] else "B" if means[1] > means[0] else "draw"
+            debates.append((debate, "bench", "benchmark transcript", a, b, rng.choice(topics), winner, *means))
+            scores += [(debate, side, model, criterion, pair[i]) for criterion, pair in zip(CRITERIA, pairs)
+                       for i, (side, model) in enumerate((("A", a), ("B", b)))]
+        conn.executemany("INSERT INTO debates (id, session, transcript, model_a, model_b, topic_hash, winner, "
+                         "score_a, score_b) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", debates)
+        conn.executemany("INSERT INTO debate_scores VALUES (?, ?, ?, ?, ?)", scores)
+        conn.execute(
+            """
+            INSERT INTO model_stats (model, debates, wins, losses, draws, score_sum, scored)
+            SELECT model, COUNT(*), SUM(won), SUM(lost), SUM(drew), SUM(score), COUNT(*) FROM (
+                SELECT model_a AS model, winner = 'A' AS won, winner = 'B' AS lost, winner = 'draw' AS drew,
+                       score_a AS score FROM debates WHERE winner IS NOT NULL
+                UNION ALL
+                SELECT model_b, winner = 'B', winner = 'A', winner = 'draw', score_b
+                FROM debates WHERE winner IS NOT NULL
+            ) GROUP BY model
+            """
+        )
+        conn.execute("INSERT INTO criterion_stats SELECT criterion, model, COUNT(*), SUM(score) FROM debate_scores "
+                     "GROUP BY criterion, model")
+        conn.commit()
+
+
+@bench("leaderboard_100k", repeat=20)
+def _(loop):
+    seed_verdicts()
+    return lambda: leaderboard()
+
+
+@bench("leaderboard_topic_100k", repeat=20)
+def _(loop):
+    seed_verdicts()
+    return lambda: leaderboard(topic="topic 7")
+
+
+@bench("leaderboard_criterion_100k", repeat=20)
+def _(loop):
+    seed_verdicts()
+    return lambda: leaderboard(criterion="Persuasiveness")
+
+
+@bench("leaderboard_criterion_topic_100k", repeat=20)
+def _(loop):
+    seed_verdicts()
+    return lambda: leaderboard(topic="topic 7", criterion="Persuasiveness")
+
+
+# ── Runner ─────────────────────────────────────────────────────────────────
+def measure(fn, repeat: int) -> dict:
+    fn()   # warm-up (imports, pooled clients, sqlite file)
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples) * 1000, 4),
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "stdev_ms": round(statistics.stdev(samples) * 1000, 4) if repeat > 1 else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(selected: list[str]) -> dict:
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        for name in selected:
+            setup, repeat = BENCHMARKS[name]
+            results[name] = measure(setup(loop), repeat)
+            print(f"{name:<32} median {results[name]['median_ms']:>10.3f} ms"
+                  f"   min {results[name]['min_ms']:>10.3f} ms")
+        loop.run_until_complete(adapters.close_http_clients())
+    finally:
+        loop.close()
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    """Print median deltas; True if any benchmark is slower than threshold allows."""
+    regressed = False
+    print(f"\nvs {baseline['meta'].get('revision') or 'baseline'} (threshold +{threshold:.0%})")
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            print(f"{name:<32} (new)")
+            continue
+        change = now["median_ms"] / before["median_ms"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        regressed |= bool(flag)
+        print(f"{name:<32} {before['median_ms']:>10.3f} → {now['median_ms']:>10.3f} ms  {change:+7.1%} {flag}")
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Hot-path microbenchmarks")
+    parser.add_argument("-k", dest="pattern", default="", help="only run benchmarks containing this text")
+    parser.add_argument("--json", dest="out", help="write results to this file")
+    parser.add_argument("--compare", help="baseline JSON from a previous run")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed median slowdown before --compare fails (default 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    selected = [n for n in BENCHMARKS if args.pattern in n]
+    if not selected:
+        print(f"No benchmark matches {args.pattern!r}")
+        return 2
+    report = run(selected)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return 1 if compare(report, json.load(f), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,16 @@
+import time
 import asyncio
-from judge import run_judgment
+from contextlib import aclosing
+from judge import run_judgment, score_round
+from verdicts import Verdict, extract_verdict
+from adapters import warm_up_in_background
+from framing import Boundary, Status, Transcript, bounded, multiplex
+from metrics import ROUND_SECONDS, JUDGE_SECONDS, PROMPT_TOKENS
+from logger import save_round, save_state
+from context import RollingContext, context_budget, merge_roles, message_tokens
 
-MAX_HISTORY = 10
+JUDGE_CHECKPOINT_SECONDS = 5.0   # how often partial judge output is persisted
+DEADLINE_NOTICE = "\n⏰ Debate deadline reached — the judge rules on the rounds played so far.\n"
 
 
 class DebateController:
@@ -10,86 +19,293 @@ class DebateController:
     then invokes the AI judge for the final verdict.
     """
 
-    def __init__(self, config, session_id: str):
+    def __init__(self, config, session_id: str, checkpoint: dict | None = None):
         self.config = config
         self.session_id = session_id
-        self.history = []  # shared history context
+        # shared history context, trimmed to each speaker's token budget
+        self.context = RollingContext((config.judge_provider, config.judge_model))
         self.transcript_parts = [f"🧩 Topic: {config.topic}\n\n"]
+        self.turn = 0
+        self.start_round = 1
+        self.judge_partial = ""
+        self.judge_data: dict | None = None   # winner and scores of a structured (JSON) verdict
+        self.verdict: dict | None = None   # the verdict as data once judged, for log_debate
+        self.elapsed = 0.0            # seconds of rounds played before this run (resumes)
+        self._started = None
+        self.round_notes: list[dict] = []     # incremental judging: score_round() results by round
+        self.unscored: dict[int, dict] = {}   # round -> {side: reply} still being scored
+        self._scoring: list[asyncio.Task] = []
+        self._scored: list[dict] = []         # notes not announced yet
+        self.output = Transcript()   # everything streamed so far, for checkpoints
+        self._saved = (0, len(self.transcript_parts))   # (output, parts) already persisted
+        if checkpoint:
+            self._restore(checkpoint)
 
-    async def run(self):
-        """Main debate execution coroutine (async generator)."""
-        yield f"Session {self.session_id}\n\n"
+    # ── Checkpoints ─────────────────────────────────────────────────────
+    def _restore(self, cp: dict):
+        """Continue from a logger.load_checkpoint() record: skip the completed rounds."""
+        state = cp["state"]
+        self.context.history = state.get("history", [])
+        self.context.summary = state.get("summary", "")
+        self.turn = state.get("turn", 0)
+        self.judge_partial = state.get("judge_partial", "")
+        self.judge_data = state.get("judge_data")
+        self.elapsed = state.get("elapsed", 0.0)
+        self.round_notes = state.get("round_notes", [])
+        self.unscored = {int(r): replies for r, replies in state.get("unscored", {}).items()}
+        self.transcript_parts += cp["parts"]
+        self.output = Transcript(cp["output"])
+        self._saved = (len(self.output.parts), len(self.transcript_parts))
+        self.start_round = cp["round"] + 1
+
+    def _state(self) -> dict:
+        return {"history": self.context.history, "summary": self.context.summary,
+                "turn": self.turn, "judge_partial": self.judge_partial, "judge_data": self.judge_data,
+                "elapsed": self._elapsed(), "round_notes": self.round_notes, "unscored": self.unscored}
+
+    async def _checkpoint(self, round_no: int):
+        """Persist the round that just finished (off the event loop)."""
+        self.output.flush()
+        out_mark, parts_mark = self._saved
+        self._saved = (len(self.output.parts), len(self.transcript_parts))
+        await asyncio.to_thread(save_round, self.session_id, round_no, "".join(self.output.parts[out_mark:]),
+                                self.transcript_parts[parts_mark:], self._state())
+
+    # ── Budgets ─────────────────────────────────────────────────────────
+    def _elapsed(self) -> float:
+        return self.elapsed + (time.perf_counter() - self._started if self._started else 0.0)
 
-        # Define two participants
-        speakers = [
-            (self.config.adapter_a, "A", "for (Side A)"),
-            (self.config.adapter_b, "B", "against (Side B)"),
+    def _expired(self) -> bool:
+        return bool(self.config.deadline) and self._elapsed() >= self.config.deadline
+
+    def _reply(self, adapter, messages: list):
+        """adapter.stream() cut off at the turn's token / time budget or the debate deadline."""
+        now = asyncio.get_running_loop().time()
+        ends = []
+        if self.config.max_seconds:
+            ends.append(now + self.config.max_seconds)
+        if self.config.deadline:
+            ends.append(now + self.config.deadline - self._elapsed())
+        return bounded(adapter.stream(messages, self.config.max_tokens), self.config.max_tokens,
+                       min(ends, default=None))
+
+    # ── Rounds ──────────────────────────────────────────────────────────
+    def _speakers(self):
+        return [
+            (self.config.adapter_a, "A", "for (Side A)"),
+            (self.config.adapter_b, "B", "against (Side B)"),
         ]
-        turn = 0
-
-        # ── Debate Rounds ───────────────────────────────────────────────
-        for r in range(1, self.config.rounds + 1):
-            adapter, side, stance = speakers[turn]
-
-            # --- capture the opponent's previous message for visibility ---
-            if turn and len(self.history) >= 2:
-                # last "assistant" message before newer "user" prompt ≈ opponent's text
-                last_opponent = self.history[-2]["content"][:2000]
-                opponent_ref = f"Opponent's last response:\n{last_opponent}\n"
-            else:
-                opponent_ref = ""
-
-            # Explicit system prompt per side (now includes opponent_ref)
-            role_instruction = (
-                f"You are Side A arguing IN FAVOR of the topic: {self.config.topic}.\n"
-                f"{opponent_ref}"
-                "Provide a persuasive argument supporting the topic. "
-                "Do NOT invent your opponent’s lines, questions, or moderator comments."
-                if side == "A"
-                else f"You are Side B arguing AGAINST the topic: {self.config.topic}.\n"
-                     f"{opponent_ref}"
-                     "Provide a rebuttal or counter‑argument. "
-                     "Do NOT create or imitate the opponent’s dialogue."
-            )
-
-            round_messages = [{"role": "system", "content": role_instruction}]
-            round_messages += self.history[-MAX_HISTORY:]
-
-            yield f"\n{side} Round {r} — {adapter.name} (Side {side}) {stance}\n"
+
+    def _role_instruction(self, side: str) -> str:
+        # system prompt per side; identical every round so prompt caches can reuse it
+        return (
+            f"You are Side A arguing IN FAVOR of the topic: {self.config.topic}.\n"
+            "Provide a persuasive argument supporting the topic. "
+            "Do NOT invent your opponent’s lines, questions, or moderator comments."
+            if side == "A"
+            else f"You are Side B arguing AGAINST the topic: {self.config.topic}.\n"
+                 "Provide a rebuttal or counter‑argument. "
+                 "Do NOT create or imitate the opponent’s dialogue."
+        )
+
+    def _turn_instruction(self, side: str, r: int) -> str:
+        if not self.context.history and not self.context.summary:
+            return f"Round {r}: Side {side}, give your opening statement."
+        return f"Round {r}: Side {side}, answer Side {'B' if side == 'A' else 'A'}'s latest output above."
+
+    def _messages(self, adapter, side: str, r: int) -> list[dict]:
+        # stable prefix (system, summary, history) + this turn's instruction at the tail;
+        # older rounds beyond the budget are summarized in the background meanwhile
+        tail = {"role": "user", "content": self._turn_instruction(side, r)}
+        budget = context_budget(adapter.provider, adapter.model) - message_tokens(tail)
+        messages = merge_roles([*self.context.window(self._role_instruction(side), budget), tail])
+        PROMPT_TOKENS.observe(sum(map(message_tokens, messages)), adapter.provider, adapter.model)
+        return messages
+
+    def _record(self, side: str, response: str):
+        """Add a finished reply to the transcript and to the shared history."""
+        self.transcript_parts.append(response + "\n\n")
+        # --- add side labels and direct instruction for the next speaker ---
+        self.context.add(
+            {"role": "assistant", "content": f"SIDE {side} OUTPUT:\n{response}"},
+            {"role": "user", "content":
+                f"Please rebut or improve upon the previous message from "
+                f"Side {'A' if side=='B' else 'B'} succinctly."},
+        )
+
+    async def _sequential_rounds(self):
+        """One speaker per round, alternating A and B."""
+        speakers = self._speakers()
+        for r in range(self.start_round, self.config.rounds + 1):
+            if self._expired():
+                yield Boundary(DEADLINE_NOTICE)
+                break
+            adapter, side, stance = speakers[self.turn]
+            round_messages = self._messages(adapter, side, r)
+
+            if r == self.config.rounds:
+                # load the judge model while the last round streams, not after it
+                warm_up_in_background(self.config.judge_provider, self.config.judge_model)
+
+            yield Boundary(f"\n{side} Round {r} — {adapter.name} (Side {side}) {stance}\n")
 
             tokens = []
+            started = time.perf_counter()
             try:
-                async for tok in adapter.stream(round_messages):
-                    tokens.append(tok)
-                    yield tok
+                async with aclosing(self._reply(adapter, round_messages)) as reply:
+                    async for tok in reply:
+                        if not isinstance(tok, Status):
+                            tokens.append(tok)
+                        yield tok
             except Exception as e:
-                err_msg = f"\n[{adapter.name} ERROR: {e}]\n"
+                err_msg = f"\n[{adapter.name} ERROR: {e}]\n"
                 yield err_msg
                 self.transcript_parts.append(err_msg)
+                await self._checkpoint(r)
                 continue
+            finally:
+                ROUND_SECONDS.observe(time.perf_counter() - started, adapter.provider, adapter.model)
 
             yield "\n\n"
+            self._record(side, "".join(tokens))
+            self._score(r, {side: "".join(tokens)})
+
+            self.turn = 1 - self.turn  # alternate sides
+            await self._checkpoint(r)
+
+    async def _simultaneous_rounds(self):
+        """
+        Both sides speak at once: openings in parallel, then each pair of
+        rebuttals answers the previous pair. The same number of turns as the
+        sequential format (rounds rounded up to pairs) in about half the time.
+        """
+        pairs = (self.config.rounds + 1) // 2
+        speakers = self._speakers()
+        for r in range(self.start_round, pairs + 1):
+            if self._expired():
+                yield Boundary(DEADLINE_NOTICE)
+                break
+            # every speaker sees the same history: the previous pair, not each other
+            prompts = {side: self._messages(adapter, side, r) for adapter, side, _ in speakers}
+            if r == pairs:
+                warm_up_in_background(self.config.judge_provider, self.config.judge_model)
+
+            yield Boundary(f"\n⚡ Round {r} — {speakers[0][0].name} (A) vs {speakers[1][0].name} (B), simultaneous\n")
 
-            response = "".join(tokens)
-            self.transcript_parts.append(response + "\n\n")
+            results: dict[str, tuple[bool, str]] = {}
+            streams = {side: self._speak(adapter, side, stance, r, prompts[side], results)
+                       for adapter, side, stance in speakers}
+            async for chunk in multiplex(streams):
+                yield chunk
+            yield "\n\n"
+
+            for _, side, _ in speakers:   # A's reply, then B's, whichever finished first
+                ok, text = results[side]
+                if ok:
+                    self._record(side, text)
+                else:
+                    self.transcript_parts.append(text)
+            self._score(r, {side: text for side, (ok, text) in sorted(results.items()) if ok})
+            await self._checkpoint(r)
+
+    async def _speak(self, adapter, side: str, stance: str, r: int, messages: list, results: dict):
+        """One side's turn in a simultaneous round; results[side] = (ok, reply or error)."""
+        yield f"\n{side} Round {r} — {adapter.name} (Side {side}) {stance}\n"
+        tokens = []
+        started = time.perf_counter()
+        try:
+            async with aclosing(self._reply(adapter, messages)) as reply:
+                async for tok in reply:
+                    if not isinstance(tok, Status):
+                        tokens.append(tok)
+                    yield tok
+        except Exception as e:
+            err_msg = f"\n[{adapter.name} ERROR: {e}]\n"
+            results[side] = (False, err_msg)
+            yield err_msg
+            return
+        finally:
+            ROUND_SECONDS.observe(time.perf_counter() - started, adapter.provider, adapter.model)
+        results[side] = (True, "".join(tokens))
+
+    # ── Incremental judging ─────────────────────────────────────────────
+    def _score(self, r: int, replies: dict):
+        """Score a finished round in the background while the next one streams."""
+        if self.config.judging == "incremental" and replies:
+            self.unscored[r] = replies
+            self._scoring.append(asyncio.create_task(self._score_round(r, replies)))
+
+    async def _score_round(self, r: int, replies: dict):
+        names = {"A": self.config.adapter_a.name, "B": self.config.adapter_b.name}
+        try:
+            note = await score_round(r, replies, names, self.config.topic,
+                                     self.config.judge_provider, self.config.judge_model,
+                                     self.config.cache_policy, self.config.cache_replay,
+                                     self.config.resume_strategy, self.config.fallback)
+        except Exception as e:
+            print(f"[judge] round {r} not scored: {e!r}")
+            note = {"round": r, "scores": {}, "notes": f"not scored ({type(e).__name__})"}
+        self.round_notes = sorted([*self.round_notes, note], key=lambda n: n["round"])
+        self.unscored.pop(r, None)
+        self._scored.append(note)
+
+    def _verdict(self) -> dict:
+        """Winner, scores and who took part, for the indexed debates columns (verdicts.py)."""
+        a, b, config = self.config.adapter_a, self.config.adapter_b, self.config
+        verdict = extract_verdict(self.judge_partial, a.name, b.name, self.judge_data)
+        return {**verdict, "model_a": f"{a.provider}:{a.model}", "model_b": f"{b.provider}:{b.model}",
+                "judge": f"{config.judge_provider}:{config.judge_model}"}
+
+    def _announce(self):
+        """Status lines for round scores that came in since the last call."""
+        notes, self._scored = self._scored, []
+        for note in notes:
+            scores = ", ".join(f"{side} {value:g}/10" for side, value in note["scores"].items()) or "unscored"
+            yield Status(f"\n⚖️ Round {note['round']} scored — {scores}\n")
+
+    async def run(self):
+        """Main debate execution coroutine (async generator)."""
+        try:
+            async for chunk in self._run():
+                self.output.add(chunk)
+                yield chunk
+        finally:
+            for task in self._scoring:   # cancelled debate: stop scoring rounds nobody will read
+                task.cancel()
 
-            # --- add side labels and direct instruction for the next speaker ---
-            self.history.extend([
-                {"role": "assistant", "content": f"SIDE {side} OUTPUT:\n{response}"},
-                {"role": "user", "content":
-                    f"Please rebut or improve upon the previous message from "
-                    f"Side {'A' if side=='B' else 'B'} succinctly."},
-            ])
-            self.history = self.history[-MAX_HISTORY:]
+    async def _run(self):
+        if self.start_round > 1 or self.judge_partial:
+            yield Boundary(f"\n♻️ Resuming session {self.session_id} after round {self.start_round - 1}\n")
+        else:
+            yield f"Session {self.session_id}\n\n"
 
-            turn = 1 - turn  # alternate sides
+        self._started = time.perf_counter()
+        for r, replies in sorted(self.unscored.items()):   # scoring cut off by the interruption
+            self._score(r, replies)
+        if self.config.format == "simultaneous":
+            rounds = self._simultaneous_rounds()
+        else:
+            rounds = self._sequential_rounds()
+        async for chunk in rounds:
+            for status in self._announce():
+                yield status
+            yield chunk
 
         # ── Judgment Phase ───────────────────────────────────────────────
+        await self.context.close()
+        if self._scoring:   # usually only the last round's score is still pending
+            await asyncio.gather(*self._scoring)
+            for status in self._announce():
+                yield status
         transcript = "".join(self.transcript_parts)
-        yield "\n\n⚖️ JUDGE SUMMONED...\n"
-        await asyncio.sleep(1)
-        yield "🧑‍⚖️ The AI Judge is deliberating...\n\n"
+        yield Boundary("\n\n⚖️ JUDGE SUMMONED...\n")
+        yield Boundary("🧑‍⚖️ The AI Judge is deliberating...\n\n")
 
+        await asyncio.to_thread(save_state, self.session_id, self._state(), "judging")
+        if self.judge_partial:
+            yield self.judge_partial   # streamed before the interruption; the judge continues it
+            self.transcript_parts.append(self.judge_partial)
+        started = saved_at = time.perf_counter()
         try:
             async for tok in run_judgment(
                 self.config.adapter_a,
@@ -98,18 +314,38 @@ class DebateController:
                 self.config.topic,
                 self.config.judge_provider,
                 self.config.judge_model,
+                cache_policy=self.config.cache_policy,
+                cache_replay=self.config.cache_replay,
+                resume=self.config.resume_strategy,
+                fallback=self.config.fallback,
+                partial=self.judge_partial,
+                round_notes=self.round_notes if self.config.judging == "incremental" else None,
+                judges=self.config.judges,
+                quorum=self.config.judge_quorum,
+                aggregate=self.config.judge_aggregate,
             ):
                 yield tok
-                self.transcript_parts.append(tok)
+                if isinstance(tok, Verdict):
+                    self.judge_data = tok.data
+                if not isinstance(tok, Status):
+                    self.transcript_parts.append(tok)
+                    self.judge_partial += tok
+                    if time.perf_counter() - saved_at > JUDGE_CHECKPOINT_SECONDS:
+                        saved_at = time.perf_counter()
+                        await asyncio.to_thread(save_state, self.session_id, self._state(), "judging")
         except Exception as e:
-            err_msg = f"\n[JUDGE ERROR: {e}]\n"
+            err_msg = f"\n[JUDGE ERROR: {e}]\n"
             yield err_msg
             self.transcript_parts.append(err_msg)
+        finally:
+            JUDGE_SECONDS.observe(time.perf_counter() - started,
+                                  self.config.judge_provider, self.config.judge_model)
 
-        yield "\n\n🏛️ Case closed."
+        yield Boundary("\n\n🏛️ Case closed.")
         self.transcript_parts.append("\n\n🏛️ Case closed.")
 
         # Clean up adapters
         await self.config.adapter_a.close()
         await self.config.adapter_b.close()
+        self.verdict = self._verdict()
 
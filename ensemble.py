@@ -0,0 +1,134 @@
+"""
+ensemble.py — Several judges rule on the same debate at once.
+
+`run_ensemble()` sends the judge prompt to every judge of the panel
+concurrently, each under its own JUDGE_TIMEOUT. As soon as `quorum` of them
+have returned a verdict the rest are cancelled, and one combined verdict is
+emitted: the plurality winner, each criterion's mean or median score and how
+far the judges were apart, followed by every counted verdict in full. A slow
+or failing judge provider costs the debate nothing once the quorum is in.
+
+Judges reply in JSON (VERDICT_SCHEMA) when VERDICT_FORMAT=json; a reply that
+isn't valid JSON is read with verdicts.parse_winner() / parse_scores().
+"""
+
+import os
+import asyncio
+import statistics
+from adapters import get_adapter
+from framing import Status
+from response_cache import with_cache
+from verdicts import VERDICT_FORMAT, VERDICT_SCHEMA, parse_json, parse_verdict, render_verdict
+
+JUDGE_TIMEOUT = float(os.getenv("JUDGE_TIMEOUT", "300"))   # seconds per ensemble judge
+DISAGREEMENT_SPREAD = 3.0   # points between the highest and lowest score worth flagging
+
+
+# ── Combining ───────────────────────────────────────────────────────────────
+def combine(verdicts: list[tuple[str, float, str]], names: tuple[str, str], aggregate: str = "median",
+            missing: list[str] = ()) -> str:
+    """One verdict from (judge, seconds, text) results: plurality winner, aggregated scores, spread."""
+    mid = statistics.median if aggregate == "median" else statistics.fmean
+    parsed = [parse_json(text) or parse_verdict(text, *names) for _, _, text in verdicts]
+    votes = [verdict["winner"] for verdict in parsed]
+    tables = [verdict["scores"] for verdict in parsed]
+    criteria = list(dict.fromkeys(c for table in tables for c in table))
+
+    rows, totals, spreads = [], [0.0, 0.0], []
+    for criterion in criteria:
+        given = [table[criterion] for table in tables if criterion in table]
+        cells = []
+        for side in (0, 1):
+            scores = [pair[side] for pair in given]
+            value, spread = mid(scores), max(scores) - min(scores)
+            totals[side] += value
+            spreads.append((spread, criterion))
+            cells.append(f"{value:.1f}/10" + (f" ({min(scores):g}–{max(scores):g})" if spread else ""))
+        rows.append(f"| {criterion} | {cells[0]} | {cells[1]} | {len(given)} |")
+
+    counted = {side: votes.count(side) for side in ("A", "B", "draw")}
+    leaders = [side for side, n in counted.items() if n == max(counted.values())]
+    by_score = "A" if totals[0] > totals[1] else "B" if totals[1] > totals[0] else "draw"
+    if len(leaders) == 1:
+        winner = leaders[0]   # plurality across A, B and draw
+    else:
+        winner = by_score if by_score in leaders else "draw"   # tied vote: the aggregated scores decide
+    label = {"A": names[0], "B": names[1], "draw": "Draw"}[winner]
+    tally = ", ".join(f"{n} for {({'A': names[0], 'B': names[1]}).get(side, side)}"
+                      for side, n in counted.items() if n)
+    unparsed = len(votes) - sum(counted.values())
+
+    lines = [f"### ENSEMBLE VERDICT — {len(verdicts)} judge{'s' * (len(verdicts) > 1)}, {aggregate} scores", "",
+             f"**Winner:** {label}", "",
+             f"Votes: {tally or 'none parsed'}" + (f", {unparsed} unclear" if unparsed else "")]
+    if rows:
+        lines += ["", f"| Criterion | {names[0]} | {names[1]} | Judges |", "|---|---|---|---|", *rows,
+                  f"| **Total** | {totals[0]:.1f} | {totals[1]:.1f} | |"]
+    split = [c for spread, c in sorted(spreads, reverse=True) if spread >= DISAGREEMENT_SPREAD]
+    if len(set(v for v in votes if v)) > 1:
+        lines.append("\n⚠️ Disagreement: the judges split on the winner.")
+    if split:
+        lines.append(f"\n⚠️ Disagreement: scores {DISAGREEMENT_SPREAD:g}+ points apart on "
+                     + ", ".join(dict.fromkeys(split)) + ".")
+    if missing:
+        lines.append("\nNot counted: " + ", ".join(missing))
+    for judge, seconds, text in verdicts:
+        lines += ["", f"#### {judge} ({seconds:.1f}s)", render_verdict(text, *names).strip()]
+    return "\n".join(lines) + "\n"
+
+
+# ── Running the panel ───────────────────────────────────────────────────────
+async def _verdict(provider: str, model: str, messages: list[dict], cache_policy: str, cache_replay: str,
+                   resume: str | None, fallback: tuple[str, str] | None) -> str:
+    schema = VERDICT_SCHEMA if VERDICT_FORMAT == "json" else None
+    judge = with_cache(get_adapter(provider, model, resume, fallback, schema=schema), cache_policy, cache_replay)
+    try:
+        return "".join([tok async for tok in judge.stream(messages) if not isinstance(tok, Status)])
+    finally:
+        await judge.close()
+
+
+async def run_ensemble(judges: list[tuple[str, str]], messages: list[dict], names: tuple[str, str],
+                       quorum: int | None = None, aggregate: str = "median",
+                       cache_policy: str = "off", cache_replay: str = "fast",
+                       resume: str | None = None, fallback: tuple[str, str] | None = None):
+    """
+    Yield a Status line per judge as it returns, then the combined verdict once
+    `quorum` judges (default: a majority) have ruled; the others are cancelled.
+    """
+    quorum = min(quorum or len(judges) // 2 + 1, len(judges))
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks = {
+        asyncio.create_task(asyncio.wait_for(
+            _verdict(provider, model, messages, cache_policy, cache_replay, resume, fallback), JUDGE_TIMEOUT
+        )): f"{provider}:{model}"
+        for provider, model in judges
+    }
+    verdicts, missing, pending = [], [], set(tasks)
+    yield Status(f"\n⚖️ {len(judges)} judges deliberating, verdict after {quorum}...\n")
+    try:
+        while pending and len(verdicts) < quorum:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                judge, seconds = tasks[task], loop.time() - started
+                try:
+                    verdicts.append((judge, seconds, task.result()))
+                    yield Status(f"\n⚖️ {judge} ruled in {seconds:.1f}s ({len(verdicts)}/{quorum})\n")
+                except asyncio.TimeoutError:
+                    missing.append(f"{judge} (timed out after {JUDGE_TIMEOUT:g}s)")
+                    yield Status(f"\n⚖️ {judge} timed out\n")
+                except Exception as e:
+                    missing.append(f"{judge} ({type(e).__name__})")
+                    yield Status(f"\n⚖️ {judge} failed: {e}\n")
+    finally:
+        for task in pending:   # quorum reached (or the debate was cancelled): stop the stragglers
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)   # let them close their streams
+    missing += [f"{tasks[task]} (cancelled after quorum)" for task in pending]
+
+    if not verdicts:
+        raise RuntimeError("no judge returned a verdict: " + ", ".join(missing))
+    if len(verdicts) < quorum:
+        missing.append(f"quorum of {quorum} not reached")
+    yield combine(verdicts, names, aggregate, missing)
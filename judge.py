@@ -1,10 +1,20 @@
 # judge.py
 """
 judge.py – Handles evaluation of the debate transcript by a third model acting as the judge.
-The judge compares the arguments of Side A and Side B and streams a verdict.
+The judge compares the arguments of Side A and Side B and streams a verdict.
+
+With judging="incremental" the controller calls score_round() in the background
+after every round, so the final verdict only aggregates a short scorecard
+instead of prefilling the whole transcript once the debate ends.
 """
 
-from adapters import get_adapter
+import re
+from adapters import get_adapter, RESUME_PROMPT
+from context import clip
+from ensemble import run_ensemble
+from framing import Status
+from response_cache import with_cache
+from verdicts import VERDICT_FORMAT, VERDICT_SCHEMA, rendered, verdict_instructions
 
 
 # ─── Template prompt fed to the judging model ───────────────────────────────
@@ -12,19 +22,20 @@ JUDGE_PROMPT = """
 You are the Supreme AI Judge. Be fair, witty, and decisive.
 
 Participants:
-• Side A: {a_name}
-• Side B: {b_name}
+• Side A: {a_name}
+• Side B: {b_name}
 Topic: {topic}
+{reply_format}"""
 
-Deliver your verdict in this exact format:
+JUDGE_CRITERIA = ["Logic & Reasoning", "Clarity & Structure", "Persuasiveness", "Use of Evidence"]
 
-### FINAL VERDICT
+# VERDICT_FORMAT=table: the markdown verdict, winner and scores first
+TABLE_FORMAT = """
+Deliver your verdict in this exact format, winner and scores first:
 
-**Winner:** [Name]
+### FINAL VERDICT
 
-**Summary**
-• {a_name} argued: [...]
-• {b_name} argued: [...]
+**Winner:** [Name, or Draw]
 
 **Scores**
 | Criterion            | {a_name} | {b_name} | Notes                    |
@@ -34,12 +45,85 @@ Deliver your verdict in this exact format:
 | Persuasiveness       | ?/10     | ?/10     |                          |
 | Use of Evidence      | ?/10     | ?/10     |                          |
 
+**Summary**
+• {a_name} argued: [...]
+• {b_name} argued: [...]
+
 **Detailed Reasoning:** [Your full judgment]
 """
 
 
+def judge_prompt(a_name: str, b_name: str, topic: str) -> str:
+    """The judge's system prompt, asking for the verdict in VERDICT_FORMAT."""
+    if VERDICT_FORMAT == "json":
+        reply_format = verdict_instructions(a_name, b_name, JUDGE_CRITERIA)
+    else:
+        reply_format = TABLE_FORMAT.format(a_name=a_name, b_name=b_name)
+    return JUDGE_PROMPT.format(a_name=a_name, b_name=b_name, topic=topic, reply_format=reply_format)
+
+
+# ─── Per-round scoring (incremental judging) ────────────────────────────────
+ROUND_PROMPT = """
+You are the Supreme AI Judge scoring one round at a time of a debate on: {topic}
+Score each side that spoke in the round from 0 to 10 (logic, clarity, persuasiveness,
+use of evidence), judging only the round you are given. Reply in exactly the requested
+format, nothing else.
+"""
+ROUND_MAX_TOKENS = 200      # the scorer's reply
+ROUND_INPUT_TOKENS = 3000   # per reply sent to the scorer
+
+_SCORE = re.compile(r"^\W*(?:side\s+)?([AB])\b\W*?[:=][\s*_]*(\d+(?:\.\d+)?)", re.IGNORECASE | re.MULTILINE)
+_NOTES = re.compile(r"^\W*notes\W*?:\s*(.+)", re.IGNORECASE | re.MULTILINE | re.DOTALL)
+
+
+def parse_round_score(text: str) -> dict:
+    """{"scores": {"A": 7.0, ...}, "notes": "..."} from the scorer's reply (0–10, clamped)."""
+    scores = {side.upper(): min(10.0, float(n)) for side, n in _SCORE.findall(text)}
+    m = _NOTES.search(text)
+    notes = (m.group(1) if m else text).strip()
+    return {"scores": scores, "notes": " ".join(notes.split())[:600]}
+
+
+async def score_round(round_no: int, replies: dict[str, str], names: dict[str, str], topic: str,
+                      provider: str, model: str, cache_policy: str = "off", cache_replay: str = "fast",
+                      resume: str | None = None, fallback: tuple[str, str] | None = None) -> dict:
+    """Score one finished round: {"round", "scores", "notes"}."""
+    judge = with_cache(get_adapter(provider, model, resume, fallback), cache_policy, cache_replay)
+    body = "\n\n".join(f"SIDE {side} ({names[side]}), round {round_no}:\n{clip(text, ROUND_INPUT_TOKENS)}"
+                        for side, text in replies.items())
+    form = "\n".join(f"{side}: [0-10]" for side in replies) + "\nNotes: [one or two sentences]"
+    messages = [
+        {"role": "system", "content": ROUND_PROMPT.format(topic=topic)},   # same every round: cacheable
+        {"role": "user", "content": f"{body}\n\nReply in this format:\n{form}"},
+    ]
+    try:
+        text = "".join([tok async for tok in judge.stream(messages, ROUND_MAX_TOKENS)
+                        if not isinstance(tok, Status)])
+    finally:
+        await judge.close()
+    return {"round": round_no, **parse_round_score(text)}
+
+
+def scorecard(notes: list[dict], names: dict[str, str]) -> str:
+    """Per-round scores and notes plus each side's average, for the final verdict."""
+    lines, totals = [], {side: [] for side in names}
+    for note in notes:
+        scores = ", ".join(f"{names.get(s, s)} {v:g}/10" for s, v in note["scores"].items()) or "unscored"
+        lines.append(f"Round {note['round']}: {scores} — {note['notes']}")
+        for side, value in note["scores"].items():
+            totals.setdefault(side, []).append(value)
+    lines.append("Averages: " + ", ".join(
+        f"{names.get(s, s)} {sum(v) / len(v):.1f}/10 over {len(v)} rounds" if v else f"{names.get(s, s)} unscored"
+        for s, v in totals.items()))
+    return "\n".join(lines)
+
+
 # ─── Main judgment coroutine ───────────────────────────────────────────────
-async def run_judgment(a, b, transcript: str, topic: str, provider: str, model: str):
+async def run_judgment(a, b, transcript: str, topic: str, provider: str, model: str,
+                       cache_policy: str = "off", cache_replay: str = "fast",
+                       resume: str | None = None, fallback: tuple[str, str] | None = None,
+                       partial: str = "", round_notes: list[dict] | None = None,
+                       judges: list[tuple[str, str]] = (), quorum: int | None = None, aggregate: str = "median"):
     """
     Stream the judge model’s evaluation of the completed debate.
 
@@ -49,18 +133,51 @@ async def run_judgment(a, b, transcript: str, topic: str, provider: str, model:
         topic:         Debate topic
         provider:      Provider name for the judge model
         model:         Model identifier for the judge
+        cache_policy:  Response cache policy (identical transcripts re-use the verdict)
+        cache_replay:  "fast" or "paced" replay of cached verdicts
+        resume:        Broken-stream strategy ("none" | "same" | "fallback")
+        fallback:      (provider, model) to fail over to
+        partial:       Verdict text streamed before an interruption; the judge continues it
+        round_notes:   score_round() results (incremental judging): judged instead of the transcript
+        judges:        More (provider, model) judges: an ensemble verdict once `quorum` have ruled
+        aggregate:     "median" or "mean" of the ensemble's scores
     """
-    judge = get_adapter(provider, model)
 
-    system_prompt = JUDGE_PROMPT.format(a_name=a.name, b_name=b.name, topic=topic)
+    system_prompt = judge_prompt(a.name, b.name, topic)
+    if round_notes is not None:
+        card = scorecard(round_notes, {"A": a.name, "B": b.name})
+        evidence = f"The debate was scored round by round as it happened:\n\n{card}"
+    else:
+        evidence = f"Here is the full debate transcript:\n\n{transcript}"
     messages = [
         {"role": "system", "content": system_prompt},
-        {
-            "role": "user",
-            "content": f"Here is the full debate transcript:\n\n{transcript}\n\nNow deliver your judgment.",
-        },
+        {"role": "user", "content": f"{evidence}\n\nNow deliver your judgment."},
     ]
 
+    if judges:
+        if partial:   # the combined verdict is emitted in one piece, so it was complete
+            return
+        async for token in run_ensemble([(provider, model), *judges], messages, (a.name, b.name), quorum,
+                                        aggregate, cache_policy, cache_replay, resume, fallback):
+            yield token
+        return
+
+    if VERDICT_FORMAT == "json":
+        if partial:   # the rendered verdict is emitted in one piece, so it was complete
+            return
+        judge = with_cache(get_adapter(provider, model, resume, fallback, schema=VERDICT_SCHEMA),
+                           cache_policy, cache_replay)
+        async for token in rendered(judge.stream(messages), a.name, b.name):
+            yield token
+        return
+
+    if partial:
+        messages += [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": RESUME_PROMPT},
+        ]
+
+    judge = with_cache(get_adapter(provider, model, resume, fallback), cache_policy, cache_replay)
     async for token in judge.stream(messages):
         yield token
 
@@ -6,6 +6,10 @@ logger.py – Thin SQLite wrapper for storing debate transcripts locally.
 import sqlite3
 from contextlib import closing
 import os
+import json
+import time
+import hashlib
+from metrics import DB_WRITE_SECONDS
 
 # Allow override through environment variable
 DB_PATH = os.getenv("DEBATE_DB_PATH", "debates.db")
@@ -23,16 +27,462 @@ with sqlite3.connect(DB_PATH) as conn:
         );
         """
     )
+    # In-flight debates: one row per session plus one per completed round,
+    # so a crash or redeploy can resume from the last finished round.
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            session TEXT PRIMARY KEY,
+            ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+            topic TEXT,
+            spec TEXT,
+            round INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'running',
+            state TEXT DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS checkpoint_rounds (
+            session TEXT,
+            round INTEGER,
+            output TEXT,
+            parts TEXT,
+            PRIMARY KEY (session, round)
+        );
+        """
+    )
+    # Tournaments: one row per run, one per pairing (see tournament.py)
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS tournaments (
+            name TEXT PRIMARY KEY,
+            ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+            spec TEXT,
+            status TEXT DEFAULT 'running'
+        );
+        CREATE TABLE IF NOT EXISTS tournament_matches (
+            tournament TEXT,
+            match_no INTEGER,
+            topic TEXT,
+            side_a TEXT,
+            side_b TEXT,
+            status TEXT DEFAULT 'pending',
+            session TEXT,
+            winner TEXT,
+            error TEXT,
+            seconds REAL,
+            PRIMARY KEY (tournament, match_no)
+        );
+        """
+    )
+    # Batch job queue shared by worker processes (see batch.py). A running job
+    # belongs to `worker` until `lease_until` (unix time); heartbeats extend it.
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue TEXT DEFAULT 'default',
+            ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+            spec TEXT,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            worker TEXT,
+            lease_until REAL DEFAULT 0,
+            session TEXT,
+            error TEXT,
+            seconds REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (queue, status, id);
+        """
+    )
+    # Verdicts as data (see verdicts.py): who debated, who won and the scores, so
+    # leaderboards are index lookups instead of re-parsing every transcript.
+    # model_stats / criterion_stats are running totals kept up to date by log_debate.
+    have = {row[1] for row in conn.execute("PRAGMA table_info(debates)")}
+    for column, kind in (("model_a", "TEXT"), ("model_b", "TEXT"), ("judge", "TEXT"), ("topic_hash", "TEXT"),
+                         ("winner", "TEXT"), ("score_a", "REAL"), ("score_b", "REAL"), ("verdict", "TEXT")):
+        if column not in have:   # databases created before these columns existed
+            conn.execute(f"ALTER TABLE debates ADD COLUMN {column} {kind}")
+    conn.executescript(
+        """
+        -- covering: the verdict columns sit after the transcript in each row
+        CREATE INDEX IF NOT EXISTS debates_topic ON debates (topic_hash, winner, model_a, model_b, score_a, score_b);
+        CREATE TABLE IF NOT EXISTS debate_scores (
+            debate INTEGER,
+            side TEXT,
+            model TEXT,
+            criterion TEXT,
+            score REAL,
+            PRIMARY KEY (debate, side, criterion)
+        );
+        CREATE TABLE IF NOT EXISTS model_stats (
+            model TEXT PRIMARY KEY,
+            debates INTEGER DEFAULT 0,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            draws INTEGER DEFAULT 0,
+            score_sum REAL DEFAULT 0,
+            scored INTEGER DEFAULT 0,
+            updated DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS criterion_stats (
+            criterion TEXT,
+            model TEXT,
+            scored INTEGER DEFAULT 0,
+            score_sum REAL DEFAULT 0,
+            PRIMARY KEY (criterion, model)
+        );
+        """
+    )
     conn.commit()
 
 
 # ─── Function to log a debate ───────────────────────────────────────────────
-def log_debate(session: str, topic: str, transcript: str):
-    """Append a debate transcript to the local SQLite database."""
+def topic_hash(topic: str) -> str:
+    """Index key for a topic (topics can be whole transcripts, too long to index)."""
+    return hashlib.blake2b(" ".join(topic.split()).encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
+
+
+def log_debate(session: str, topic: str, transcript: str, verdict: dict | None = None):
+    """
+    Append a debate transcript to the local SQLite database. `verdict` (the
+    controller's: model_a, model_b, judge, winner, scores) fills the indexed
+    columns, debate_scores and model_stats in the same transaction.
+    """
+    started = time.perf_counter()
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        if verdict is None:
+            conn.execute(
+                "INSERT INTO debates (session, topic, transcript, topic_hash) VALUES (?, ?, ?, ?)",
+                (session, topic, transcript, topic_hash(topic)),
+            )
+        else:
+            _insert_verdict(conn, session, topic, transcript, verdict)
+        conn.commit()
+    DB_WRITE_SECONDS.observe(time.perf_counter() - started, "debates")
+
+
+def _insert_verdict(conn: sqlite3.Connection, session: str, topic: str, transcript: str, verdict: dict):
+    models, winner = (verdict["model_a"], verdict["model_b"]), verdict.get("winner")
+    scores = verdict.get("scores") or {}
+    means = [sum(pair[side] for pair in scores.values()) / len(scores) if scores else None for side in (0, 1)]
+    debate = conn.execute(
+        """
+        INSERT INTO debates (session, topic, transcript, model_a, model_b, judge, topic_hash,
+                             winner, score_a, score_b, verdict)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (session, topic, transcript, *models, verdict.get("judge"), topic_hash(topic), winner, *means,
+         json.dumps({"winner": winner, "scores": scores, "source": verdict.get("source")})),
+    ).lastrowid
+    conn.executemany(
+        "INSERT OR REPLACE INTO debate_scores (debate, side, model, criterion, score) VALUES (?, ?, ?, ?, ?)",
+        [(debate, side, models[i], criterion, pair[i])
+         for criterion, pair in scores.items() for i, side in enumerate("AB")],
+    )
+    # A model that played itself counts once per debate: its two sides' scores averaged, a draw
+    self_play = models[0] == models[1]
+    if self_play:
+        criteria = [(criterion, models[0], sum(pair) / 2) for criterion, pair in scores.items()]
+    else:
+        criteria = [(criterion, models[i], pair[i]) for criterion, pair in scores.items() for i in (0, 1)]
+    conn.executemany(
+        """
+        INSERT INTO criterion_stats (criterion, model, scored, score_sum) VALUES (?, ?, 1, ?)
+        ON CONFLICT (criterion, model) DO UPDATE SET
+            scored = scored + 1, score_sum = score_sum + excluded.score_sum
+        """,
+        criteria,
+    )
+    if winner is None:   # no verdict to count (judge error, unreadable verdict)
+        return
+    conn.executemany(
+        """
+        INSERT INTO model_stats (model, debates, wins, losses, draws, score_sum, scored) VALUES (?, 1, ?, ?, ?, ?, ?)
+        ON CONFLICT (model) DO UPDATE SET
+            debates = debates + 1, wins = wins + excluded.wins, losses = losses + excluded.losses,
+            draws = draws + excluded.draws, score_sum = score_sum + excluded.score_sum,
+            scored = scored + excluded.scored, updated = CURRENT_TIMESTAMP
+        """,
+        [(models[0], 0, 0, 1, sum(means) / 2 if scores else 0.0, int(bool(scores)))] if self_play else
+        [(model, int(winner == side), int(winner == other), int(winner == "draw"), means[i] or 0.0,
+          int(means[i] is not None))
+         for i, (model, side, other) in enumerate(((models[0], "A", "B"), (models[1], "B", "A")))],
+    )
+
+
+# ─── Leaderboard ────────────────────────────────────────────────────────────
+_RANKING = "ORDER BY (wins + 0.5 * draws) * 1.0 / debates DESC, debates DESC, model LIMIT ?"
+
+
+def leaderboard(limit: int = 50, min_debates: int = 1, topic: str | None = None,
+                criterion: str | None = None) -> list[dict]:
+    """
+    Models ranked by win rate (a draw counts half) with their average score,
+    from model_stats, or from the indexed debates columns for one `topic`.
+    With `criterion`, models ranked by their average score on that criterion.
+    """
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        if criterion is not None:
+            if topic is None:
+                rows = conn.execute(
+                    """
+                    SELECT model, scored, score_sum / scored FROM criterion_stats WHERE criterion = ? AND scored >= ?
+                    ORDER BY score_sum / scored DESC, scored DESC LIMIT ?
+                    """,
+                    (criterion, min_debates, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    """
+                    SELECT model, COUNT(DISTINCT debate), AVG(score) FROM debate_scores
+                    WHERE criterion = ? AND debate IN (SELECT id FROM debates WHERE topic_hash = ?)
+                    GROUP BY model HAVING COUNT(DISTINCT debate) >= ?
+                    ORDER BY AVG(score) DESC, COUNT(DISTINCT debate) DESC LIMIT ?
+                    """,
+                    (criterion, topic_hash(topic), min_debates, limit),
+                ).fetchall()
+            return [{"model": m, "criterion": criterion, "debates": n, "avg_score": round(avg, 2)}
+                    for m, n, avg in rows]
+        if topic is None:
+            rows = conn.execute(
+                "SELECT model, debates, wins, losses, draws, score_sum, scored FROM model_stats "
+                f"WHERE debates >= ? {_RANKING}",
+                (min_debates, limit),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"""
+                SELECT model, COUNT(*) AS debates, SUM(won) AS wins, SUM(lost) AS losses, SUM(drew) AS draws,
+                       TOTAL(score), COUNT(score)
+                FROM (
+                    SELECT model_a AS model, winner = 'A' AND model_b != model_a AS won,
+                           winner = 'B' AND model_b != model_a AS lost, winner = 'draw' OR model_b = model_a AS drew,
+                           CASE WHEN model_b = model_a THEN (score_a + score_b) / 2 ELSE score_a END AS score
+                    FROM debates WHERE topic_hash = ? AND winner IS NOT NULL
+                    UNION ALL   -- self-play counts once, as a draw
+                    SELECT model_b, winner = 'B', winner = 'A', winner = 'draw', score_b
+                    FROM debates WHERE topic_hash = ? AND winner IS NOT NULL AND model_b != model_a
+                )
+                GROUP BY model HAVING debates >= ? {_RANKING}
+                """,
+                (topic_hash(topic), topic_hash(topic), min_debates, limit),
+            ).fetchall()
+    return [
+        {"model": m, "debates": n, "wins": w, "losses": l, "draws": d,
+         "win_rate": round((w + 0.5 * d) / n, 3), "avg_score": round(total / scored, 2) if scored else None}
+        for m, n, w, l, d, total, scored in rows
+    ]
+
+
+
+# ─── Checkpoints (resumable debates) ────────────────────────────────────────
+def create_checkpoint(session: str, topic: str, spec: dict):
+    """Register a new debate; `spec` holds the parameters needed to rebuild it."""
     with closing(sqlite3.connect(DB_PATH)) as conn:
         conn.execute(
-            "INSERT INTO debates (session, topic, transcript) VALUES (?, ?, ?)",
-            (session, topic, transcript),
+            "INSERT OR REPLACE INTO checkpoints (session, topic, spec) VALUES (?, ?, ?)",
+            (session, topic, json.dumps(spec)),
         )
         conn.commit()
 
+
+def save_round(session: str, round_no: int, output: str, parts: list[str], state: dict):
+    """Persist one completed round (its output and transcript parts) plus controller state."""
+    started = time.perf_counter()
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoint_rounds (session, round, output, parts) VALUES (?, ?, ?, ?)",
+            (session, round_no, output, json.dumps(parts)),
+        )
+        conn.execute(
+            "UPDATE checkpoints SET round = ?, state = ?, updated = CURRENT_TIMESTAMP WHERE session = ?",
+            (round_no, json.dumps(state), session),
+        )
+        conn.commit()
+    DB_WRITE_SECONDS.observe(time.perf_counter() - started, "checkpoints")
+
+
+def save_state(session: str, state: dict, status: str):
+    """Update controller state without closing a round (e.g. partial judge output)."""
+    started = time.perf_counter()
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        conn.execute(
+            "UPDATE checkpoints SET state = ?, status = ?, updated = CURRENT_TIMESTAMP WHERE session = ?",
+            (json.dumps(state), status, session),
+        )
+        conn.commit()
+    DB_WRITE_SECONDS.observe(time.perf_counter() - started, "checkpoints")
+
+
+def finish_checkpoint(session: str):
+    """Mark a debate done and drop its per-round rows (the transcript is in debates)."""
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        conn.execute("UPDATE checkpoints SET status = 'done', updated = CURRENT_TIMESTAMP WHERE session = ?",
+                     (session,))
+        conn.execute("DELETE FROM checkpoint_rounds WHERE session = ?", (session,))
+        conn.commit()
+
+
+def load_checkpoint(session: str) -> dict | None:
+    """Everything needed to resume `session`, or None if it is unknown."""
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        row = conn.execute(
+            "SELECT topic, spec, round, status, state FROM checkpoints WHERE session = ?", (session,)
+        ).fetchone()
+        if row is None:
+            return None
+        rounds = conn.execute(
+            "SELECT output, parts FROM checkpoint_rounds WHERE session = ? ORDER BY round", (session,)
+        ).fetchall()
+    return {
+        "session": session,
+        "topic": row[0],
+        "spec": json.loads(row[1] or "{}"),
+        "round": row[2],
+        "status": row[3],
+        "state": json.loads(row[4] or "{}"),
+        "output": "".join(r[0] for r in rounds),
+        "parts": [p for r in rounds for p in json.loads(r[1])],
+    }
+
+
+def list_resumable(limit: int = 50) -> list[dict]:
+    """Unfinished debates, most recently active first."""
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        rows = conn.execute(
+            """
+            SELECT session, topic, spec, round, status, updated FROM checkpoints
+            WHERE status != 'done' ORDER BY updated DESC LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+    return [
+        {"session": s, "topic": (t or "")[:200], "rounds": json.loads(spec or "{}").get("rounds"),
+         "completed_rounds": r, "status": st, "updated": u}
+        for s, t, spec, r, st, u in rows
+    ]
+
+
+# ─── Tournaments ────────────────────────────────────────────────────────────
+def create_tournament(name: str, spec: dict, matches: list[tuple[str, str, str]]):
+    """Register a tournament and its (topic, side_a, side_b) pairings, all pending."""
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        conn.execute("INSERT INTO tournaments (name, spec) VALUES (?, ?)", (name, json.dumps(spec)))
+        conn.executemany(
+            "INSERT INTO tournament_matches (tournament, match_no, topic, side_a, side_b) VALUES (?, ?, ?, ?, ?)",
+            [(name, i, *m) for i, m in enumerate(matches, 1)],
+        )
+        conn.commit()
+
+
+def load_tournament(name: str) -> dict | None:
+    """A tournament's spec, status and matches (as dicts, in match order), or None."""
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        row = conn.execute("SELECT spec, status FROM tournaments WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        cols = ("match_no", "topic", "side_a", "side_b", "status", "session", "winner", "error", "seconds")
+        matches = conn.execute(
+            f"SELECT {', '.join(cols)} FROM tournament_matches WHERE tournament = ? ORDER BY match_no", (name,)
+        ).fetchall()
+    return {"name": name, "spec": json.loads(row[0]), "status": row[1],
+            "matches": [dict(zip(cols, m)) for m in matches]}
+
+
+def update_match(tournament: str, match_no: int, **fields):
+    """Set status / session / winner / error / seconds on one pairing."""
+    started = time.perf_counter()
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        conn.execute(
+            f"UPDATE tournament_matches SET {', '.join(f'{k} = ?' for k in fields)} "
+            "WHERE tournament = ? AND match_no = ?",
+            (*fields.values(), tournament, match_no),
+        )
+        conn.commit()
+    DB_WRITE_SECONDS.observe(time.perf_counter() - started, "tournament_matches")
+
+
+def finish_tournament(name: str, status: str = "done"):
+    with closing(sqlite3.connect(DB_PATH)) as conn:
+        conn.execute("UPDATE tournaments SET status = ? WHERE name = ?", (status, name))
+        conn.commit()
+
+
+# ─── Batch job queue (leases) ───────────────────────────────────────────────
+def _queue_conn() -> sqlite3.Connection:
+    # Several processes (possibly on several hosts) contend for this file
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+def enqueue_jobs(specs: list[dict], queue: str = "default") -> int:
+    with closing(_queue_conn()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT INTO jobs (queue, spec) VALUES (?, ?)",
+                         [(queue, json.dumps(s)) for s in specs])
+        conn.execute("COMMIT")
+    return len(specs)
+
+
+def claim_job(queue: str, worker: str, lease: float, max_attempts: int) -> dict | None:
+    """
+    Atomically take the oldest queued job, or a running one whose lease has
+    expired (its worker died), and lease it to `worker` for `lease` seconds.
+    """
+    while True:
+        now = time.time()
+        with closing(_queue_conn()) as conn:
+            conn.execute("BEGIN IMMEDIATE")   # one claimer at a time across processes
+            row = conn.execute(
+                """
+                SELECT id, spec, session, attempts FROM jobs
+                WHERE queue = ? AND (status = 'queued' OR (status = 'running' AND lease_until < ?))
+                ORDER BY id LIMIT 1
+                """,
+                (queue, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job_id, spec, session, attempts = row
+            if attempts >= max_attempts:
+                conn.execute("UPDATE jobs SET status = 'failed', error = COALESCE(error, 'lease expired') || "
+                             "' (gave up after ' || attempts || ' attempts)' WHERE id = ?", (job_id,))
+                conn.execute("COMMIT")
+                continue   # look again once this transaction and connection are closed
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, now + lease, job_id),
+            )
+            conn.execute("COMMIT")
+        return {"id": job_id, "spec": json.loads(spec), "session": session, "attempts": attempts + 1}
+
+
+def renew_lease(job_id: int, worker: str, lease: float, session: str | None = None) -> bool:
+    """Heartbeat: extend the lease. False if the job was re-claimed by someone else."""
+    with closing(_queue_conn()) as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET lease_until = ?, session = COALESCE(?, session) "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + lease, session, job_id, worker),
+        )
+        return cur.rowcount == 1
+
+
+def finish_job(job_id: int, worker: str, status: str, error: str | None = None, seconds: float | None = None):
+    """Record the outcome: 'done', 'failed', or 'queued' to hand the job back."""
+    with closing(_queue_conn()) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, seconds = ?, lease_until = 0 "
+            "WHERE id = ? AND worker = ?",
+            (status, error, seconds, job_id, worker),
+        )
+
+
+def job_counts(queue: str | None = None) -> dict[str, int]:
+    with closing(_queue_conn()) as conn:
+        rows = conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE ? IS NULL OR queue = ? GROUP BY status", (queue, queue)
+        ).fetchall()
+    return dict(rows)
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# logger.py creates its tables in DEBATE_DB_PATH at import time: keep tests off the real debates.db
+os.environ.setdefault("DEBATE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="debate-tests-"), "debates.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
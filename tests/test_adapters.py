@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import httpx
+import pytest
+
+import adapters
+from adapters import close_http_clients, get_client, get_http_client, preconnect
+from errors import RateLimited, RetryableError
+
+
+# ── Pooled HTTP clients ────────────────────────────────────────────────────
+def test_one_client_per_base_url():
+    async def run():
+        a = get_http_client("http://pool-test:11434/")
+        assert get_http_client("http://pool-test:11434") is a
+        assert get_http_client("http://other-host:11434") is not a
+        await a.aclose()
+        b = get_http_client("http://pool-test:11434")   # a closed client is replaced
+        assert b is not a and not b.is_closed
+        await close_http_clients()
+        return b
+
+    assert asyncio.run(run()).is_closed
+    assert adapters._HTTP_POOL == {} and adapters._CLIENT_CACHE == {}
+
+
+def test_sdk_clients_share_the_pooled_transport():
+    async def run():
+        client = get_client("http://sdk-test/v1", "key")
+        assert get_client("http://sdk-test/v1", "key") is client
+        assert get_client("http://sdk-test/v1", "other key") is not client
+        assert client._client is get_http_client("http://sdk-test/v1")
+        await close_http_clients()
+
+    asyncio.run(run())
+
+
+def test_preconnect_skips_urls_that_fail(capsys):
+    async def run():
+        adapters._HTTP_POOL["http://down"] = httpx.AsyncClient(
+            base_url="http://down", transport=httpx.MockTransport(lambda request: 1 / 0))
+        adapters._HTTP_POOL["http://up"] = httpx.AsyncClient(
+            base_url="http://up", transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+        await preconnect("http://down", "", "http://up")
+        await close_http_clients()
+
+    asyncio.run(run())
+    assert "[preconnect] http://down skipped: ZeroDivisionError" in capsys.readouterr().out
+
+
+# ── Ollama endpoint discovery ──────────────────────────────────────────────
+NDJSON = b'{"message":{"content":"hi"},"done":false}\n{"message":{"content":""},"done":true}\n'
+SSE = b'data: {"choices":[{"delta":{"content":"hi"}}]}\n\ndata: [DONE]\n\n'
+
+
+def ollama_host(monkeypatch, routes: dict, respond=None) -> list[str]:
+    """Point OLLAMA_HOST at a fake server answering `routes` (path -> body, 404 elsewhere)
+    or calling `respond(request)`; returns the paths hit."""
+    host = f"http://ollama-{uuid.uuid4().hex[:8]}"
+    monkeypatch.setenv("OLLAMA_HOST", host)
+    hits = []
+
+    def handler(request):
+        hits.append(request.url.path)
+        if respond is not None:
+            return respond(request)
+        body = routes.get(request.url.path)
+        return httpx.Response(404) if body is None else httpx.Response(200, content=body)
+
+    adapters._HTTP_POOL[host] = httpx.AsyncClient(base_url=host, transport=httpx.MockTransport(handler))
+    return hits
+
+
+def chat(model: str = "llama3") -> list:
+    async def run():
+        return [t async for t in adapters.OllamaAdapter(model).stream([{"role": "user", "content": "hi"}])]
+    return asyncio.run(run())
+
+
+def test_ollama_endpoint_is_found_then_remembered(monkeypatch):
+    routes = {"/v1/chat/completions": SSE}
+    hits = ollama_host(monkeypatch, routes)
+    assert chat() == ["hi"]
+    assert hits == ["/api/chat", "/chat", "/v1/chat/completions"]
+    hits.clear()
+    assert chat("qwen3") == ["hi"]                # any model on the same host
+    assert hits == ["/v1/chat/completions"]
+
+
+def test_ollama_endpoint_is_rediscovered_when_it_goes_away(monkeypatch):
+    routes = {"/chat": NDJSON}
+    hits = ollama_host(monkeypatch, routes)
+    chat()
+    routes.clear()
+    routes["/api/chat"] = NDJSON                  # the proxy in front was removed
+    hits.clear()
+    assert chat() == ["hi"]
+    assert hits == ["/chat", "/api/chat"]
+    assert adapters._OLLAMA_ENDPOINT[os.environ["OLLAMA_HOST"]] == ("/api/chat", "ndjson")
+
+
+# ── Synthetic provider ─────────────────────────────────────────────────────
+def synthetic(model: str, messages=None, max_tokens=None) -> list:
+    async def run():
+        adapter = adapters.SyntheticAdapter(model)
+        return [t async for t in adapter.stream(messages or [{"role": "user", "content": "hi"}], max_tokens)]
+    return asyncio.run(run())
+
+
+def test_synthetic_options():
+    adapter = adapters.SyntheticAdapter("fast?tps=200&lang=java")
+    assert adapter.cfg["tps"] == 200.0 and adapter.cfg["ttft"] == 0.15 and adapter.cfg["lang"] == "java"
+    for bad in ("warp", "fast?speed=9"):
+        with pytest.raises(ValueError):
+            adapters.SyntheticAdapter(bad)
+
+
+def test_synthetic_seed_makes_output_a_function_of_the_prompt():
+    model = "instant?seed=1&length=40"
+    assert synthetic(model) == synthetic(model)
+    assert synthetic(model) != synthetic(model, [{"role": "user", "content": "bye"}])
+    assert synthetic(model) != synthetic("instant?seed=2&length=40")
+    assert 30 <= len(synthetic(model)) <= 50
+
+
+def test_synthetic_max_tokens_and_code():
+    assert len(synthetic("instant?length=100", max_tokens=7)) == 7
+    text = "".join(synthetic("instant?code=1&lang=java&length=80&seed=3"))
+    assert "```java\npublic static int step1(int value) {" in text and text.count("```") == 2
+
+
+def test_synthetic_failures():
+    with pytest.raises(RateLimited) as limited:
+        synthetic("instant?429=1&retry_after=2.5")
+    assert limited.value.retry_after == 2.5
+    with pytest.raises(RetryableError, match="synthetic stream failure"):
+        synthetic("instant?err=1&length=20")
+
+
+def test_synthetic_pacing():
+    started = time.perf_counter()
+    tokens = synthetic("fast?ttft=0.05&ttft_sd=0&tps=100&jitter=0&length=8")
+    elapsed = time.perf_counter() - started
+    assert 0.05 + (len(tokens) - 1) / 100 <= elapsed < 0.5
+
+
+def test_get_adapter_builds_the_full_chain():
+    adapter = adapters.get_adapter("synthetic", "instant")
+    assert isinstance(adapter, adapters.ResilientAdapter)
+    assert isinstance(adapter.inner, adapters.ScheduledAdapter)
+    assert isinstance(adapter.inner.inner, adapters.MeteredAdapter)
+    assert isinstance(adapter.inner.inner.inner, adapters.SyntheticAdapter)
+    with pytest.raises(ValueError):
+        adapters.get_adapter("nope", "x")
+
+
+# ── Warm-up ────────────────────────────────────────────────────────────────
+def test_warm_up_loads_the_model_with_request_settings(monkeypatch):
+    monkeypatch.setattr(adapters, "OLLAMA_MODEL_OPTIONS", {"*": {"keep_alive": "30m"}, "qwen3": {"num_ctx": 16384}})
+    bodies = []
+
+    def respond(request):
+        bodies.append(json.loads(request.content))
+        return httpx.Response(200, json={"done": True})
+
+    hits = ollama_host(monkeypatch, {}, respond)
+    assert asyncio.run(adapters.warm_up("Ollama", "qwen3"))
+    assert not asyncio.run(adapters.warm_up("anthropic", "claude"))
+    assert hits == ["/api/generate"]
+    assert bodies == [{"model": "qwen3", "options": {"num_ctx": 16384}, "keep_alive": "30m"}]
+
+
+def test_failed_warm_up_is_not_fatal(monkeypatch):
+    ollama_host(monkeypatch, {})   # 404 for /api/generate
+    assert asyncio.run(adapters.warm_up("ollama", "missing")) is False
+
+
+def test_background_warm_up_runs_once_per_model(monkeypatch):
+    calls = []
+
+    async def warm_up(provider, model):
+        calls.append(model)
+        await asyncio.sleep(0.01)
+        return True
+
+    monkeypatch.setattr(adapters, "warm_up", warm_up)
+    monkeypatch.setattr(adapters, "_WARMING", {})
+
+    async def run():
+        first = adapters.warm_up_in_background("ollama", "llama3")
+        assert adapters.warm_up_in_background("ollama", "llama3") is first
+        assert adapters.warm_up_in_background("groq", "llama3") is None
+        await first
+        await adapters.warm_up_in_background("ollama", "llama3")   # done: a later call loads it again
+
+    asyncio.run(run())
+    assert calls == ["llama3", "llama3"]
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+
+from adapters import BaseAdapter
+from errors import RetryableError
+from framing import Status
+from response_cache import CachedAdapter, ResponseCache, cache_key, with_cache
+
+MESSAGES = [{"role": "user", "content": "Tabs or spaces?"}]
+
+
+class CountingAdapter(BaseAdapter):
+    provider = "fake"
+
+    def __init__(self, tokens=("a", "b", "c"), fail_after=None, gap=0.0):
+        super().__init__("fake-model")
+        self.tokens, self.fail_after, self.gap = tokens, fail_after, gap
+        self.calls = 0
+
+    async def stream(self, messages, max_tokens=None):
+        self.calls += 1
+        yield Status("queued")
+        for i, token in enumerate(self.tokens):
+            if i == self.fail_after:
+                raise RetryableError(self.name, "connection reset")
+            if self.gap:
+                await asyncio.sleep(self.gap)
+            yield token
+
+
+def collect(adapter, messages=MESSAGES, max_tokens=None, take=None) -> list:
+    async def run():
+        out = []
+        stream = adapter.stream(messages, max_tokens)
+        async for token in stream:
+            out.append(token)
+            if take and len(out) == take:
+                await stream.aclose()
+                break
+        return out
+    return asyncio.run(run())
+
+
+def test_second_identical_request_is_a_hit():
+    inner = CountingAdapter()
+    cached = CachedAdapter(inner, cache=ResponseCache())
+    assert collect(cached) == ["queued", "a", "b", "c"]
+    assert collect(cached) == ["a", "b", "c"]        # replayed: no queue notices
+    assert inner.calls == 1
+
+
+def test_prompt_and_sampling_are_part_of_the_key():
+    inner = CountingAdapter()
+    cached = CachedAdapter(inner, cache=ResponseCache())
+    collect(cached)
+    collect(cached, [{"role": "user", "content": "Vim or Emacs?"}])
+    collect(cached, max_tokens=10)
+    assert inner.calls == 3
+
+
+def test_key_ignores_line_endings_and_outer_whitespace():
+    params = {"temperature": 0.8}
+    key = cache_key("p", "m", params, [{"role": "User", "content": " a\r\nb "}])
+    assert key == cache_key("p", "m", params, [{"role": "user", "content": "a\nb"}])
+    assert key != cache_key("p", "m", {"temperature": 0.2}, [{"role": "user", "content": "a\nb"}])
+
+
+def test_read_only_serves_hits_but_never_stores():
+    cache = ResponseCache()
+    inner = CountingAdapter()
+    collect(CachedAdapter(inner, policy="read-only", cache=cache))
+    collect(CachedAdapter(inner, policy="read-only", cache=cache))
+    assert inner.calls == 2
+    collect(CachedAdapter(inner, cache=cache))
+    assert collect(CachedAdapter(inner, policy="read-only", cache=cache)) == ["a", "b", "c"]
+    assert inner.calls == 3
+
+
+def test_broken_stream_is_not_stored():
+    inner = CountingAdapter(fail_after=2)
+    cached = CachedAdapter(inner, cache=ResponseCache())
+    for _ in range(2):
+        with pytest.raises(RetryableError):
+            collect(cached)
+    assert inner.calls == 2
+
+
+def test_abandoned_stream_is_not_stored():
+    inner = CountingAdapter()
+    cached = CachedAdapter(inner, cache=ResponseCache())
+    assert collect(cached, take=2) == ["queued", "a"]
+    collect(cached)
+    assert inner.calls == 2
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    inner = CountingAdapter()
+    cached = CachedAdapter(inner, cache=ResponseCache(max_entries=2))
+    prompts = [[{"role": "user", "content": topic}] for topic in ("one", "two", "three")]
+    collect(cached, prompts[0])
+    collect(cached, prompts[1])
+    collect(cached, prompts[0])                       # "one" is now the most recent
+    collect(cached, prompts[2])                       # evicts "two"
+    assert inner.calls == 3
+    collect(cached, prompts[0])
+    collect(cached, prompts[1])
+    assert inner.calls == 4
+
+
+def test_sqlite_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    inner = CountingAdapter()
+    collect(CachedAdapter(inner, cache=ResponseCache(db_path=path)))
+    restarted = ResponseCache(max_entries=1, db_path=path)
+    assert collect(CachedAdapter(inner, cache=restarted)) == ["a", "b", "c"]
+    assert inner.calls == 1
+
+
+def test_paced_replay_keeps_the_original_cadence():
+    cache = ResponseCache()
+    collect(CachedAdapter(CountingAdapter(gap=0.05), cache=cache))
+    started = time.perf_counter()
+    collect(CachedAdapter(CountingAdapter(), replay="paced", cache=cache))
+    assert time.perf_counter() - started >= 0.14
+    started = time.perf_counter()
+    collect(CachedAdapter(CountingAdapter(), replay="fast", cache=cache))
+    assert time.perf_counter() - started < 0.05
+
+
+def test_policy_off_leaves_the_adapter_alone():
+    inner = CountingAdapter()
+    assert with_cache(inner, "off") is inner
+    assert isinstance(with_cache(inner, "read-only"), CachedAdapter)
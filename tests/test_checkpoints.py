@@ -0,0 +1,110 @@
+import asyncio
+import re
+import uuid
+from contextlib import aclosing
+
+from batch import build_config, normalize
+from controller import DebateController
+from framing import Boundary
+from logger import (create_checkpoint, finish_checkpoint, list_resumable, load_checkpoint, save_round,
+                    save_state)
+
+SPEC = {"topic": "Tabs or spaces?", "a": "synthetic:instant?length=20", "b": "synthetic:instant?length=20&seed=2",
+        "judge": "synthetic:instant?length=30", "rounds": 4}
+
+
+def session() -> str:
+    return uuid.uuid4().hex[:8]
+
+
+def test_checkpoint_round_trip():
+    sid = session()
+    create_checkpoint(sid, "topic", {"rounds": 3})
+    save_round(sid, 1, "out1 ", ["p1"], {"turn": 1})
+    save_round(sid, 2, "out2 ", ["p2", "p3"], {"turn": 0})
+    save_state(sid, {"turn": 0, "judge_partial": "The win"}, "judging")
+
+    cp = load_checkpoint(sid)
+    assert cp["round"] == 2 and cp["status"] == "judging"
+    assert cp["output"] == "out1 out2 " and cp["parts"] == ["p1", "p2", "p3"]
+    assert cp["state"] == {"turn": 0, "judge_partial": "The win"}
+    assert cp["spec"] == {"rounds": 3}
+    assert sid in [d["session"] for d in list_resumable(500)]
+
+    finish_checkpoint(sid)
+    cp = load_checkpoint(sid)
+    assert cp["status"] == "done" and cp["output"] == "" and cp["parts"] == []
+    assert sid not in [d["session"] for d in list_resumable(500)]
+    assert load_checkpoint("no-such-session") is None
+
+
+def test_saving_a_round_again_replaces_it():
+    sid = session()
+    create_checkpoint(sid, "topic", {})
+    save_round(sid, 1, "first try ", ["a"], {})
+    save_round(sid, 1, "second try ", ["b"], {})
+    cp = load_checkpoint(sid)
+    assert cp["output"] == "second try " and cp["parts"] == ["b"]
+
+
+async def play(controller, stop_at_round: int | None = None) -> list[str]:
+    """Run the debate; with `stop_at_round`, close it as that round's header arrives (a dropped client)."""
+    frames = []
+    async with aclosing(controller.run()) as stream:
+        async for frame in stream:
+            if stop_at_round and isinstance(frame, Boundary) and f"Round {stop_at_round} " in frame:
+                break
+            frames.append(str(frame))
+    return frames
+
+
+def rounds_played(frames: list[str]) -> list[int]:
+    return [int(m) for f in frames for m in re.findall(r"Round (\d+) —", f)]
+
+
+def test_interrupted_debate_resumes_after_its_last_completed_round():
+    sid = session()
+    spec = normalize(SPEC, {})
+    create_checkpoint(sid, spec["topic"], spec)
+
+    first = asyncio.run(play(DebateController(build_config(spec), sid), stop_at_round=3))
+    assert rounds_played(first) == [1, 2]
+
+    cp = load_checkpoint(sid)
+    assert cp["round"] == 2 and cp["status"] == "running"
+    assert cp["output"] == "".join(first)           # everything streamed before the drop was saved
+    history = list(cp["state"]["history"])
+    assert history and history[0]["content"].startswith("SIDE A OUTPUT")
+
+    resumed = DebateController(build_config(cp["spec"]), sid, cp)
+    second = asyncio.run(play(resumed))
+    assert "Resuming session" in second[0] and "after round 2" in second[0]
+    assert rounds_played(second) == [3, 4]
+    assert resumed.context.history[:len(history)] == history
+    assert len(resumed.context.history) == 2 * len(history)   # two more rounds, recorded the same way
+    assert resumed.turn == 0                         # A, B, A, B: A would be next
+
+    output = resumed.output.text()                   # what a reconnecting client is shown
+    assert output.startswith(cp["output"])
+    assert rounds_played([output]) == [1, 2, 3, 4]
+
+
+def test_resuming_during_judgment_continues_the_partial_verdict():
+    sid = session()
+    spec = normalize({**SPEC, "rounds": 1}, {})
+    create_checkpoint(sid, spec["topic"], spec)
+    asyncio.run(play(DebateController(build_config(spec), sid)))
+    cp = load_checkpoint(sid)
+    cp["state"]["judge_partial"] = "Partial verdict so far "
+    resumed = DebateController(build_config(cp["spec"]), sid, cp)
+    frames = asyncio.run(play(resumed))
+    assert rounds_played(frames) == []                # no round is replayed
+    assert "Partial verdict so far " in "".join(frames)
+
+
+def test_prompts_alternate_roles():
+    controller = DebateController(build_config(normalize(SPEC, {})), session())
+    asyncio.run(play(controller, stop_at_round=3))
+    adapter = controller._speakers()[controller.turn][0]
+    roles = [m["role"] for m in controller._messages(adapter, "A", 3)]
+    assert roles[0] == "system" and all(a != b for a, b in zip(roles, roles[1:]))
@@ -0,0 +1,106 @@
+import asyncio
+
+import adapters
+import context
+from context import RollingContext, clip, context_budget, merge_roles, message_tokens
+
+
+def test_merge_roles_joins_adjacent_turns_from_one_role():
+    history = [{"role": "system", "content": "s"},
+               {"role": "user", "content": "summary"},
+               {"role": "assistant", "content": "reply"},
+               {"role": "user", "content": "rebut it"},
+               {"role": "user", "content": "Round 3"}]
+    assert merge_roles(history) == [{"role": "system", "content": "s"},
+                                    {"role": "user", "content": "summary"},
+                                    {"role": "assistant", "content": "reply"},
+                                    {"role": "user", "content": "rebut it\n\nRound 3"}]
+    assert history[3] == {"role": "user", "content": "rebut it"}   # the recorded history is left alone
+
+
+def test_merge_roles_keeps_non_text_content_apart():
+    parts = [{"type": "text", "text": "look"}]
+    messages = [{"role": "user", "content": parts}, {"role": "user", "content": "and this"}]
+    assert merge_roles(messages) == messages
+
+
+def test_context_budget_lookup_order(monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_BUDGETS", {"ollama:llama3": 1000, "qwen": 2000, "anthropic": 3000, "*": 4000})
+    assert context_budget("ollama", "llama3") == 1000
+    assert context_budget("openai", "qwen") == 2000
+    assert context_budget("anthropic", "claude") == 3000
+    assert context_budget("openai", "gpt") == 4000
+
+
+def test_context_budget_defaults(monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_BUDGETS", {})
+    monkeypatch.setattr(adapters, "OLLAMA_MODEL_OPTIONS", {"big": {"num_ctx": 16384}})
+    assert context_budget("ollama", "big") == 16384 - context.CONTEXT_REPLY_RESERVE
+    assert context_budget("ollama", "small") == context.OLLAMA_DEFAULT_NUM_CTX - context.CONTEXT_REPLY_RESERVE
+    assert context_budget("anthropic", "claude") == context.CONTEXT_DEFAULT_BUDGET
+
+
+def test_clip_keeps_the_start():
+    text = "word " * 200
+    assert clip(text, 1000) == text
+    clipped = clip(text, 50)
+    assert clipped.endswith("\n[… truncated]") and text.startswith(clipped[:-len("\n[… truncated]")])
+    assert len(clipped) < len(text) // 3
+
+
+def rounds(n: int, words: int = 40) -> list[dict]:
+    history = []
+    for i in range(n):
+        history.append({"role": "assistant", "content": f"reply {i} " + "point " * words})
+        history.append({"role": "user", "content": f"instruction {i}"})
+    return history
+
+
+def test_window_fits_everything_while_history_is_short():
+    async def main():
+        ctx = RollingContext(history=rounds(2))
+        window = ctx.window("system", 10_000)
+        assert window == [{"role": "system", "content": "system"}, *rounds(2)]
+        assert ctx._task is None
+    asyncio.run(main())
+
+
+def test_window_keeps_whole_pairs_and_folds_the_rest():
+    async def main():
+        ctx = RollingContext(history=rounds(6))
+        pair = sum(map(message_tokens, rounds(1)))
+        budget = message_tokens({"content": "system"}) + pair * 2 + pair // 2
+        window = ctx.window("system", budget)
+        assert window[0] == {"role": "system", "content": "system"}
+        assert window[1:] == rounds(6)[-4:]   # two whole rounds; never half of one
+        assert sum(map(message_tokens, window)) <= budget
+
+        await ctx._task   # extractive summary: no summarizer configured
+        window = ctx.window("system", budget)
+        assert ctx.summary.startswith("reply 0 point") and "reply 5" not in ctx.summary
+        assert window[1]["content"].startswith("Summary of the earlier rounds:\n")
+        assert ctx.history[-2:] == rounds(6)[-2:] and len(ctx.history) < 12
+        await ctx.close()
+    asyncio.run(main())
+
+
+def test_window_clips_a_newest_message_that_alone_is_too_big():
+    async def main():
+        ctx = RollingContext(history=[{"role": "user", "content": "token " * 2000}])
+        window = ctx.window("system", 200)
+        assert window[1]["content"].endswith("[… truncated]")
+        assert sum(map(message_tokens, window)) <= 200 + 10
+    asyncio.run(main())
+
+
+def test_summarizer_output_replaces_folded_rounds():
+    async def main():
+        ctx = RollingContext(summarizer=("synthetic", "instant?length=8"), history=rounds(6))
+        pair = sum(map(message_tokens, rounds(1)))
+        ctx.window("system", pair * 2)
+        upto, summary = await ctx._task
+        assert summary and not summary.startswith("reply 0")   # written by the model, not extracted
+        assert upto % 2 == 0 and 0 < upto <= 10
+        ctx.window("system", pair * 2)
+        assert ctx.summary == summary and len(ctx.history) == 12 - upto
+    asyncio.run(main())
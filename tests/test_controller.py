@@ -0,0 +1,148 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+from contextlib import aclosing
+
+from batch import build_config, normalize
+import controller as controller_module
+import judge
+from controller import DebateController
+from framing import Boundary, Tagged, Transcript
+
+SPEC = {"topic": "Tabs or spaces?", "a": "synthetic:instant?length=20", "b": "synthetic:instant?length=20&seed=2",
+        "judge": "synthetic:instant?length=30", "rounds": 4, "format": "simultaneous"}
+
+
+def controller(**spec) -> DebateController:
+    return DebateController(build_config(normalize({**SPEC, **spec}, {})), uuid.uuid4().hex[:8])
+
+
+async def play(debate: DebateController) -> list[str]:
+    async with aclosing(debate.run()) as stream:
+        return [frame async for frame in stream]
+
+
+# ── Simultaneous format ─────────────────────────────────────────────────
+def test_simultaneous_rounds_play_in_pairs():
+    debate = controller()
+    frames = asyncio.run(play(debate))
+    headers = [f for f in frames if isinstance(f, Boundary) and "simultaneous" in f]
+    assert [re.search(r"Round (\d+)", h).group(1) for h in headers] == ["1", "2"]   # 4 turns = 2 pairs
+    assert {f.side for f in frames if isinstance(f, Tagged)} == {"A", "B"}
+    replies = [m for m in debate.context.history if m["role"] == "assistant"]
+    assert len(replies) == 4
+
+
+def test_simultaneous_transcript_reads_one_side_after_the_other():
+    transcript = Transcript()
+    for frame in asyncio.run(play(controller())):
+        transcript.add(frame)
+    text = transcript.text()
+    a, b = text.index("A Round 1"), text.index("B Round 1")
+    assert a < b and "«" not in text
+    assert text.index("A Round 2") > b   # B's round 1 block comes before A's round 2
+
+
+def test_both_sides_of_a_pair_see_the_same_history():
+    debate = controller()
+    asyncio.run(play(debate))
+    adapters = {side: adapter for adapter, side, _ in debate._speakers()}
+    a, b = debate._messages(adapters["A"], "A", 3), debate._messages(adapters["B"], "B", 3)
+    assert [m["content"] for m in a[1:-1]] == [m["content"] for m in b[1:-1]]
+
+
+def test_simultaneous_sides_overlap_in_time():
+    slow = "synthetic:instant?ttft=0.3&ttft_sd=0&length=5"
+    started = time.perf_counter()
+    asyncio.run(play(controller(a=slow, b=slow + "&seed=2", rounds=2)))
+    assert time.perf_counter() - started < 0.55   # one 0.3 s wait per pair, not one per side
+
+
+# ── Budgets ─────────────────────────────────────────────────────────────
+def test_max_tokens_caps_each_turn():
+    debate = controller(format="sequential", rounds=2, a="synthetic:instant?length=200",
+                        b="synthetic:instant?length=200&seed=2", max_tokens=20)
+    asyncio.run(play(debate))
+    replies = [m["content"] for m in debate.context.history if m["role"] == "assistant"]
+    assert len(replies) == 2 and all(len(r.split()) <= 25 for r in replies)
+
+
+def test_max_seconds_cuts_a_slow_turn():
+    slow = "synthetic:instant?tps=40&length=400"
+    started = time.perf_counter()
+    frames = asyncio.run(play(controller(format="sequential", rounds=2, a=slow, b=slow, max_seconds=0.2)))
+    assert time.perf_counter() - started < 1.5
+    assert sum("[turn cut at its time limit]" in f for f in frames) == 2
+
+
+def test_deadline_stops_the_rounds_and_still_judges():
+    slow = "synthetic:instant?tps=40&length=400"
+    debate = controller(format="sequential", rounds=6, a=slow, b=slow, deadline=0.3)
+    frames = asyncio.run(play(debate))
+    played = [int(n) for f in frames for n in re.findall(r"^\n[AB] Round (\d+) —", f)]
+    assert played and len(played) < 6
+    assert any("Debate deadline reached" in f for f in frames)
+    assert debate.judge_partial   # the judge rules on the rounds played
+
+
+# ── Incremental judging ─────────────────────────────────────────────────
+def test_incremental_judging_scores_rounds_while_the_debate_streams(monkeypatch):
+    scored, judged = [], {}
+
+    async def fake_score_round(r, replies, names, topic, *args):
+        scored.append(r)
+        return {"round": r, "scores": {side: 5.0 + r for side in replies}, "notes": f"round {r}"}
+
+    async def fake_judgment(a, b, transcript, topic, *args, round_notes=None, **kwargs):
+        judged["notes"] = round_notes
+        yield "Winner: Draw"
+
+    monkeypatch.setattr(controller_module, "score_round", fake_score_round)
+    monkeypatch.setattr(controller_module, "run_judgment", fake_judgment)
+    debate = controller(format="sequential", rounds=3, judging="incremental")
+    frames = asyncio.run(play(debate))
+
+    assert sorted(scored) == [1, 2, 3]
+    assert [n["round"] for n in judged["notes"]] == [1, 2, 3]   # the judge gets the scorecard
+    announced = [f for f in frames if "scored —" in f]
+    assert len(announced) == 3 and "A 6/10" in announced[0]
+    assert debate.unscored == {}
+
+
+def test_a_failed_round_score_is_recorded_as_unscored(monkeypatch):
+    async def failing_score_round(r, *args):
+        raise RuntimeError("judge down")
+
+    monkeypatch.setattr(controller_module, "score_round", failing_score_round)
+    debate = controller(format="sequential", rounds=2, judging="incremental")
+    asyncio.run(play(debate))
+    assert [(n["round"], n["scores"]) for n in debate.round_notes] == [(1, {}), (2, {})]
+    assert "not scored (RuntimeError)" in debate.round_notes[0]["notes"]
+
+
+# ── Verdict ─────────────────────────────────────────────────────────────
+class JSONJudge:
+    async def stream(self, messages, max_tokens=None):
+        yield json.dumps({"winner": "A", "scores": [{"criterion": "Logic", "a": 9, "b": 4, "note": "sharper"}],
+                          "summary": "A wins."})
+
+    async def close(self):
+        pass
+
+
+def test_structured_verdict_is_stored_from_the_json(monkeypatch):
+    monkeypatch.setattr(judge, "VERDICT_FORMAT", "json")
+    monkeypatch.setattr(judge, "get_adapter", lambda *args, schema=None, **kwargs: JSONJudge())
+    debate = controller(format="sequential", rounds=2)
+    frames = asyncio.run(play(debate))
+    assert any("| Logic | 9/10 | 4/10 | sharper |" in f for f in frames)   # shown rendered
+    assert {k: debate.verdict[k] for k in ("winner", "scores", "source")} == \
+        {"winner": "A", "scores": {"Logic": (9, 4)}, "source": "json"}
+
+
+def test_unstructured_reply_falls_back_to_parsing():
+    debate = controller(format="sequential", rounds=2)   # the synthetic judge writes no JSON
+    asyncio.run(play(debate))
+    assert debate.verdict["source"] == "table" and debate.judge_data is None
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+import ensemble
+from ensemble import combine, run_ensemble
+from framing import Status
+
+NAMES = ("ollama:llama3", "ollama:qwen")
+
+
+def verdict(winner: str, a: float = 7, b: float = 7) -> str:
+    return (f"**Winner:** {winner}\n\n| Criterion | {NAMES[0]} | {NAMES[1]} | Notes |\n|---|---|---|---|\n"
+            f"| Logic | {a}/10 | {b}/10 | |\n")
+
+
+def winner(text: str) -> str:
+    return next(line for line in text.splitlines() if line.startswith("**Winner:**"))[len("**Winner:** "):]
+
+
+def panel(*texts: str) -> list[tuple[str, float, str]]:
+    return [(f"judge{i}", 1.0, text) for i, text in enumerate(texts)]
+
+
+def test_plurality_counts_draw_votes():
+    # A majority over B alone would hand A the win; two of the three judges called a draw
+    assert winner(combine(panel(verdict("ollama:llama3"), verdict("Draw"), verdict("Draw")), NAMES)) == "Draw"
+    assert winner(combine(panel(verdict("Side B"), verdict("ollama:qwen"), verdict("Draw")), NAMES)) == NAMES[1]
+
+
+def test_tied_vote_is_broken_by_the_aggregated_scores():
+    texts = panel(verdict("ollama:llama3", 6, 9), verdict("ollama:qwen", 7, 8))
+    assert winner(combine(texts, NAMES)) == NAMES[1]
+    # The scores favour B, but B got no votes: A and draw tie, so it is a draw
+    texts = panel(verdict("ollama:llama3", 6, 9), verdict("Draw", 6, 9))
+    assert winner(combine(texts, NAMES)) == "Draw"
+    assert winner(combine(panel(verdict("ollama:llama3"), verdict("ollama:qwen")), NAMES)) == "Draw"
+
+
+def test_scores_are_aggregated_and_disagreement_flagged():
+    texts = panel(verdict("ollama:llama3", 9, 2), verdict("ollama:llama3", 5, 4), verdict("ollama:llama3", 8, 3))
+    out = combine(texts, NAMES)
+    assert "| Logic | 8.0/10 (5–9) | 3.0/10 (2–4) | 3 |" in out
+    assert "| Logic | 7.3/10" in combine(texts, NAMES, aggregate="mean")
+    assert "scores 3+ points apart on Logic" in out
+    assert "split on the winner" not in out
+    assert "#### judge2 (1.0s)" in out
+
+
+def test_unparsed_votes_and_missing_judges_are_reported():
+    out = combine(panel("no idea", verdict("ollama:llama3")), NAMES, missing=["groq:x (timed out after 300s)"])
+    assert "Votes: 1 for ollama:llama3, 1 unclear" in out
+    assert "Not counted: groq:x (timed out after 300s)" in out
+
+
+# ── Running the panel ───────────────────────────────────────────────────────
+async def collect(stream) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+def test_quorum_cancels_and_waits_for_the_stragglers(monkeypatch):
+    closed = []
+    real = ensemble._verdict
+
+    async def tracked(provider, model, *args):
+        try:
+            return await real(provider, model, *args)
+        finally:
+            closed.append(model)
+
+    monkeypatch.setattr(ensemble, "_verdict", tracked)
+    judges = [("synthetic", "instant?length=5"), ("synthetic", "instant?ttft=30&ttft_sd=0")]
+
+    async def main():
+        async for chunk in run_ensemble(judges, [{"role": "user", "content": "judge"}], NAMES, quorum=1):
+            if not isinstance(chunk, Status):
+                return chunk, list(closed)   # the combined verdict
+
+    out, closed_by_then = asyncio.run(main())
+    assert "Not counted: synthetic:instant?ttft=30&ttft_sd=0 (cancelled after quorum)" in out
+    assert sorted(closed_by_then) == sorted(model for _, model in judges)   # the straggler closed first
+
+
+def test_a_panel_with_no_verdicts_fails(monkeypatch):
+    monkeypatch.setattr(ensemble, "JUDGE_TIMEOUT", 0.05)
+    judges = [("synthetic", "instant?ttft=30&ttft_sd=0")]
+    with pytest.raises(RuntimeError, match="timed out"):
+        asyncio.run(collect(run_ensemble(judges, [{"role": "user", "content": "judge"}], NAMES)))
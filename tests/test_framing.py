@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+
+from framing import Boundary, Status, Tagged, bounded, coalesce, multiplex
+
+
+async def source(chunks, delays=None, error=None, closed=None):
+    """Yield `chunks`, sleeping delays[i] seconds before chunk i; then raise `error` if given."""
+    try:
+        for i, chunk in enumerate(chunks):
+            if delays and delays[i]:
+                await asyncio.sleep(delays[i])
+            yield chunk
+        if error:
+            raise error
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+async def frames(stream, **kwargs):
+    return [frame async for frame in coalesce(stream, **kwargs)]
+
+
+def test_small_chunks_become_one_frame():
+    out = asyncio.run(frames(source(["a", "b", "c"]), max_bytes=4096, max_delay=0.5))
+    assert out == ["abc"]
+
+
+def test_flushes_at_max_bytes():
+    out = asyncio.run(frames(source(["aa", "bb", "cc", "d"]), max_bytes=4, max_delay=10))
+    assert out == ["aabb", "ccd"]
+
+
+def test_max_bytes_counts_utf8_bytes():
+    out = asyncio.run(frames(source(["é", "é", "x"]), max_bytes=4, max_delay=10))
+    assert out == ["éé", "x"]
+
+
+def test_flushes_after_max_delay_when_the_source_stalls():
+    async def run():
+        received = []
+        async for frame in coalesce(source(["a", "b", "c"], delays=[0, 0, 0.3]), max_bytes=4096, max_delay=0.05):
+            received.append((frame, asyncio.get_running_loop().time()))
+        return received
+
+    out = asyncio.run(run())
+    assert [f for f, _ in out] == ["ab", "c"]
+    assert out[1][1] - out[0][1] > 0.15   # "ab" went out before "c" was produced
+
+
+def test_boundary_flushes_pending_text_and_passes_through():
+    out = asyncio.run(frames(source(["a", Boundary("ROUND 2"), "b", Status("queued")]), max_delay=10))
+    assert out == ["a", "ROUND 2", "b", "queued"]
+    assert isinstance(out[1], Boundary) and isinstance(out[3], Status)
+    assert not isinstance(out[0], (Boundary, Status))
+
+
+def test_tagged_text_is_batched_per_side():
+    chunks = [Tagged("a1", "A"), Tagged("b1", "B"), Tagged("a2", "A"), "x"]
+    out = asyncio.run(frames(source(chunks), max_delay=10))
+    tagged = {f.side: str(f) for f in out if isinstance(f, Tagged)}
+    assert tagged == {"A": "a1a2", "B": "b1"}
+    assert out[-1] == "x" and not isinstance(out[-1], Tagged)
+
+
+def test_error_is_raised_after_pending_text_is_flushed():
+    async def run():
+        received = []
+        with pytest.raises(RuntimeError, match="boom"):
+            async for frame in coalesce(source(["a", "b"], error=RuntimeError("boom")), max_delay=10):
+                received.append(frame)
+        return received
+
+    assert asyncio.run(run()) == ["ab"]
+
+
+def test_closing_the_consumer_closes_the_source():
+    async def run():
+        closed = []
+        endless = source(["x"] * 100_000, delays=[0.001] * 100_000, closed=closed)
+        stream = coalesce(endless, max_bytes=1, max_delay=10)
+        assert await anext(stream) == "x"
+        await stream.aclose()
+        await asyncio.sleep(0)
+        return closed
+
+    assert asyncio.run(run()) == [True]
+
+
+def test_cancelling_the_consumer_closes_the_source():
+    async def run():
+        closed = []
+
+        async def consume():
+            async for _ in coalesce(source(["x"] * 1000, delays=[0.01] * 1000, closed=closed), max_delay=0.02):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return closed
+
+    assert asyncio.run(run()) == [True]
+
+
+def test_zero_delay_passes_chunks_through():
+    out = asyncio.run(frames(source(["a", "b"]), max_delay=0))
+    assert out == ["a", "b"]
+
+
+# ── multiplex / bounded ─────────────────────────────────────────────────
+async def drain(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_multiplex_tags_text_and_passes_status_through():
+    out = asyncio.run(drain(multiplex({"A": source(["a1", Status("wait"), "a2"], [0, 0, 0.1]),
+                                       "B": source(["b1", "b2"], [0.01, 0.01])})))
+    assert [(str(c), getattr(c, "side", None)) for c in out] == [
+        ("a1", "A"), ("wait", None), ("b1", "B"), ("b2", "B"), ("a2", "A")]
+    assert not isinstance(out[1], Tagged)
+
+
+def test_multiplex_error_cancels_the_other_streams():
+    closed = []
+
+    async def main():
+        streams = {"A": source(["a"], error=RuntimeError("boom")),
+                   "B": source(["b1", "b2"], [0, 5], closed=closed)}
+        with pytest.raises(RuntimeError, match="boom"):
+            await drain(multiplex(streams))
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert closed == [True]
+
+
+def test_bounded_without_limits_passes_everything():
+    assert asyncio.run(drain(bounded(source(["a ", "b "])))) == ["a ", "b "]
+
+
+def test_bounded_cuts_at_the_token_limit_and_closes_the_source():
+    closed = []
+    out = asyncio.run(drain(bounded(source(["one ", Status("s"), "two ", "three ", "four "], closed=closed), 2)))
+    assert out[:-1] == ["one ", "s", "two "]   # Status is not counted
+    assert isinstance(out[-1], Status) and "2-token limit" in out[-1]
+    assert closed == [True]
+
+
+def test_bounded_cuts_a_stalled_stream_at_the_time_limit():
+    closed = []
+
+    async def main():
+        until = asyncio.get_running_loop().time() + 0.05
+        return await drain(bounded(source(["fast ", "stalled "], [0, 5], closed=closed), until=until))
+
+    out = asyncio.run(main())
+    assert out[0] == "fast " and "time limit" in out[-1] and len(out) == 2
+    assert closed == [True]
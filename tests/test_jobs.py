@@ -0,0 +1,18 @@
+import uuid
+
+from logger import claim_job, enqueue_jobs, finish_job, job_counts
+
+
+def test_claim_skips_jobs_out_of_attempts():
+    queue = uuid.uuid4().hex[:8]
+    enqueue_jobs([{"topic": "one"}, {"topic": "two"}, {"topic": "three"}], queue)
+    for _ in range(2):   # the first two jobs each use up their one attempt without finishing
+        job = claim_job(queue, "w", lease=-1, max_attempts=1)
+        assert job["attempts"] == 1
+
+    job = claim_job(queue, "w", lease=60, max_attempts=1)
+    assert job["spec"] == {"topic": "three"}
+    assert job_counts(queue) == {"failed": 2, "running": 1}
+
+    finish_job(job["id"], "w", "done")
+    assert claim_job(queue, "w", lease=60, max_attempts=1) is None
@@ -0,0 +1,33 @@
+import asyncio
+
+from judge import parse_round_score, score_round, scorecard
+
+
+def test_parse_round_score_reads_each_side_and_the_notes():
+    text = "**A:** 7\nSide B = 8.5/10\nNotes: A was clearer,\nB had better evidence."
+    assert parse_round_score(text) == {"scores": {"A": 7.0, "B": 8.5},
+                                       "notes": "A was clearer, B had better evidence."}
+
+
+def test_parse_round_score_clamps_and_tolerates_missing_parts():
+    assert parse_round_score("a: 12\nno notes here")["scores"] == {"A": 10.0}
+    assert parse_round_score("I refuse to score this.") == {"scores": {}, "notes": "I refuse to score this."}
+
+
+def test_scorecard_lists_rounds_and_averages():
+    names = {"A": "ollama:llama3", "B": "ollama:qwen"}
+    notes = [{"round": 1, "scores": {"A": 6.0}, "notes": "opening"},
+             {"round": 2, "scores": {"B": 7.0}, "notes": "reply"},
+             {"round": 3, "scores": {"A": 8.0}, "notes": "rebuttal"}]
+    assert scorecard(notes, names).splitlines() == [
+        "Round 1: ollama:llama3 6/10 — opening",
+        "Round 2: ollama:qwen 7/10 — reply",
+        "Round 3: ollama:llama3 8/10 — rebuttal",
+        "Averages: ollama:llama3 7.0/10 over 2 rounds, ollama:qwen 7.0/10 over 1 rounds",
+    ]
+    assert scorecard([], names) == "Averages: ollama:llama3 unscored, ollama:qwen unscored"
+
+
+def test_score_round_returns_the_round_and_whatever_it_parsed():
+    note = asyncio.run(score_round(3, {"A": "reply"}, {"A": "x"}, "topic", "synthetic", "instant?length=10"))
+    assert note["round"] == 3 and note["scores"] == {} and note["notes"]
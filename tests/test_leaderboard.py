@@ -0,0 +1,43 @@
+import uuid
+
+from logger import leaderboard, log_debate
+
+
+def model() -> str:
+    return f"ollama:m-{uuid.uuid4().hex[:8]}"
+
+
+def verdict(a: str, b: str, winner: str, scores: dict) -> dict:
+    return {"model_a": a, "model_b": b, "judge": "ollama:judge", "winner": winner, "scores": scores,
+            "source": "json"}
+
+
+def row(rows: list[dict], name: str) -> dict:
+    return next(r for r in rows if r["model"] == name)
+
+
+def test_wins_losses_and_average_scores():
+    a, b, topic = model(), model(), uuid.uuid4().hex
+    log_debate(uuid.uuid4().hex[:8], topic, "t", verdict(a, b, "A", {"Logic": (8, 6), "Clarity": (6, 4)}))
+    log_debate(uuid.uuid4().hex[:8], topic, "t", verdict(b, a, "draw", {"Logic": (5, 5)}))
+    for rows in (leaderboard(1000), leaderboard(1000, topic=topic)):
+        assert {k: row(rows, a)[k] for k in ("debates", "wins", "losses", "draws", "win_rate", "avg_score")} == \
+            {"debates": 2, "wins": 1, "losses": 0, "draws": 1, "win_rate": 0.75, "avg_score": 6.0}
+        assert row(rows, b)["losses"] == 1 and row(rows, b)["avg_score"] == 5.0
+    assert row(leaderboard(1000, criterion="Logic"), a)["avg_score"] == 6.5
+
+
+def test_self_play_counts_once_as_a_draw():
+    a, topic = model(), uuid.uuid4().hex
+    log_debate(uuid.uuid4().hex[:8], topic, "t", verdict(a, a, "A", {"Logic": (8, 6)}))
+    for rows in (leaderboard(1000), leaderboard(1000, topic=topic)):
+        assert {k: row(rows, a)[k] for k in ("debates", "wins", "losses", "draws", "avg_score")} == \
+            {"debates": 1, "wins": 0, "losses": 0, "draws": 1, "avg_score": 7.0}
+    for rows in (leaderboard(1000, criterion="Logic"), leaderboard(1000, topic=topic, criterion="Logic")):
+        assert row(rows, a)["debates"] == 1 and row(rows, a)["avg_score"] == 7.0
+
+
+def test_unreadable_verdicts_are_not_counted():
+    a, b = model(), model()
+    log_debate(uuid.uuid4().hex[:8], "topic", "t", verdict(a, b, None, {}))
+    assert a not in [r["model"] for r in leaderboard(1000)]
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+import metrics
+from framing import Status
+from metrics import Counter, Gauge, Histogram, _Metric, metered
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty registry for the metrics a test defines."""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def test_counter_renders_with_escaped_labels(registry):
+    c = Counter("things_total", "Things", ("model",))
+    c.inc('llama "3"\n')
+    c.inc('llama "3"\n', amount=2)
+    assert c.render() == ('# HELP things_total Things\n# TYPE things_total counter\n'
+                          'things_total{model="llama \\"3\\"\\n"} 3')
+    assert registry == [c]
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    h = Histogram("lat_seconds", "Latency", ("p",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 7):
+        h.observe(value, "x")
+    assert h.render().splitlines()[2:] == [
+        'lat_seconds_bucket{p="x",le="0.1"} 2',
+        'lat_seconds_bucket{p="x",le="1"} 3',
+        'lat_seconds_bucket{p="x",le="+Inf"} 4',
+        'lat_seconds_sum{p="x"} 7.65',
+        'lat_seconds_count{p="x"} 4',
+    ]
+
+
+def test_gauges(registry):
+    g = Gauge("depth", "Depth")
+    g.set(3)
+    g.dec()
+    assert g.render().endswith("\ndepth 2")
+    assert Gauge("live", "Live", func=lambda: 7).render().endswith("\nlive 7")
+    assert metrics.render().endswith("live 7\n")
+
+
+def test_metric_without_samples_cannot_be_built():
+    with pytest.raises(TypeError):
+        _Metric("x", "x")
+
+
+def test_metered_stream(registry, monkeypatch):
+    for name in ("TTFT", "INTER_TOKEN", "TOKENS_PER_SECOND", "TOKENS", "REQUESTS", "ERRORS"):
+        old = getattr(metrics, name)
+        monkeypatch.setattr(metrics, name, type(old)(old.name, old.help, old.label_names))
+
+    async def source(fail: bool):
+        yield Status("queued")
+        for token in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield token
+        if fail:
+            raise ConnectionError("reset")
+
+    async def run(fail=False):
+        return [t async for t in metered(source(fail), "p", "m")]
+
+    assert asyncio.run(run()) == ["queued", "a", "b", "c"]
+    with pytest.raises(ConnectionError):
+        asyncio.run(run(fail=True))
+    labels = ("p", "m")
+    assert metrics.REQUESTS.values[labels] == 2
+    assert metrics.TOKENS.values[labels] == 6                 # the Status line is not a token
+    assert metrics.ERRORS.values[labels + ("ConnectionError",)] == 1
+    assert sum(metrics.TTFT.series[labels][:-1]) == 2
+    assert sum(metrics.INTER_TOKEN.series[labels][:-1]) == 4
+    assert 0 < metrics.TOKENS_PER_SECOND.series[labels][-1] / 2 < 200
+
+
+def test_loop_lag_is_sampled(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "LOOP_LAG", Histogram("lag", "Lag"))
+    monkeypatch.setattr(metrics, "LOOP_LAG_LAST", Gauge("lag_last", "Lag"))
+
+    async def run():
+        task = asyncio.create_task(metrics.sample_loop_lag(0.01))
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)                                      # block the loop
+        await asyncio.sleep(0.03)
+        task.cancel()
+
+    asyncio.run(run())
+    assert metrics.LOOP_LAG_LAST.values[()] >= 0 and metrics.LOOP_LAG.series[()][-1] >= 0.08
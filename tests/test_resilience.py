@@ -0,0 +1,148 @@
+import asyncio
+
+import httpx
+import pytest
+
+import adapters
+from adapters import RESUME_PROMPT, BaseAdapter, ResilientAdapter, classify_error, retry_after_seconds
+from errors import AdapterError, RateLimited, RetryableError
+from framing import Status
+from streamparse import StreamError
+
+MESSAGES = [{"role": "user", "content": "Tabs or spaces?"}]
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Each call plays the next script: its tokens, then its error (if any)."""
+
+    def __init__(self, *scripts, name="scripted"):
+        super().__init__(name)
+        self.scripts = list(scripts)
+        self.requests = []
+
+    async def stream(self, messages, max_tokens=None):
+        self.requests.append((messages, max_tokens))
+        tokens, error = self.scripts.pop(0)
+        for token in tokens:
+            yield token
+        if error:
+            raise error
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(adapters, "RETRY_BASE_DELAY", 0)
+
+
+def run(adapter, max_tokens=None) -> tuple[list, list]:
+    """(text tokens, status lines) of one stream."""
+    async def go():
+        return [t async for t in adapter.stream(MESSAGES, max_tokens)]
+    out = asyncio.run(go())
+    return [t for t in out if not isinstance(t, Status)], [str(t) for t in out if isinstance(t, Status)]
+
+
+def blip():
+    return RetryableError("scripted", "connection reset")
+
+
+def test_failure_before_the_first_token_is_retried():
+    inner = ScriptedAdapter(([], blip()), ([Status("queued")], blip()), (["ok"], None))
+    tokens, statuses = run(ResilientAdapter(inner))
+    assert tokens == ["ok"]
+    assert [s for s in statuses if "retry" in s] == [
+        "\n↻ scripted: connection reset — retry 1/3 in 0.0s\n", "\n↻ scripted: connection reset — retry 2/3 in 0.0s\n"]
+    assert len(inner.requests) == 3 and all(r[0] == MESSAGES for r in inner.requests)
+
+
+def test_retries_run_out():
+    inner = ScriptedAdapter(*[([], blip())] * (adapters.RETRY_ATTEMPTS + 1))
+    with pytest.raises(RetryableError):
+        run(ResilientAdapter(inner, resume="none"))
+    assert len(inner.requests) == adapters.RETRY_ATTEMPTS + 1
+
+
+def test_bad_request_and_rate_limits_are_not_retried():
+    for error in (AdapterError("scripted", "HTTP 400"), RateLimited("scripted", 1.0)):
+        inner = ScriptedAdapter(([], error))
+        with pytest.raises(type(error)):
+            run(ResilientAdapter(inner))
+        assert len(inner.requests) == 1
+
+
+def test_broken_stream_is_resumed_by_the_same_model():
+    inner = ScriptedAdapter((["Tabs ", "are "], blip()), (["better."], None))
+    tokens, statuses = run(ResilientAdapter(inner, resume="same"))
+    assert tokens == ["Tabs ", "are ", "better."]
+    assert "resuming via custom:scripted" in statuses[-1]
+    resumed, _ = inner.requests[1]
+    assert resumed == MESSAGES + [{"role": "assistant", "content": "Tabs are "},
+                                  {"role": "user", "content": RESUME_PROMPT}]
+
+
+def test_resume_only_gets_the_tokens_left_over():
+    inner = ScriptedAdapter((["word " * 30], blip()), (["end"], None))
+    run(ResilientAdapter(inner), max_tokens=100)
+    assert inner.requests[0][1] == 100
+    assert 60 < inner.requests[1][1] < 100
+
+
+def test_resume_none_gives_up_mid_stream():
+    inner = ScriptedAdapter((["Tabs "], blip()))
+    with pytest.raises(RetryableError):
+        run(ResilientAdapter(inner, resume="none"))
+
+
+def test_same_model_does_not_resume_a_bad_request():
+    inner = ScriptedAdapter((["Tabs "], AdapterError("scripted", "HTTP 400")))
+    with pytest.raises(AdapterError):
+        run(ResilientAdapter(inner, resume="same"))
+
+
+def test_fallback_takes_over():
+    inner = ScriptedAdapter((["Tabs "], AdapterError("scripted", "HTTP 400")))
+    backup = ScriptedAdapter((["win."], None), name="backup")
+    tokens, statuses = run(ResilientAdapter(inner, resume="fallback", fallback=backup))
+    assert tokens == ["Tabs ", "win."]
+    assert backup.requests[0][0][-2] == {"role": "assistant", "content": "Tabs "}
+
+
+def test_fallback_before_any_output_gets_the_original_request():
+    inner = ScriptedAdapter(([], AdapterError("scripted", "HTTP 401")))
+    backup = ScriptedAdapter((["hello"], None), name="backup")
+    tokens, _ = run(ResilientAdapter(inner, resume="fallback", fallback=backup))
+    assert tokens == ["hello"] and backup.requests[0][0] == MESSAGES
+
+
+def test_resumes_run_out():
+    scripts = [(["x "], blip()) for _ in range(adapters.MAX_RESUMES + 1)]
+    inner = ScriptedAdapter(*scripts)
+    with pytest.raises(RetryableError):
+        run(ResilientAdapter(inner))
+    assert len(inner.requests) == adapters.MAX_RESUMES + 1
+
+
+# ── Error classification ───────────────────────────────────────────────────
+def http_error(status: int, headers: dict | None = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://provider/v1")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def test_classify_error():
+    assert isinstance(classify_error("m", http_error(503)), RetryableError)
+    assert isinstance(classify_error("m", http_error(529)), RetryableError)
+    assert type(classify_error("m", http_error(400))) is AdapterError
+    assert type(classify_error("m", httpx.ReadTimeout("slow"))) is RetryableError
+    assert type(classify_error("m", StreamError("overloaded_error", "busy"))) is RetryableError
+    assert type(classify_error("m", StreamError("invalid_request_error", "bad"))) is AdapterError
+    assert classify_error("m", StreamError("rate_limit_error", "slow")).retry_after == 5.0
+    limited = classify_error("m", http_error(429, {"retry-after": "7"}))
+    assert isinstance(limited, RateLimited) and limited.retry_after == 7.0
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(http_error(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(http_error(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after_seconds(http_error(429)) == 5.0
+    assert retry_after_seconds(http_error(500, {"retry-after": "3"})) is None
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from adapters import BaseAdapter, ScheduledAdapter
+from framing import Status, Usage
+from scheduler import Limiter, Scheduler, estimate_tokens
+import adapters
+
+
+def run_released(estimated, input_tokens, output_tokens, tpm=60_000):
+    async def run():
+        limiter = Limiter("k", tpm=tpm)
+        async for _ in limiter.wait("s", estimated):
+            pass
+        after_admission = limiter.tpm.level
+        limiter.release(estimated, input_tokens, output_tokens)
+        return after_admission, limiter.tpm.level
+
+    return asyncio.run(run())
+
+
+def test_admission_takes_the_input_estimate():
+    admitted, _ = run_released(1000, None, 0)
+    assert admitted == pytest.approx(59_000, abs=5)
+
+
+def test_release_charges_every_output_token():
+    admitted, released = run_released(1000, None, 300)
+    assert admitted - released == pytest.approx(300, abs=5)
+
+
+def test_release_refunds_an_overestimated_input():
+    admitted, released = run_released(1000, 400, 300)
+    assert released - admitted == pytest.approx(600 - 300, abs=5)
+
+
+def test_release_charges_an_underestimated_input():
+    admitted, released = run_released(1000, 1500, 0)
+    assert admitted - released == pytest.approx(500, abs=5)
+
+
+def test_refund_never_overfills_the_bucket():
+    _, released = run_released(1000, 0, 0, tpm=60_000)
+    assert released <= 60_000
+
+
+class FakeAdapter(BaseAdapter):
+    provider = "fake"
+
+    def __init__(self, tokens, usage=None):
+        super().__init__("fake-model")
+        self.tokens, self.usage = tokens, usage
+
+    async def stream(self, messages, max_tokens=None):
+        for token in self.tokens:
+            yield token
+        if self.usage is not None:
+            yield self.usage
+
+
+def stream_through_scheduler(inner, monkeypatch):
+    scheduler = Scheduler({"fake:fake-model": {"tpm": 60_000}})
+    monkeypatch.setattr(adapters, "SCHEDULER", scheduler)
+    messages = [{"role": "user", "content": "hello there " * 50}]
+
+    async def run():
+        out = [t async for t in ScheduledAdapter(inner).stream(messages)]
+        return out, scheduler.limiters["fake:fake-model"].tpm.level
+
+    out, level = asyncio.run(run())
+    return out, level, estimate_tokens(messages[0]["content"])
+
+
+def test_scheduled_adapter_charges_provider_usage_and_hides_it(monkeypatch):
+    out, level, _ = stream_through_scheduler(FakeAdapter(["a", "b"], Usage(100, 250)), monkeypatch)
+    assert out == ["a", "b"]
+    assert not any(isinstance(t, Usage) for t in out)
+    assert 60_000 - level == pytest.approx(100 + 250, abs=5)
+
+
+def test_scheduled_adapter_estimates_output_without_usage(monkeypatch):
+    tokens = ["word "] * 200 + [Status("queued")]
+    out, level, estimate = stream_through_scheduler(FakeAdapter(tokens), monkeypatch)
+    assert 60_000 - level == pytest.approx(estimate + 200, abs=5)
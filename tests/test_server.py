@@ -0,0 +1,52 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from logger import create_checkpoint, load_checkpoint
+
+DEBATE = ("/ws/debate?topic=Tabs&rounds=2&provider_a=synthetic&model_a=instant%3Flength%3D5"
+          "&provider_b=synthetic&model_b=instant%3Flength%3D5"
+          "&judge_provider=synthetic&judge_model=instant%3Flength%3D5")
+
+
+def closed_with(client, url) -> int:
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(url) as ws:
+            ws.receive_text()
+    return closed.value.code
+
+
+def test_a_debate_that_is_still_streaming_cannot_be_resumed_twice():
+    session = uuid.uuid4().hex[:8]
+    create_checkpoint(session, "Tabs", {"topic": "Tabs"})
+    with TestClient(main.app) as client:
+        main.LIVE_SESSIONS.add(session)
+        try:
+            assert session not in [d["session"] for d in client.get("/api/debates/resumable").json()["debates"]]
+            assert closed_with(client, f"/ws/debate?resume_from={session}") == 4009
+        finally:
+            main.LIVE_SESSIONS.discard(session)
+        assert session in [d["session"] for d in client.get("/api/debates/resumable").json()["debates"]]
+
+
+def test_finished_debate_releases_its_session():
+    with TestClient(main.app) as client:
+        with client.websocket_connect(DEBATE) as ws:
+            session = ws.receive_text().split()[1]
+            assert session in main.LIVE_SESSIONS
+            with pytest.raises(WebSocketDisconnect):   # the server closes once the debate is saved
+                while True:
+                    ws.receive_text()
+        assert load_checkpoint(session)["status"] == "done"
+        assert closed_with(client, f"/ws/debate?resume_from={session}") == 4004
+    assert main.LIVE_SESSIONS == set()
+
+
+def test_unknown_session_and_missing_topic():
+    with TestClient(main.app) as client:
+        assert closed_with(client, "/ws/debate?resume_from=nosuch") == 4004
+        assert closed_with(client, "/ws/debate") == 4000
+    assert main.LIVE_SESSIONS == set()
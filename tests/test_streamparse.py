@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from streamparse import StreamError, anthropic_text, iter_lines, iter_sse, ndjson_text, openai_sse_text
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def parse(parser, data: bytes, size: int = 7, **kwargs) -> list:
+    async def run():
+        return [token async for token in parser(chunked(data, size), **kwargs)]
+    return asyncio.run(run())
+
+
+def every_split(parser, data: bytes) -> list:
+    """The parser's output, checked to be the same whatever size the network chunks are."""
+    outputs = [parse(parser, data, size) for size in range(1, len(data) + 1)]
+    assert all(out == outputs[0] for out in outputs)
+    return outputs[0]
+
+
+# ── Framing ────────────────────────────────────────────────────────────────
+def test_lines_split_anywhere():
+    assert every_split(iter_lines, b"one\ntwo\r\nthree\n\nlast") == [b"one", b"two", b"three", b"", b"last"]
+
+
+def test_crlf_split_between_chunks():
+    async def run():
+        async def chunks():
+            yield b"a\r"
+            yield b"\nb\r"
+            yield b"\n"
+        return [line async for line in iter_lines(chunks())]
+    assert asyncio.run(run()) == [b"a", b"b"]
+
+
+def test_sse_events_split_anywhere():
+    data = (b": keep-alive\r\n\r\n"
+            b"event: first\r\ndata: a\r\ndata:b\r\n\r\n"
+            b"id: 7\nretry: 100\ndata: {\"x\": 1}\n\n"
+            b"data: unterminated")
+    assert every_split(iter_sse, data) == [(b"first", b"a\nb"), (b"", b'{"x": 1}'), (b"", b"unterminated")]
+
+
+# ── Wire formats ───────────────────────────────────────────────────────────
+ANTHROPIC = (
+    b'event: message_start\ndata: {"type":"message_start","message":{"usage":'
+    b'{"input_tokens":12,"cache_creation_input_tokens":30,"cache_read_input_tokens":500,"output_tokens":1}}}\n\n'
+    b'event: content_block_delta\ndata: {"type":"content_block_delta","delta":{"type":"text_delta","text":"Hel"}}\n\n'
+    b'event: content_block_delta\ndata: {"type":"content_block_delta","delta":{"type":"text_delta","text":"lo"}}\n\n'
+    b'event: message_delta\ndata: {"type":"message_delta","usage":{"output_tokens":2}}\n\n'
+    b'event: message_stop\ndata: {"type":"message_stop"}\n\n'
+)
+
+
+def test_anthropic_usage():
+    usage = {}
+    assert parse(anthropic_text, ANTHROPIC, usage=usage) == ["Hel", "lo"]
+    assert usage == {"input": 42, "output": 2}   # cache reads don't count against input limits
+
+
+def test_openai_usage_chunk():
+    data = (b'data: {"choices":[{"delta":{"content":"Hi"}}]}\n\n'
+            b'data: {"choices":[],"usage":{"prompt_tokens":9,"completion_tokens":1}}\n\n'
+            b'data: [DONE]\n\n')
+    usage = {}
+    assert parse(openai_sse_text, data, usage=usage) == ["Hi"]
+    assert usage == {"input": 9, "output": 1}
+
+
+def test_ndjson_usage():
+    data = (b'{"message":{"content":"Hi"},"done":false}\n'
+            b'{"message":{"content":""},"done":true,"prompt_eval_count":20,"eval_count":5}\n')
+    usage = {}
+    assert parse(ndjson_text, data, usage=usage) == ["Hi"]
+    assert usage == {"input": 20, "output": 5}
+
+
+def test_usage_is_optional():
+    assert parse(anthropic_text, ANTHROPIC) == ["Hel", "lo"]
+
+
+def test_anthropic_text_split_anywhere_with_crlf_and_multibyte():
+    data = ANTHROPIC.replace(b"Hel", "Hé€".encode()).replace(b"\n", b"\r\n")
+    assert every_split(anthropic_text, data) == ["Hé€", "lo"]
+
+
+def test_anthropic_skips_non_text_deltas_and_stops_at_message_stop():
+    data = (b'event: content_block_delta\ndata: {"delta":{"type":"input_json_delta","partial_json":"{"}}\n\n'
+            b'event: ping\ndata: {"type":"ping"}\n\n'
+            b'event: content_block_delta\ndata: {"delta":{"type":"text_delta","text":"ok"}}\n\n'
+            b'event: message_stop\ndata: {"type":"message_stop"}\n\n'
+            b'event: content_block_delta\ndata: {"delta":{"type":"text_delta","text":"late"}}\n\n')
+    assert every_split(anthropic_text, data) == ["ok"]
+
+
+def test_anthropic_without_event_lines():
+    data = (b'data: {"type":"content_block_delta","delta":{"type":"text_delta","text":"a"}}\n\n'
+            b'data: {"type":"message_stop"}\n\n')
+    assert parse(anthropic_text, data) == ["a"]
+
+
+def test_anthropic_error_event():
+    data = (b'event: content_block_delta\ndata: {"delta":{"type":"text_delta","text":"a"}}\n\n'
+            b'event: error\ndata: {"type":"error","error":{"type":"overloaded_error","message":"busy"}}\n\n')
+    with pytest.raises(StreamError) as err:
+        parse(anthropic_text, data, size=5)
+    assert err.value.kind == "overloaded_error"
+
+
+def test_openai_sse_split_anywhere():
+    data = (b'data: {"choices":[{"delta":{"role":"assistant"}}]}\r\n\r\n'
+            b'data: {"choices":[{"delta":{"content":"x\\ny"}}]}\r\n\r\n'
+            b'data: {"choices":[{"delta":{"content":"\xc3\xa9"}}]}\r\n\r\n'
+            b'data: [DONE]\r\n\r\n'
+            b'data: {"choices":[{"delta":{"content":"late"}}]}\r\n\r\n')
+    assert every_split(openai_sse_text, data) == ["x\ny", "é"]
+
+
+def test_openai_error_inside_200_stream():
+    data = b'data: {"error":{"type":"rate_limit","message":"slow down"}}\n\n'
+    with pytest.raises(StreamError, match="slow down"):
+        parse(openai_sse_text, data)
+
+
+def test_ndjson_split_anywhere():
+    data = (b'{"message":{"content":"a"},"done":false}\r\n'
+            b'\r\n'
+            b'not json\n'
+            b'{"message":{"content":"\xe2\x82\xac"},"done":false}\n'
+            b'{"message":{"content":""},"done":true}\n'
+            b'{"message":{"content":"late"},"done":false}\n')
+    assert every_split(ndjson_text, data) == ["a", "€"]
+
+
+def test_ndjson_final_line_without_newline():
+    assert parse(ndjson_text, b'{"message":{"content":"a"}}\n{"message":{"content":"b"},"done":true}') == ["a", "b"]
+
+
+def test_ndjson_error():
+    with pytest.raises(StreamError, match="model not found"):
+        parse(ndjson_text, b'{"error":"model not found"}\n')
+
+
+def test_json_lines_that_are_not_objects_are_skipped():
+    data = b'"error"\n42\n["error"]\nnull\n{"message":{"content":"a"},"done":true}\n'
+    assert every_split(ndjson_text, data) == ["a"]
+    data = b'data: ["content"]\n\ndata: "content"\n\ndata: {"choices":[{"delta":{"content":"b"}}]}\n\n'
+    assert parse(openai_sse_text, data) == ["b"]
@@ -0,0 +1,13 @@
+import pytest
+
+from tournament import parse_limits
+
+
+def test_parse_limits():
+    assert parse_limits(["ollama=1", "groq=2"]) == {"ollama": 1, "groq": 2}
+
+
+@pytest.mark.parametrize("item", ["ollama=0", "ollama=-1", "ollama=", "ollama", "ollama=two"])
+def test_parse_limits_rejects_limits_that_would_never_admit_a_match(item):
+    with pytest.raises(ValueError, match="N >= 1"):
+        parse_limits([item])
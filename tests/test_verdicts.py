@@ -0,0 +1,112 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import ensemble
+import judge
+import verdicts
+from framing import Status
+from judge import TABLE_FORMAT, run_judgment
+from verdicts import VERDICT_SCHEMA, Verdict, extract_verdict, parse_verdict, render_verdict
+
+REPLY = {"winner": "B", "summary": "qwen3 backed every claim.",
+         "scores": [{"criterion": "Logic & Reasoning", "a": 8, "b": 6, "note": "A was tighter"},
+                    {"criterion": "Use of Evidence", "a": 5, "b": 9.5, "note": ""}]}
+
+
+def filled_in(a: str, b: str) -> str:
+    """The table format as a judge would fill it in."""
+    template = TABLE_FORMAT.format(a_name=a, b_name=b).split("### FINAL VERDICT", 1)[1]
+    scores = iter(["8/10", "6/10", "7/10", "**7.5**", "9/10", "5/10", "6/10", "6/10"])
+    lines = [line.replace("[Name, or Draw]", b) for line in template.splitlines()]
+    return "### FINAL VERDICT" + "\n".join(
+        "|".join(next(scores) if cell.strip() == "?/10" else cell for cell in line.split("|")) for line in lines)
+
+
+def test_judge_table_format_parses():
+    verdict = parse_verdict(filled_in("llama3", "qwen3"), "llama3", "qwen3")
+    assert verdict["winner"] == "B"
+    assert verdict["scores"] == {"Logic & Reasoning": (8, 6), "Clarity & Structure": (7, 7.5),
+                                 "Persuasiveness": (9, 5), "Use of Evidence": (6, 6)}
+    assert extract_verdict(filled_in("llama3", "qwen3"), "llama3", "qwen3")["source"] == "table"
+
+
+def test_json_reply_is_rendered_and_read_from_the_json():
+    verdict = render_verdict("```json\n" + json.dumps(REPLY) + "\n```", "llama3", "qwen3")
+    assert verdict.data == {"winner": "B", "scores": {"Logic & Reasoning": (8, 6), "Use of Evidence": (5, 9.5)}}
+    assert "**Winner:** qwen3" in verdict and "| Logic & Reasoning | 8/10 | 6/10 | A was tighter |" in verdict
+    assert verdict.endswith("qwen3 backed every claim.\n")
+    assert parse_verdict(verdict, "llama3", "qwen3") == verdict.data   # the markdown says the same
+    assert extract_verdict(verdict, "llama3", "qwen3", verdict.data) == {**verdict.data, "source": "json"}
+
+
+def test_a_reply_that_fails_validation_is_kept_and_parsed():
+    for reply in ("Winner: llama3, no JSON today", json.dumps({**REPLY, "winner": "C"}), '{"winner": "A"'):
+        verdict = render_verdict(reply, "llama3", "qwen3")
+        assert verdict == reply and verdict.data is None
+    assert extract_verdict("Winner: llama3", "llama3", "qwen3", None)["winner"] == "A"
+
+
+class JSONJudge:
+    """Stands in for a judge adapter: records how it was built and streams a canned reply."""
+    built = []
+
+    def __init__(self, reply: str):
+        self.reply = reply
+
+    def __call__(self, provider, model, resume=None, fallback=None, schema=None):
+        self.built.append(schema)
+        return self
+
+    async def stream(self, messages, max_tokens=None):
+        self.messages = messages
+        yield Status("queued")
+        for i in range(0, len(self.reply), 7):
+            yield self.reply[i:i + 7]
+
+    async def close(self):
+        pass
+
+
+def judge_tokens(monkeypatch, reply: str, **kwargs) -> list[str]:
+    fake = JSONJudge(reply)
+    JSONJudge.built = []
+    monkeypatch.setattr(judge, "get_adapter", fake)
+    sides = SimpleNamespace(name="llama3"), SimpleNamespace(name="qwen3")
+
+    async def main():
+        return [tok async for tok in run_judgment(*sides, "transcript", "topic", "ollama", "judge", **kwargs)]
+    tokens = asyncio.run(main())
+    return tokens, fake
+
+
+def test_the_judge_call_requests_structured_output(monkeypatch):
+    monkeypatch.setattr(judge, "VERDICT_FORMAT", "json")
+    tokens, fake = judge_tokens(monkeypatch, json.dumps(REPLY))
+    assert JSONJudge.built == [VERDICT_SCHEMA]   # one call, with the schema: no restatement
+    assert "Reply with only a JSON object" in fake.messages[0]["content"]
+    assert tokens[0] == "queued" and len(tokens) == 2
+    assert isinstance(tokens[1], Verdict) and tokens[1].data["winner"] == "B"
+
+
+def test_table_format_streams_markdown(monkeypatch):
+    monkeypatch.setattr(judge, "VERDICT_FORMAT", "table")
+    tokens, fake = judge_tokens(monkeypatch, filled_in("llama3", "qwen3"))
+    assert JSONJudge.built == [None]
+    assert "".join(t for t in tokens if not isinstance(t, Status)) == filled_in("llama3", "qwen3")
+    assert not any(isinstance(t, Verdict) for t in tokens)
+
+
+def test_ensemble_judges_reply_in_json(monkeypatch):
+    monkeypatch.setattr(verdicts, "VERDICT_FORMAT", "json")
+    monkeypatch.setattr(ensemble, "VERDICT_FORMAT", "json")
+    monkeypatch.setattr(ensemble, "get_adapter", JSONJudge(json.dumps(REPLY)))
+    JSONJudge.built = []
+
+    async def main():
+        return [tok async for tok in ensemble.run_ensemble([("a", "1"), ("b", "2")], [], ("llama3", "qwen3"))]
+    combined = asyncio.run(main())[-1]
+    assert JSONJudge.built == [VERDICT_SCHEMA, VERDICT_SCHEMA]
+    assert "**Winner:** qwen3" in combined and "Votes: 2 for qwen3" in combined
+    assert "| Use of Evidence | 5.0/10 | 9.5/10 | 2 |" in combined
+    assert '"winner"' not in combined   # each judge's reply is shown rendered, not as JSON
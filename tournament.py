@@ -0,0 +1,253 @@
+"""
+tournament.py
+Round-robin tournament runner: every model debates every other model on every
+topic, once on each side, judged by one fixed judge (or a fixed --judges panel).
+
+Matches run in parallel up to --concurrency, and a match only starts while
+each provider it uses (both debaters and the judges) is under its
+--provider-limit. Pairings, progress and results live in debates.db
+(tournaments / tournament_matches), and every match is checkpointed like a
+WebSocket debate, so an interrupted tournament picks up where it stopped:
+finished matches are kept and half-played ones resume from their last round.
+
+Usage:
+  python tournament.py cup1 -m ollama:llama3:latest groq:llama-3.1-8b-instant anthropic:claude-3-5-haiku-latest \
+      -t "Should AI be open source?" "Is remote work better?" --judge ollama:qwen3:30b \
+      --rounds 4 --concurrency 4 --provider-limit ollama=1 groq=2
+  python tournament.py cup1 --resume           # continue after a crash or Ctrl-C
+  python tournament.py cup1 --standings        # print the table only
+"""
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from itertools import permutations
+from dotenv import load_dotenv
+load_dotenv()
+
+import adapters
+from batch import run_spec
+from scheduler import current_session
+from logger import (load_checkpoint, finish_checkpoint,
+                    create_tournament, load_tournament, update_match, finish_tournament)
+
+
+# ── Pairings ────────────────────────────────────────────────────────────────
+def pairings(models: list[str], topics: list[str]) -> list[tuple[str, str, str]]:
+    """(topic, side_a, side_b) for every ordered pair, so each model plays both sides."""
+    return [(topic, a, b) for topic in topics for a, b in permutations(models, 2)]
+
+
+def split(spec: str) -> tuple[str, str]:
+    provider, _, model = spec.partition(":")
+    return provider, model
+
+
+def providers_of(match: dict, spec: dict) -> set[str]:
+    judges = [spec["judge"], *spec.get("judges", [])]
+    return {split(match["side_a"])[0], split(match["side_b"])[0], *(split(judge)[0] for judge in judges)}
+
+
+
+# ── Matches ─────────────────────────────────────────────────────────────────
+async def play(name: str, spec: dict, match: dict) -> dict:
+    """Run (or resume) one pairing to its verdict; returns the fields to store."""
+    checkpoint = load_checkpoint(match["session"]) if match["session"] else None
+    if checkpoint and checkpoint["status"] == "done":
+        checkpoint = None   # logged but not recorded as finished: replay from scratch
+    session = match["session"] if checkpoint else uuid.uuid4().hex[:8]
+    current_session.set(session)   # fair queueing key for the adapter scheduler
+
+    judge_provider, judge_model = split(spec["judge"])
+    (provider_a, model_a), (provider_b, model_b) = split(match["side_a"]), split(match["side_b"])
+    debate = {
+        "topic": match["topic"], "rounds": spec["rounds"],
+        "provider_a": provider_a, "model_a": model_a, "provider_b": provider_b, "model_b": model_b,
+        "judge_provider": judge_provider, "judge_model": judge_model,
+        "cache": "off", "cache_replay": "fast", "resume": None, "fallback": None,
+        "format": spec["format"], "judging": spec.get("judging", "final"), "tournament": name,
+        "judges": spec.get("judges", []), "quorum": spec.get("quorum"), "aggregate": spec.get("aggregate", "median"),
+        **{k: spec.get(k) for k in ("max_tokens", "max_seconds", "deadline")},
+    }
+    if checkpoint is None:
+        update_match(name, match["match_no"], status="running", session=session)
+
+    started = time.perf_counter()
+    controller = await run_spec(session, debate, checkpoint)
+    winner = (controller.verdict or {}).get("winner")   # verdicts.extract_verdict()
+    result = {"status": "done", "winner": winner, "seconds": round(time.perf_counter() - started, 1)}
+    update_match(name, match["match_no"], **result)
+    finish_checkpoint(session)
+    return result
+
+
+async def run_tournament(name: str, spec: dict, matches: list[dict]):
+    """Play every unfinished match with at most `concurrency` at once and per-provider caps."""
+    todo = [m for m in matches if m["status"] != "done"]
+    limits: dict = spec["provider_limits"]
+    busy: dict[str, int] = {}
+    changed = asyncio.Condition()
+    total, done = len(matches), len(matches) - len(todo)
+
+    def runnable(match) -> bool:
+        return all(busy.get(p, 0) < limits.get(p, float("inf")) for p in providers_of(match, spec))
+
+    async def worker():
+        nonlocal done
+        while True:
+            async with changed:
+                await changed.wait_for(lambda: not todo or any(map(runnable, todo)))
+                if not todo:
+                    return
+                match = next(m for m in todo if runnable(m))
+                todo.remove(match)
+                for p in providers_of(match, spec):
+                    busy[p] = busy.get(p, 0) + 1
+            label = f"#{match['match_no']} {match['side_a']} vs {match['side_b']}"
+            print(f"▶️  {label}  ({match['topic'][:60]})")
+            try:
+                result = await play(name, spec, match)
+                outcome = {"A": match["side_a"], "B": match["side_b"]}.get(result["winner"], result["winner"])
+                print(f"✅ {label}: winner {outcome or '?'} in {result['seconds']}s")
+            except Exception as e:
+                update_match(name, match["match_no"], status="failed", error=f"{type(e).__name__}: {e}"[:500])
+                print(f"❌ {label}: {e}")
+            async with changed:
+                done += 1
+                for p in providers_of(match, spec):
+                    busy[p] -= 1
+                print(f"   progress {done}/{total}")
+                changed.notify_all()
+
+    await asyncio.gather(*(worker() for _ in range(spec["concurrency"])))
+
+
+# ── Standings ───────────────────────────────────────────────────────────────
+def standings(matches: list[dict]) -> list[dict]:
+    """Per-model record, best first (win = 1 point, draw = ½)."""
+    table: dict[str, dict] = {}
+    for m in matches:
+        for side, model in (("A", m["side_a"]), ("B", m["side_b"])):
+            row = table.setdefault(model, {"model": model, "played": 0, "wins": 0, "draws": 0,
+                                           "losses": 0, "unscored": 0, "wins_as_a": 0, "wins_as_b": 0})
+            if m["status"] != "done":
+                continue
+            row["played"] += 1
+            if m["winner"] == side:
+                row["wins"] += 1
+                row[f"wins_as_{side.lower()}"] += 1
+            elif m["winner"] == "draw":
+                row["draws"] += 1
+            elif m["winner"] in ("A", "B"):
+                row["losses"] += 1
+            else:
+                row["unscored"] += 1
+    for row in table.values():
+        row["points"] = row["wins"] + row["draws"] / 2
+    return sorted(table.values(), key=lambda r: (-r["points"], r["losses"], r["model"]))
+
+
+def print_standings(t: dict):
+    matches = t["matches"]
+    counts = {s: sum(m["status"] == s for m in matches) for s in ("done", "running", "failed", "pending")}
+    print(f"\n🏆 {t['name']}: {counts['done']}/{len(matches)} matches done"
+          + "".join(f", {n} {s}" for s, n in counts.items() if n and s != "done"))
+    print(f"{'model':<44} {'pts':>5} {'W':>3} {'D':>3} {'L':>3} {'?':>3}  {'W as A/B':>8}")
+    for r in standings(matches):
+        print(f"{r['model']:<44} {r['points']:>5g} {r['wins']:>3} {r['draws']:>3} {r['losses']:>3} "
+              f"{r['unscored']:>3}  {r['wins_as_a']:>4}/{r['wins_as_b']}")
+
+
+# ── CLI ─────────────────────────────────────────────────────────────────────
+def parse_limits(items: list[str]) -> dict[str, int]:
+    limits = {}
+    for item in items:
+        provider, _, n = item.partition("=")
+        if not n.strip().isdigit() or int(n) < 1:
+            raise ValueError(f"--provider-limit {item!r}: expected PROVIDER=N with N >= 1")
+        limits[provider] = int(n)
+    return limits
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Round-robin debate tournament")
+    parser.add_argument("name", help="tournament name (key in debates.db)")
+    parser.add_argument("-m", "--models", nargs="+", default=[], help="provider:model entrants")
+    parser.add_argument("-t", "--topics", nargs="+", default=[], help="debate topics")
+    parser.add_argument("--topic-file", nargs="+", default=[], help="files holding one topic each")
+    parser.add_argument("--judge", help="provider:model of the judge")
+    parser.add_argument("--judges", nargs="+", default=[], metavar="PROVIDER:MODEL",
+                        help="more judges ruling alongside --judge (ensemble)")
+    parser.add_argument("--quorum", type=int, help="ensemble verdict after this many judges (default: majority)")
+    parser.add_argument("--aggregate", choices=("median", "mean"), default="median")
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--format", choices=("sequential", "simultaneous"), default="sequential")
+    parser.add_argument("--judging", choices=("final", "incremental"), default="final",
+                        help="incremental: score each round while the next one plays")
+    parser.add_argument("--max-tokens", type=int, help="output tokens per turn (same budget for everyone)")
+    parser.add_argument("--max-seconds", type=float, help="seconds per turn")
+    parser.add_argument("--deadline", type=float, help="seconds of rounds per match")
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="matches in flight at once")
+    parser.add_argument("--provider-limit", nargs="+", default=[], metavar="PROVIDER=N",
+                        help="max matches in flight per provider (debaters and judge)")
+    parser.add_argument("--resume", action="store_true", help="continue an existing tournament")
+    parser.add_argument("--retry-failed", action="store_true", help="with --resume: replay failed matches")
+    parser.add_argument("--standings", action="store_true", help="print the table and exit")
+    args = parser.parse_args()
+
+    existing = load_tournament(args.name)
+    if args.standings:
+        if existing is None:
+            print(f"No tournament named {args.name!r}")
+            return 2
+        print_standings(existing)
+        return 0
+
+    if existing:
+        if not args.resume:
+            print(f"Tournament {args.name!r} already exists — use --resume or --standings")
+            return 2
+        spec = existing["spec"]
+        matches = existing["matches"]
+        if args.retry_failed:
+            for m in matches:
+                if m["status"] == "failed":
+                    m.update(status="pending", session=None)
+        else:
+            matches = [m for m in matches if m["status"] != "failed"]
+    else:
+        topics = args.topics
+        for path in args.topic_file:
+            with open(path, encoding="utf-8") as f:
+                topics.append(f.read().strip())
+        if len(args.models) < 2 or not topics or not args.judge:
+            parser.error("a new tournament needs at least two --models, a topic and --judge")
+        try:
+            limits = parse_limits(args.provider_limit)
+        except ValueError as e:
+            parser.error(str(e))
+        spec = {"models": args.models, "topics": topics, "judge": args.judge, "rounds": args.rounds,
+                "format": args.format, "judging": args.judging, "concurrency": args.concurrency,
+                "judges": args.judges, "quorum": args.quorum, "aggregate": args.aggregate,
+                "max_tokens": args.max_tokens, "max_seconds": args.max_seconds, "deadline": args.deadline,
+                "provider_limits": limits}
+        create_tournament(args.name, spec, pairings(args.models, topics))
+        matches = load_tournament(args.name)["matches"]
+
+    print(f"🏁 {args.name}: {len(matches)} matches, {spec['concurrency']} at a time"
+          + (f", provider limits {spec['provider_limits']}" if spec["provider_limits"] else ""))
+    try:
+        await run_tournament(args.name, spec, matches)
+    finally:
+        await adapters.close_http_clients()
+
+    final = load_tournament(args.name)
+    if all(m["status"] == "done" for m in final["matches"]):
+        finish_tournament(args.name)
+    print_standings(final)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))